@@ -0,0 +1,74 @@
+import io
+import os
+import glob
+import time
+import argparse
+import tracemalloc
+
+import sstable.sstable_data
+import sstable.compact_rows
+import sstable.row_decoder
+import sstable.sstable_statistics
+
+# Memory taken by the partitions of Data.db when they are all kept, as
+# Containers (parsed with the compiled row body decoder) and as
+# sstable.compact_rows. Data.db of a test table is repeated until it has
+# --cells cells.
+#
+#     python -m benchmarks.compact_rows
+#
+# Measured on has_all_types (17 columns per row): about 920 MB per million
+# cells as Containers and 70 MB as compact rows. On twenty_rows_table, with
+# one row per partition and one cell per row, 4.5 GB and 450 MB. The times
+# are with tracemalloc on, so only compare them to each other.
+
+def read_table(name):
+    table_dir = glob.glob(f"test_data/cassandra3_data_want/sina_test/{name}-*/")[0]
+    with open(os.path.join(table_dir, "me-1-big-Statistics.db"), "rb") as f:
+        statistics = sstable.sstable_statistics.statistics_format.parse(f.read())
+    with open(os.path.join(table_dir, "me-1-big-Data.db"), "rb") as f:
+        return statistics, f.read()
+
+def measure(read):
+    r"""
+    Returns what read() returns, the bytes it still holds when done, and the
+    seconds it took.
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = read()
+    seconds = time.perf_counter() - start
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size, seconds
+
+def report(name, size, seconds, cells):
+    print(f"{name:<20} {size / cells * 1e6 / 2**20:10.1f} MB/million cells {size / cells:8.1f} bytes/cell {seconds:8.2f} s")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--table', type=str, default="has_all_types")
+    parser.add_argument('--cells', type=int, default=100_000)
+    args = parser.parse_args()
+
+    statistics, data = read_table(args.table)
+    row_body_decoder = sstable.row_decoder.compile_row_body_decoder(statistics.serialization_header)
+    partitions = list(sstable.compact_rows.iter_partitions(statistics, io.BytesIO(data), row_body_decoder=row_body_decoder))
+    cells_per_copy = sum(len(row.values) for p in partitions for row in p.rows)
+    copies = max(1, args.cells // cells_per_copy)
+    cells = copies * cells_per_copy
+    data = data * copies
+    print(f"{args.table}: {cells} cells, {len(data)} bytes of Data.db")
+
+    containers, size, seconds = measure(lambda: list(sstable.sstable_data.iter_partitions(statistics, io.BytesIO(data), row_body_decoder=row_body_decoder)))
+    assert [sstable.compact_rows.from_partition(p) for p in containers[:len(partitions)]] == partitions
+    del containers
+    report("containers", size, seconds, cells)
+
+    compact, size, seconds = measure(lambda: list(sstable.compact_rows.iter_partitions(statistics, io.BytesIO(data), row_body_decoder=row_body_decoder)))
+    assert compact[:len(partitions)] == partitions
+    del compact
+    report("compact_rows", size, seconds, cells)
+
+if __name__ == '__main__':
+    main()
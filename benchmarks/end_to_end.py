@@ -0,0 +1,165 @@
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import tempfile
+import multiprocessing
+import concurrent.futures
+
+import construct
+
+import sstable.dump
+import sstable.row_decoder
+import sstable.sstable_data
+import sstable.sstable_statistics
+import benchmarks.synthetic
+
+# Times each stage of reading an SSTable generated by benchmarks.synthetic:
+# parsing Statistics.db, parsing Data.db (with the grammar and with the
+# compiled decoders), dumping it to JSON and CSV, and building the parsed
+# partitions back to bytes. Each stage runs in a new process, so that its
+# peak RSS is its own, and the best time of --repeat runs is reported.
+#
+#     python -m benchmarks.end_to_end --partitions 2000 --rows 10 --types all
+#     python -m benchmarks.end_to_end --dir DIR          # an existing SSTable
+#
+# MB/s are of the component the stage reads (Statistics.db, or Data.db), and
+# the peak RSS includes the interpreter and the imported modules. With
+# --output, the results are also written as JSON, to compare runs. Dumps of
+# collections fail, like sstable.dump does on them, and are reported as
+# failed.
+
+def component_path(table_dir, component):
+    return os.path.join(table_dir, f"me-1-big-{component}.db")
+
+def read_component(table_dir, component):
+    with open(component_path(table_dir, component), "rb") as f:
+        return f.read()
+
+def parse_statistics(table_dir):
+    return sstable.sstable_statistics.statistics_format.parse(read_component(table_dir, "Statistics"))
+
+def peak_rss():
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+def stage_statistics(table_dir, number=1000):
+    data = read_component(table_dir, "Statistics")
+    start = time.perf_counter()
+    for _ in range(number):
+        sstable.sstable_statistics.statistics_format.parse(data)
+    return time.perf_counter() - start, len(data) * number, None
+
+def stage_parse(table_dir, engine):
+    statistics = parse_statistics(table_dir)
+    data = read_component(table_dir, "Data")
+    row_body_decoder = sstable.row_decoder.compile_row_body_decoder(statistics.serialization_header) if engine == "compiled" else None
+    start = time.perf_counter()
+    rows = sum(1 for _ in sstable.sstable_data.iter_rows(statistics, io.BytesIO(data), row_body_decoder=row_body_decoder))
+    return time.perf_counter() - start, len(data), rows
+
+def stage_dump(table_dir, output_format, engine):
+    statistics = parse_statistics(table_dir)
+    data = read_component(table_dir, "Data")
+    with open(os.devnull, "w") as output:
+        writer = sstable.dump.make_writer(output_format, output)
+        rows = 0
+        def counted(rows_iter):
+            nonlocal rows
+            for row in rows_iter:
+                rows += 1
+                yield row
+        row_body_decoder = sstable.dump.make_row_body_decoder(statistics, engine)
+        start = time.perf_counter()
+        sstable.dump.write_rows(statistics, counted(sstable.sstable_data.iter_rows(statistics, io.BytesIO(data), row_body_decoder=row_body_decoder)), writer)
+        return time.perf_counter() - start, len(data), rows
+
+def stage_build(table_dir):
+    statistics = parse_statistics(table_dir)
+    data = read_component(table_dir, "Data")
+    partitions = list(sstable.sstable_data.iter_partitions(statistics, io.BytesIO(data)))
+    start = time.perf_counter()
+    built = b"".join(sstable.sstable_data.partition.build(p, sstable_statistics=statistics) for p in partitions)
+    seconds = time.perf_counter() - start
+    if built != data:
+        raise Exception("the built partitions differ from Data.db")
+    return seconds, len(data), sum(len(p.unfiltereds) - 1 for p in partitions)
+
+STAGES = [
+    ("statistics parse", stage_statistics, ()),
+    ("data parse construct", stage_parse, ("construct",)),
+    ("data parse compiled", stage_parse, ("compiled",)),
+    ("dump json", stage_dump, ("json", "compiled")),
+    ("dump csv", stage_dump, ("csv", "compiled")),
+    ("dump typed-csv", stage_dump, ("typed-csv", "compiled")),
+    ("round trip build", stage_build, ()),
+]
+
+def run_stage(stage, args, table_dir, repeat):
+    r"""
+    Runs stage repeat times in this process, returns the best time, the
+    bytes and rows it read and the peak RSS of the process.
+    """
+    runs = [stage(table_dir, *args) for _ in range(repeat)]
+    seconds, size, rows = min(runs, key=lambda run: run[0])
+    return seconds, size, rows, peak_rss()
+
+def measure(table_dir, repeat=3, stages=STAGES):
+    results = []
+    for name, stage, args in stages:
+        # spawn, so that the process has nothing of this one in memory
+        with concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+            try:
+                seconds, size, rows, rss = executor.submit(run_stage, stage, args, table_dir, repeat).result()
+            except Exception as e:
+                results.append(construct.Container(stage=name, error=f"{type(e).__name__}: {e}"))
+                continue
+        results.append(construct.Container(
+            stage=name,
+            seconds=seconds,
+            mb_per_second=size / seconds / 2**20,
+            rows_per_second=rows / seconds if rows is not None else None,
+            peak_rss_mb=rss / 2**20,
+        ))
+    return results
+
+def report(results):
+    print(f"{'stage':<22} {'seconds':>9} {'MB/s':>9} {'rows/s':>11} {'peak RSS MB':>12}")
+    for result in results:
+        if "error" in result:
+            print(f"{result.stage:<22} failed: {result.error[:80]}")
+            continue
+        rows_per_second = f"{result.rows_per_second:11.0f}" if result.rows_per_second is not None else f"{'-':>11}"
+        print(f"{result.stage:<22} {result.seconds:9.3f} {result.mb_per_second:9.2f} {rows_per_second} {result.peak_rss_mb:12.1f}")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dir', type=str, help="an SSTable (generation 1) to measure instead of a generated one")
+    parser.add_argument('--partitions', type=int, default=1000)
+    parser.add_argument('--rows', type=int, default=10, help="rows per partition")
+    parser.add_argument('--columns', type=int, default=10, help="regular columns")
+    parser.add_argument('--types', type=str, default="all", help=f"one of {', '.join(benchmarks.synthetic.TYPE_MIXES)}, or comma separated types")
+    parser.add_argument('--missing', type=float, default=0.0, help="probability of a cell to be missing")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', type=str, help="write the results to this JSON file too")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        table_dir = args.dir
+        if table_dir is None:
+            table_dir = tmp_dir
+            stats = benchmarks.synthetic.generate(table_dir, partitions=args.partitions, rows=args.rows, columns=args.columns, types=args.types, missing=args.missing, seed=args.seed)
+            print(f"{stats.partitions} partitions, {stats.rows} rows, {args.columns} columns of {args.types}, {stats.data_size} bytes of Data.db")
+        results = measure(table_dir, repeat=args.repeat)
+    report(results)
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump({"arguments": vars(args), "results": [dict(result) for result in results]}, f, indent=2)
+
+if __name__ == '__main__':
+    main()
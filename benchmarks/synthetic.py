@@ -0,0 +1,191 @@
+import os
+import random
+import argparse
+
+import construct
+
+import sstable.merge
+import sstable.murmur3
+import sstable.compaction
+import sstable.sstable_data
+import sstable.type_parser
+
+# Generates SSTables for the benchmarks, with the build side of the grammar
+# (sstable.compaction.SSTableWriter). A table has an Int32Type partition key,
+# one Int32Type clustering column and --columns regular columns, whose types
+# go round the types of --types. Each cell is missing with probability
+# --missing. The same arguments and --seed give the same bytes.
+#
+#     python -m benchmarks.synthetic DIR --partitions 1000 --rows 10 --types fixed
+#
+# Values are limited to what the grammar builds and parses back to the same
+# bytes: no negative varints, shorts and decimals, floats in quarters. The
+# grammar reads every cell of a row with HAS_COMPLEX_DELETION as a
+# collection, so collections can't be mixed with other types in a table, and
+# the values of maps have the type of their keys.
+
+MARSHAL = "org.apache.cassandra.db.marshal."
+COLLECTION_TYPES = [
+    MARSHAL + "ListType(" + MARSHAL + "Int32Type)",
+    MARSHAL + "SetType(" + MARSHAL + "Int32Type)",
+    MARSHAL + "MapType(" + MARSHAL + "Int32Type," + MARSHAL + "Int32Type)",
+]
+
+def text_value(rnd, alphabet="abcdefghijklmnopqrstuvwxyz0123456789"):
+    return "".join(rnd.choice(alphabet) for _ in range(rnd.randint(0, 24)))
+
+def utf8_value(rnd):
+    value = text_value(rnd, "abcdefghijklmnopqrstuvwxyzé✓∭")
+    return {"cell_value_len": len(value.encode("utf-8")), "cell_value": value}
+
+def ascii_value(rnd):
+    value = text_value(rnd)
+    return {"length": len(value), "cell_value": value}
+
+def bytes_value(rnd):
+    value = rnd.randbytes(rnd.randint(0, 24))
+    return {"length": len(value), "cell_value": value}
+
+def integer_value(rnd):
+    value = rnd.getrandbits(rnd.choice([7, 31, 100]))
+    return {"length": (value.bit_length() + 8) // 8, "cell_value": value}
+
+# The cell of a value of each type, as sstable.type_parser.java_type_to_construct
+# builds it
+value_makers = {
+    MARSHAL + "UTF8Type": utf8_value,
+    MARSHAL + "ShortType": lambda rnd: {"length": 2, "cell_value": rnd.randint(0, 0x7fff)},
+    MARSHAL + "IntegerType": integer_value,
+    MARSHAL + "Int32Type": lambda rnd: {"cell_value": rnd.randint(-2**31, 2**31 - 1)},
+    MARSHAL + "LongType": lambda rnd: {"cell_value": rnd.randint(-2**63, 2**63 - 1)},
+    MARSHAL + "DecimalType": lambda rnd: {"cell_value": rnd.randint(0, 400000) / 4},
+    MARSHAL + "AsciiType": ascii_value,
+    MARSHAL + "ByteType": lambda rnd: {"length": 1, "cell_value": rnd.randbytes(1)},
+    MARSHAL + "BytesType": bytes_value,
+    MARSHAL + "BooleanType": lambda rnd: {"cell_value": rnd.random() < 0.5},
+    MARSHAL + "FloatType": lambda rnd: {"cell_value": rnd.randint(-4000, 4000) / 4},
+    MARSHAL + "DoubleType": lambda rnd: {"cell_value": rnd.randint(-2**40, 2**40) / 4},
+    MARSHAL + "TimestampType": lambda rnd: {"cell_value": rnd.randint(0, 2**41)},
+    MARSHAL + "UUIDType": lambda rnd: {"cell_value": rnd.randbytes(16)},
+}
+assert set(value_makers) == set(sstable.type_parser.java_type_to_construct)
+
+def list_item(rnd):
+    return {"cell_path_length": 16, "cell_path": rnd.randbytes(16), "cell_value_len": 4, "cell_value": value_makers[MARSHAL + "Int32Type"](rnd)}
+
+def set_item(rnd):
+    return {"cell_val_len": 4, "cell_val": value_makers[MARSHAL + "Int32Type"](rnd)}
+
+def map_item(rnd):
+    return {"cell_key_len": 4, "cell_key": value_makers[MARSHAL + "Int32Type"](rnd), "cell_val_len": 4, "cell_val": value_makers[MARSHAL + "Int32Type"](rnd)}
+
+# (item maker, item cell_flags), set items have no value of their own
+item_makers = {
+    COLLECTION_TYPES[0]: (list_item, sstable.sstable_data.CellFlag.USE_ROW_TIMESTAMP),
+    COLLECTION_TYPES[1]: (set_item, sstable.sstable_data.CellFlag.USE_ROW_TIMESTAMP | sstable.sstable_data.CellFlag.HAS_EMPTY_VALUE),
+    COLLECTION_TYPES[2]: (map_item, sstable.sstable_data.CellFlag.USE_ROW_TIMESTAMP),
+}
+
+TYPE_MIXES = {
+    "all": list(value_makers),
+    "fixed": [MARSHAL + name for name in ["Int32Type", "LongType", "FloatType", "DoubleType", "TimestampType", "BooleanType", "UUIDType"]],
+    "text": [MARSHAL + name for name in ["UTF8Type", "AsciiType", "BytesType"]],
+    "collections": COLLECTION_TYPES,
+}
+
+def column_types(types, columns):
+    r"""
+    The types of columns regular columns. types is the name of a mix of
+    TYPE_MIXES, or comma separated type names, with or without the
+    org.apache.cassandra.db.marshal. prefix.
+    """
+    if types in TYPE_MIXES:
+        type_names = TYPE_MIXES[types]
+    else:
+        type_names = [name if name.startswith(MARSHAL) else MARSHAL + name for name in types.split(",")]
+    for name in type_names:
+        if name not in value_makers and name not in item_makers:
+            raise Exception(f"Can't generate values of {name}")
+    if any(name in item_makers for name in type_names) and not all(name in item_makers for name in type_names):
+        raise Exception("Collections can't be mixed with other types")
+    return [type_names[i % len(type_names)] for i in range(columns)]
+
+def type_header(name):
+    return {"name_length": len(name), "name": name}
+
+def serialization_header(regular_types):
+    return {
+        "min_timestamp": 0,
+        "min_local_deletion_time": 0,
+        "min_ttl": 0,
+        "partition_key_type": type_header(MARSHAL + "Int32Type"),
+        "clustering_key_count": 1,
+        "clustering_key_types": [type_header(MARSHAL + "Int32Type")],
+        "static_column_count": 0,
+        "static_columns": [],
+        "regular_column_count": len(regular_types),
+        "regular_columns": [{"name_length": len(f"col{i}"), "name": f"col{i}", "type": type_header(name)} for i, name in enumerate(regular_types)],
+    }
+
+def make_cell(rnd, type_name):
+    if type_name in item_makers:
+        make_item, item_flags = item_makers[type_name]
+        items = [construct.Container(cell_flags=item_flags, cell=make_item(rnd)) for _ in range(rnd.randint(1, 4))]
+        return construct.Container(
+            complex_deletion_time=construct.Container(delta_mark_for_delete_at=0, delta_local_deletion_time=0),
+            items_count=len(items),
+            items=items,
+        )
+    return construct.Container(cell_flags=sstable.sstable_data.CellFlag.USE_ROW_TIMESTAMP, cell=value_makers[type_name](rnd))
+
+def make_partition(rnd, key, rows, regular_types, missing):
+    RowFlag = sstable.sstable_data.RowFlag
+    row_flags = RowFlag.HAS_TIMESTAMP
+    if regular_types and regular_types[0] in item_makers:
+        row_flags |= RowFlag.HAS_COMPLEX_DELETION
+    unfiltereds = []
+    for clustering in range(rows):
+        # None for the missing cells, SSTableWriter sets missing_columns
+        cells = [make_cell(rnd, type_name) if rnd.random() >= missing else None for type_name in regular_types]
+        unfiltereds.append(construct.Container(row_flags=row_flags, row=construct.Container(
+            clustering_block=construct.Container(clustering_block_header=0, clustering_cells=[construct.Container(key=construct.Container(cell_value=clustering))]),
+            row_body=construct.Container(timestamp_diff=0, cells=cells),
+        )))
+    unfiltereds.append(construct.Container(row_flags=RowFlag.END_OF_PARTITION, row=None))
+    deletion_time = construct.Container(local_deletion_time=sstable.compaction.NO_DELETION_TIME, marked_for_delete_at=sstable.merge.LIVE)
+    return construct.Container(partition_header=construct.Container(key_len=len(key), key=key, deletion_time=deletion_time), unfiltereds=unfiltereds)
+
+def generate(table_dir, partitions=1000, rows=10, columns=10, types="all", missing=0.0, seed=0, generation=1):
+    r"""
+    Writes an SSTable of the given generation to table_dir, with partitions
+    partitions of rows rows each, in token order. Returns the counts of what
+    was written and the size of Data.db.
+    """
+    rnd = random.Random(seed)
+    regular_types = column_types(types, columns)
+    keys = sorted((i.to_bytes(4, "big", signed=True) for i in range(partitions)), key=sstable.murmur3.decorated_key)
+    writer = sstable.compaction.SSTableWriter(table_dir, generation, serialization_header(regular_types))
+    try:
+        for key in keys:
+            writer.write_partition(make_partition(rnd, key, rows, regular_types, missing))
+    except BaseException:
+        writer.abort()
+        raise
+    writer.close()
+    return construct.Container(partitions=writer.partitions, rows=writer.rows, data_size=writer.data_size)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('dir', type=str)
+    parser.add_argument('--partitions', type=int, default=1000)
+    parser.add_argument('--rows', type=int, default=10, help="rows per partition")
+    parser.add_argument('--columns', type=int, default=10, help="regular columns")
+    parser.add_argument('--types', type=str, default="all", help=f"one of {', '.join(TYPE_MIXES)}, or comma separated types")
+    parser.add_argument('--missing', type=float, default=0.0, help="probability of a cell to be missing")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--generation', type=int, default=1)
+    args = parser.parse_args()
+
+    os.makedirs(args.dir, exist_ok=True)
+    stats = generate(args.dir, partitions=args.partitions, rows=args.rows, columns=args.columns, types=args.types, missing=args.missing, seed=args.seed, generation=args.generation)
+    print(f"{stats.partitions} partitions, {stats.rows} rows, {stats.data_size} bytes of Data.db")
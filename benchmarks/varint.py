@@ -0,0 +1,96 @@
+import io
+import random
+import timeit
+import argparse
+
+import sstable.varint
+
+# Compares sstable.varint against the bit-loop implementation it replaced.
+#
+#     python -m benchmarks.varint
+
+def bit_loop_parse(stream):
+    first_byte = stream.read(1)[0]
+    if not first_byte & 0b10000000:
+        return first_byte
+    ones_count = 0
+    for i in range(8):
+        if first_byte & (1<<(7 - i)):
+            ones_count += 1
+        else:
+            break
+    zeros_count = 0
+    for i in range(ones_count, 8):
+        if first_byte & (1<<(7 - i)) == 0:
+            zeros_count += 1
+        else:
+            break
+    first_value_bits = []
+    for i in range(ones_count+zeros_count, 8):
+        first_value_bits.append(1 if first_byte & (1<<(7 - i)) else 0)
+    first_value_byte = [0] * (8-len(first_value_bits)) + first_value_bits
+    first_value_byte = int(''.join(map(str, first_value_byte)), 2)
+    return int.from_bytes(bytes([first_value_byte]) + stream.read(ones_count), 'big')
+
+def bit_loop_build(value):
+    if value < 0b10000000:
+        return bytes([value])
+    byte_length = -(-value.bit_length() // 8)
+    first_byte = (value >> (8*(byte_length-1))).to_bytes(1, byteorder="big")[0]
+    flag_bits = 0
+    for i in range(byte_length):
+        flag_bits |= 1<<(7-i)
+    if byte_length == 8:
+        return bytes([flag_bits] + list(value.to_bytes(byte_length, byteorder="big")))
+    if flag_bits & first_byte == 0:
+        flag_bits = flag_bits & (flag_bits-1)
+        return bytes([flag_bits | first_byte] + list(value.to_bytes(byte_length, byteorder="big"))[1:])
+    return bytes([flag_bits] + list(value.to_bytes(byte_length, byteorder="big")))
+
+def make_values(count, seed):
+    # Mostly small values, like cell lengths and timestamp deltas in Data.db
+    rnd = random.Random(seed)
+    return [rnd.getrandbits(rnd.choice([6, 6, 6, 13, 20, 27, 40, 63])) for _ in range(count)]
+
+def report(name, seconds, count, baseline=None):
+    speedup = f"  {baseline / seconds:6.1f}x" if baseline else ""
+    print(f"{name:<40} {seconds / count * 1e9:10.1f} ns/varint{speedup}")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=100_000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    values = make_values(args.count, args.seed)
+    encoded = b"".join(sstable.varint.encode(value) for value in values)
+    assert encoded == b"".join(bit_loop_build(value) for value in values)
+
+    def parse_with(parse):
+        stream = io.BytesIO(encoded)
+        return [parse(stream) for _ in range(args.count)]
+
+    def decode_one_by_one():
+        buf = memoryview(encoded)
+        offset = 0
+        decoded = []
+        for _ in range(args.count):
+            value, offset = sstable.varint.decode(buf, offset)
+            decoded.append(value)
+        return decoded
+
+    assert values == parse_with(bit_loop_parse) == parse_with(sstable.varint.parse)
+    assert values == decode_one_by_one() == sstable.varint.decode_many(encoded, 0, args.count)[0]
+
+    baseline = min(timeit.repeat(lambda: parse_with(bit_loop_parse), number=1, repeat=3))
+    report("bit-loop parse(stream)", baseline, args.count)
+    report("varint.parse(stream)", min(timeit.repeat(lambda: parse_with(sstable.varint.parse), number=1, repeat=3)), args.count, baseline)
+    report("varint.decode(buf, offset)", min(timeit.repeat(decode_one_by_one, number=1, repeat=3)), args.count, baseline)
+    report("varint.decode_many(buf, offset, n)", min(timeit.repeat(lambda: sstable.varint.decode_many(encoded, 0, args.count), number=1, repeat=3)), args.count, baseline)
+
+    baseline = min(timeit.repeat(lambda: [bit_loop_build(value) for value in values], number=1, repeat=3))
+    report("bit-loop build(value)", baseline, args.count)
+    report("varint.encode(value)", min(timeit.repeat(lambda: [sstable.varint.encode(value) for value in values], number=1, repeat=3)), args.count, baseline)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,191 @@
+import os
+import sys
+import glob
+import json
+import hashlib
+import argparse
+import contextlib
+import concurrent.futures
+
+import sstable.sstable_reader
+import parse_with_construct
+
+# Runs parse_with_construct on every SSTable of a data directory
+# (keyspace/table-id/me-N-big-*.db) on a pool of worker processes, which
+# import the grammar once and parse many SSTables each. The output of an
+# SSTable goes to OUTPUT_DIR/keyspace/table/me-N-big-Data.db.hex.
+#
+# A manifest in OUTPUT_DIR remembers the components every output was parsed
+# from, so SSTables whose Statistics.db and Data.db (and CompressionInfo.db)
+# haven't changed are not parsed again, unless the parser itself has changed.
+#
+#     python -m parse_batch test_data/cassandra3_data_want test_data/parsed --keyspace sina_test
+
+MANIFEST_FILE_NAME = ".manifest.json"
+PARSED_COMPONENTS = ["Statistics", "Data", "CompressionInfo"]
+# Changes in these invalidate all the outputs
+PARSER_SOURCES = ["parse_with_construct.py", "sstable/*.py"]
+
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def parser_version(root_dir):
+    h = hashlib.sha256()
+    for pattern in PARSER_SOURCES:
+        for path in sorted(glob.glob(os.path.join(root_dir, pattern))):
+            h.update(os.path.relpath(path, root_dir).encode())
+            h.update(file_hash(path).encode())
+    return h.hexdigest()
+
+def find_sstables(data_dir, keyspaces=None):
+    r"""
+    Yields (output path relative to the output directory, table_dir,
+    generation) for every SSTable in data_dir.
+    """
+    for keyspace in sorted(os.listdir(data_dir)):
+        if keyspaces and keyspace not in keyspaces:
+            continue
+        keyspace_dir = os.path.join(data_dir, keyspace)
+        if not os.path.isdir(keyspace_dir):
+            continue
+        for table_dir_name in sorted(os.listdir(keyspace_dir)):
+            table_dir = os.path.join(keyspace_dir, table_dir_name)
+            if not os.path.isdir(table_dir):
+                continue
+            table_name = table_dir_name.split("-")[0]
+            for generation in sstable.sstable_reader.list_generations(table_dir):
+                output = os.path.join(keyspace, table_name, f"me-{generation}-big-Data.db.hex")
+                yield output, table_dir, generation
+
+def component_stats(table_dir, generation):
+    stats = {}
+    for component in PARSED_COMPONENTS:
+        path = sstable.sstable_reader.component_path(table_dir, generation, component)
+        if os.path.exists(path):
+            st = os.stat(path)
+            stats[component] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+    return stats
+
+def is_unchanged(entry, stats, table_dir, generation):
+    r"""
+    Whether the components are the ones entry was parsed from. Files with the
+    same size and mtime are taken as unchanged, the others are compared by
+    content, e.g. after a copy that didn't preserve mtimes.
+    """
+    if entry is None or set(entry["components"]) != set(stats):
+        return False
+    for component, stat in stats.items():
+        recorded = entry["components"][component]
+        if recorded["size"] != stat["size"]:
+            return False
+        if recorded["mtime_ns"] != stat["mtime_ns"]:
+            path = sstable.sstable_reader.component_path(table_dir, generation, component)
+            if recorded["sha256"] != file_hash(path):
+                return False
+    return True
+
+def parse_one(table_dir, generation, output_path, stats):
+    r"""
+    Runs in a worker. The output is written to a temporary file first, so an
+    interrupted run never leaves a partial output behind. Returns stats with
+    the hashes of the components.
+    """
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    tmp_path = output_path + ".tmp"
+    with open(tmp_path, "w") as f, contextlib.redirect_stdout(f):
+        parse_with_construct.parse_sstable(table_dir, generation)
+    os.replace(tmp_path, output_path)
+    for component, stat in stats.items():
+        stat["sha256"] = file_hash(sstable.sstable_reader.component_path(table_dir, generation, component))
+    return stats
+
+def read_manifest(output_dir):
+    try:
+        with open(os.path.join(output_dir, MANIFEST_FILE_NAME)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"parser_version": None, "outputs": {}}
+
+def write_manifest(output_dir, manifest):
+    path = os.path.join(output_dir, MANIFEST_FILE_NAME)
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+        f.write("\n")
+    os.replace(path + ".tmp", path)
+
+def parse_all(data_dir, output_dir, keyspaces=None, jobs=None, force=False, log=sys.stderr):
+    r"""
+    Parses the SSTables that changed since the last run, and removes the
+    outputs of the SSTables that are gone. Returns the counts of parsed,
+    skipped, removed and failed SSTables.
+    """
+    manifest = read_manifest(output_dir)
+    version = parser_version(os.path.dirname(os.path.abspath(__file__)))
+    if manifest["parser_version"] != version:
+        force = True
+    old_outputs = manifest["outputs"]
+    outputs = {}
+    counts = {"parsed": 0, "skipped": 0, "removed": 0, "failed": 0}
+
+    todo = []
+    for output, table_dir, generation in find_sstables(data_dir, keyspaces):
+        stats = component_stats(table_dir, generation)
+        entry = old_outputs.get(output)
+        if not force and os.path.exists(os.path.join(output_dir, output)) and is_unchanged(entry, stats, table_dir, generation):
+            # With the new mtimes, so that the files are not hashed again
+            for component, stat in stats.items():
+                stat["sha256"] = entry["components"][component]["sha256"]
+            outputs[output] = {"components": stats}
+            counts["skipped"] += 1
+            continue
+        todo.append((output, table_dir, generation, stats))
+
+    found = set(outputs) | {output for output, _, _, _ in todo}
+    for output in old_outputs:
+        # Only the keyspaces that were walked, the others are kept as they are
+        keyspace = output.split(os.sep)[0]
+        if keyspaces and keyspace not in keyspaces:
+            outputs[output] = old_outputs[output]
+        elif output not in found:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(os.path.join(output_dir, output))
+            counts["removed"] += 1
+
+    os.makedirs(output_dir, exist_ok=True)
+    jobs = jobs or os.cpu_count() or 1
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = {
+            executor.submit(parse_one, table_dir, generation, os.path.join(output_dir, output), stats): output
+            for output, table_dir, generation, stats in todo
+        }
+        for future in concurrent.futures.as_completed(futures):
+            output = futures[future]
+            try:
+                stats = future.result()
+            except Exception as e:
+                print(f"Failed {output}: {e}", file=log)
+                counts["failed"] += 1
+                continue
+            outputs[output] = {"components": stats}
+            counts["parsed"] += 1
+            print(f"Done {output}", file=log)
+
+    write_manifest(output_dir, {"parser_version": version, "outputs": outputs})
+    return counts
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('data_dir', type=str)
+    parser.add_argument('output_dir', type=str)
+    parser.add_argument('--keyspace', action='append', help="only parse this keyspace, can be repeated")
+    parser.add_argument('--jobs', type=int, default=None, help="number of worker processes, one per CPU by default")
+    parser.add_argument('--force', action='store_true', help="parse everything, even if unchanged")
+    args = parser.parse_args()
+
+    counts = parse_all(args.data_dir, args.output_dir, keyspaces=args.keyspace, jobs=args.jobs, force=args.force)
+    print(f"{counts['parsed']} parsed, {counts['skipped']} unchanged, {counts['removed']} removed, {counts['failed']} failed", file=sys.stderr)
+    sys.exit(1 if counts["failed"] else 0)
@@ -6,6 +6,7 @@ import traceback
 import construct
 
 import sstable.sstable_data
+import sstable.compressed_data
 import sstable.sstable_statistics
 import sstable.positioned_construct
 
@@ -36,7 +37,7 @@ def parse_statistics_db(statistics_file):
 def parse_data_db(data_file, parsed_statistics):
     parsed = None
     sstable.positioned_construct.init()
-    with open(data_file, "rb") as f:
+    with sstable.compressed_data.open_data_file(data_file) as f:
         err = None
         err_pos = None
         err_traceback = None
@@ -51,23 +52,31 @@ def parse_data_db(data_file, parsed_statistics):
             err_traceback = traceback.format_exc()
         last_pos = f.tell()
 
-    with open(data_file, "rb") as f:
+    with sstable.compressed_data.open_data_file(data_file) as f:
         print()
         print("# Hex Data.db")
         sstable.positioned_construct.pretty_hexdump(data_file, f, last_pos, os.sys.stdout, err, err_pos, err_traceback)
     return parsed
 
-def main():
-    parser = argparse.ArgumentParser()
-    parser.add_argument('dir', type=str)
-    args = parser.parse_args()
-
-    parsed_statistics = parse_statistics_db(os.path.join(args.dir, "me-1-big-Statistics.db"))
+def parse_sstable(table_dir, generation=1):
+    r"""
+    Prints the parsed Statistics.db and Data.db of one SSTable, each followed
+    by its annotated hexdump.
+    """
+    parsed_statistics = parse_statistics_db(os.path.join(table_dir, f"me-{generation}-big-Statistics.db"))
     print("")
-    parsed_data = parse_data_db(os.path.join(args.dir, "me-1-big-Data.db"), parsed_statistics)
+    parsed_data = parse_data_db(os.path.join(table_dir, f"me-{generation}-big-Data.db"), parsed_statistics)
 
     # # inspect:
     # for (k, v) in sstable.positioned_construct.global_position_map.items():
     #     print(k, v)
 
-main()
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('dir', type=str)
+    parser.add_argument('--generation', type=int, default=1)
+    args = parser.parse_args()
+    parse_sstable(args.dir, args.generation)
+
+if __name__ == '__main__':
+    main()
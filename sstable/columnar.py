@@ -0,0 +1,215 @@
+import array
+import struct
+
+import construct
+
+import sstable.varint
+import sstable.mmap_reader
+import sstable.row_decoder
+import sstable.sstable_data
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Decodes Data.db into batches of columns instead of rows, for analytics
+# that want typed arrays rather than one dict per row. Every column of a
+# batch is a Container with a `mask` (True for null, i.e. missing or empty
+# cells) and, depending on the type of the column:
+#
+# - fixed width types: `array`, a NumPy array of the type (int32, int64,
+#   float32, float64, datetime64[ms] for timestamps, bool).
+# - text and blobs: `offsets` (int64, one more than the rows) and `data`
+#   (uint8), value i being data[offsets[i]:offsets[i+1]], utf-8 for text.
+# - anything else: `array`, an object array of the decoded values.
+#
+# Rows are decoded lazily (see sstable.row_decoder.LazyCell), and the bytes
+# of fixed width and text values are copied from Data.db as they are, so no
+# Python object is made for them. Fixed width values are big endian in
+# Data.db, NumPy converts a whole column at once.
+
+# (struct format, dtype in Data.db, dtype of the column)
+FIXED_WIDTH_TYPES = {
+    "org.apache.cassandra.db.marshal.Int32Type": (">i", ">i4", "int32"),
+    "org.apache.cassandra.db.marshal.LongType": (">q", ">i8", "int64"),
+    "org.apache.cassandra.db.marshal.FloatType": (">f", ">f4", "float32"),
+    "org.apache.cassandra.db.marshal.DoubleType": (">d", ">f8", "float64"),
+    "org.apache.cassandra.db.marshal.TimestampType": (">q", ">i8", "datetime64[ms]"),
+    "org.apache.cassandra.db.marshal.BooleanType": (">B", "u1", "bool"),
+}
+VARIABLE_WIDTH_TYPES = {
+    "org.apache.cassandra.db.marshal.UTF8Type": "utf-8",
+    "org.apache.cassandra.db.marshal.AsciiType": "ascii",
+    "org.apache.cassandra.db.marshal.BytesType": None,
+}
+
+class FixedWidthColumn:
+    def __init__(self, type_name):
+        self.type_name = type_name
+        struct_format, data_type, self.dtype = FIXED_WIDTH_TYPES[type_name]
+        self.pack = struct.Struct(struct_format).pack
+        self.data_type = numpy.dtype(data_type)
+        self.size = self.data_type.itemsize
+        self.data = bytearray()
+        self.mask = bytearray()
+
+    def append_raw(self, buf, pos):
+        self.data += buf[pos:pos+self.size]
+        self.mask.append(0)
+
+    def append(self, value):
+        if value is None:
+            self.data += bytes(self.size)
+            self.mask.append(1)
+        else:
+            self.data += self.pack(value)
+            self.mask.append(0)
+
+    def finish(self):
+        values = numpy.frombuffer(bytes(self.data), dtype=self.data_type)
+        if self.dtype == "bool":
+            values = values != 0
+        else:
+            values = values.astype(self.data_type.newbyteorder("=")).astype(self.dtype)
+        return construct.Container(type=self.type_name, array=values, mask=numpy.frombuffer(bytes(self.mask), dtype=numpy.bool_))
+
+class VariableWidthColumn:
+    def __init__(self, type_name):
+        self.type_name = type_name
+        self.encoding = VARIABLE_WIDTH_TYPES.get(type_name)
+        self.data = bytearray()
+        self.offsets = array.array("q", [0])
+        self.mask = bytearray()
+
+    def append_raw(self, buf, pos):
+        length, pos = sstable.varint.decode(buf, pos)
+        self.data += buf[pos:pos+length]
+        self.offsets.append(len(self.data))
+        self.mask.append(0)
+
+    def append(self, value):
+        if value is not None:
+            self.data += value.encode(self.encoding) if isinstance(value, str) else value
+        self.offsets.append(len(self.data))
+        self.mask.append(value is None)
+
+    def finish(self):
+        return construct.Container(
+            type=self.type_name,
+            offsets=numpy.frombuffer(self.offsets, dtype=numpy.int64),
+            data=numpy.frombuffer(bytes(self.data), dtype=numpy.uint8),
+            mask=numpy.frombuffer(bytes(self.mask), dtype=numpy.bool_),
+        )
+
+class ObjectColumn:
+    def __init__(self, type_name):
+        self.type_name = type_name
+        self.values = []
+
+    def append(self, value):
+        self.values.append(value)
+
+    def finish(self):
+        values = numpy.empty(len(self.values), dtype=object)
+        values[:] = self.values
+        return construct.Container(type=self.type_name, array=values, mask=numpy.array([value is None for value in self.values], dtype=numpy.bool_))
+
+def make_column(type_name):
+    if type_name in FIXED_WIDTH_TYPES:
+        return FixedWidthColumn(type_name)
+    if type_name in VARIABLE_WIDTH_TYPES:
+        return VariableWidthColumn(type_name)
+    return ObjectColumn(type_name)
+
+def python_values(column):
+    r"""
+    The values of a column of a batch as a list, None for nulls, like the
+    values written by sstable.dump.
+    """
+    mask = column.mask.tolist()
+    if "offsets" in column:
+        encoding = VARIABLE_WIDTH_TYPES.get(column.type)
+        offsets = column.offsets.tolist()
+        data = column.data.tobytes()
+        values = [data[offsets[i]:offsets[i+1]] for i in range(len(mask))]
+        if encoding is not None:
+            values = [str(value, encoding) for value in values]
+    elif column.array.dtype.kind == "M":
+        # Milliseconds, like TimestampType values
+        values = column.array.astype(numpy.int64).tolist()
+    else:
+        values = column.array.tolist()
+    return [None if is_null else value for value, is_null in zip(values, mask)]
+
+class BatchBuilder:
+    def __init__(self, serialization_header, projection):
+        self.clustering_types = [typ.name for typ in serialization_header.clustering_key_types]
+        self.regular_types = [serialization_header.regular_columns[column_index].type.name for column_index in projection]
+        self.projection = projection
+        self.start()
+
+    def start(self):
+        self.rows = 0
+        self.partition_key = VariableWidthColumn("org.apache.cassandra.db.marshal.BytesType")
+        self.clustering = [make_column(type_name) for type_name in self.clustering_types]
+        self.columns = [make_column(type_name) for type_name in self.regular_types]
+
+    def append(self, partition, unfiltered):
+        self.rows += 1
+        self.partition_key.append(bytes(partition.partition_header.key))
+        clustering_cells = unfiltered.row.clustering_block.clustering_cells if unfiltered.row.clustering_block else []
+        for column, cell in zip(self.clustering, clustering_cells):
+            value = cell.key.cell_value
+            column.append(bytes(value) if isinstance(value, memoryview) else value)
+        for column, cell in zip(self.columns, sstable.row_decoder.project_cells(unfiltered.row.row_body, self.projection)):
+            if cell is None:
+                column.append(None)
+            elif "cell_flags" not in cell:
+                # Complex cells (lists, sets and maps) are kept as they are
+                column.append(cell)
+            elif cell.cell_flags & sstable.sstable_data.CellFlag.HAS_EMPTY_VALUE:
+                column.append(None)
+            elif dict.get(cell, "_lazy") is not None and not isinstance(column, ObjectColumn):
+                buf, pos, _ = dict.get(cell, "_lazy")
+                column.append_raw(buf, pos)
+            else:
+                value = cell.cell.cell_value
+                column.append(bytes(value) if isinstance(value, memoryview) else value)
+
+    def finish(self, column_names):
+        batch = construct.Container(
+            rows=self.rows,
+            partition_key=self.partition_key.finish(),
+            clustering=[column.finish() for column in self.clustering],
+            columns=construct.Container((name, column.finish()) for name, column in zip(column_names, self.columns)),
+        )
+        self.start()
+        return batch
+
+def iter_batches(sstable_statistics, data_stream, batch_size=65536, columns=None):
+    r"""
+    Yields batches of up to batch_size rows of Data.db, as Containers with
+    rows (the number of rows), partition_key (raw bytes, as offsets and
+    data), clustering (one column per clustering column) and columns (one
+    column per regular column, by name). With columns, a list of regular
+    column names, only those are decoded.
+    """
+    if numpy is None:
+        raise Exception("sstable.columnar needs numpy")
+    serialization_header = sstable_statistics.serialization_header
+    if columns is None:
+        column_names = [column.name for column in serialization_header.regular_columns]
+        projection = list(range(len(column_names)))
+    else:
+        column_names = list(columns)
+        projection = sstable.row_decoder.column_indexes(serialization_header, columns)
+    row_body_decoder = sstable.row_decoder.compile_row_body_decoder(serialization_header, columns=columns, lazy=True)
+
+    builder = BatchBuilder(serialization_header, projection)
+    for partition, unfiltered in sstable.mmap_reader.iter_rows(sstable_statistics, data_stream, row_body_decoder=row_body_decoder):
+        builder.append(partition, unfiltered)
+        if builder.rows == batch_size:
+            yield builder.finish(column_names)
+    if builder.rows:
+        yield builder.finish(column_names)
@@ -0,0 +1,209 @@
+import sstable.varint
+import sstable.greedy_range
+import sstable.mmap_reader
+import sstable.row_decoder
+import sstable.sstable_data
+
+# A smaller in-memory model of Data.db than the Containers of the grammar. A
+# parsed cell is two Containers (the cell and its value) in a list in a
+# Container in a Container, several hundred bytes for every cell. Here a
+# partition is a Partition with a list of Rows, and a row keeps its cell
+# values in one tuple and their flags in one bytes, so a cell is one slot of
+# a tuple and one byte, plus the value itself. Cell objects are only made
+# when they are asked for.
+#
+# iter_partitions decodes Data.db straight into these, see
+# benchmarks/compact_rows.py for the memory they take.
+
+class Cell:
+    __slots__ = ("flags", "value")
+
+    def __init__(self, flags, value):
+        self.flags = flags
+        self.value = value
+
+    def __eq__(self, other):
+        return isinstance(other, Cell) and (self.flags, self.value) == (other.flags, other.value)
+
+    def __repr__(self):
+        return f"Cell(flags={self.flags:#x}, value={self.value!r})"
+
+class Row:
+    r"""
+    flags are the row_flags of the unfiltered. clustering is the tuple of
+    clustering values. columns is None if the row has all the columns, and
+    the tuple of the indexes of the columns it has otherwise (missing_columns
+    in the grammar). cell_flags and values have one entry per cell, values
+    being None for cells with an empty value.
+    """
+    __slots__ = ("flags", "clustering", "timestamp_diff", "columns", "cell_flags", "values")
+
+    def __init__(self, flags, clustering, timestamp_diff, columns, cell_flags, values):
+        self.flags = flags
+        self.clustering = clustering
+        self.timestamp_diff = timestamp_diff
+        self.columns = columns
+        self.cell_flags = cell_flags
+        self.values = values
+
+    @property
+    def cells(self):
+        return [Cell(flags, value) for flags, value in zip(self.cell_flags, self.values)]
+
+    def cell(self, column_index):
+        r"""
+        The Cell of the regular column column_index, None if the row doesn't
+        have it.
+        """
+        if self.columns is not None:
+            if column_index not in self.columns:
+                return None
+            column_index = self.columns.index(column_index)
+        return Cell(self.cell_flags[column_index], self.values[column_index])
+
+    def __eq__(self, other):
+        return isinstance(other, Row) and all(getattr(self, name) == getattr(other, name) for name in Row.__slots__)
+
+    def __repr__(self):
+        return f"Row(clustering={self.clustering!r}, values={self.values!r})"
+
+class Partition:
+    __slots__ = ("key", "local_deletion_time", "marked_for_delete_at", "rows")
+
+    def __init__(self, key, local_deletion_time, marked_for_delete_at, rows):
+        self.key = key
+        self.local_deletion_time = local_deletion_time
+        self.marked_for_delete_at = marked_for_delete_at
+        self.rows = rows
+
+    def __eq__(self, other):
+        return isinstance(other, Partition) and all(getattr(self, name) == getattr(other, name) for name in Partition.__slots__)
+
+    def __repr__(self):
+        return f"Partition(key={self.key!r}, rows={len(self.rows)})"
+
+def compact_value(value):
+    # Slices of a memory map would keep it open, and are larger than small
+    # bytes objects
+    return bytes(value) if isinstance(value, memoryview) else value
+
+def from_cell(cell):
+    r"""
+    (flags, value) of a parsed cell. Complex cells (lists, sets and maps)
+    have no flags of their own, and are kept as they are.
+    """
+    if "cell_flags" not in cell:
+        return 0, cell
+    if cell.cell is None or cell.cell_flags & sstable.sstable_data.CellFlag.HAS_EMPTY_VALUE:
+        return cell.cell_flags, None
+    return cell.cell_flags, compact_value(cell.cell.cell_value)
+
+def from_unfiltered(unfiltered):
+    row = unfiltered.row
+    clustering = ()
+    if row.clustering_block:
+        clustering = tuple(compact_value(cell.key.cell_value) for cell in row.clustering_block.clustering_cells)
+    return make_row(unfiltered.row_flags, clustering, row.row_body)
+
+def make_row(row_flags, clustering, row_body):
+    flags_and_values = [from_cell(cell) for cell in row_body.cells]
+    return Row(
+        row_flags,
+        clustering,
+        row_body.timestamp_diff,
+        tuple(row_body.missing_columns) if row_body.missing_columns is not None else None,
+        bytes(flags for flags, _ in flags_and_values),
+        tuple(value for _, value in flags_and_values),
+    )
+
+def from_partition(partition):
+    r"""
+    The Partition of a partition parsed by sstable.sstable_data.partition (or
+    any reader with the same output).
+    """
+    deletion_time = partition.partition_header.deletion_time
+    return Partition(
+        bytes(partition.partition_header.key),
+        deletion_time.local_deletion_time,
+        deletion_time.marked_for_delete_at,
+        [from_unfiltered(unfiltered) for unfiltered in partition.unfiltereds if not unfiltered.row_flags & sstable.sstable_data.RowFlag.END_OF_PARTITION],
+    )
+
+class PartitionDecoder:
+    r"""
+    Same as sstable.mmap_reader.PartitionDecoder, without making the
+    Containers of the partition, the rows and the clustering blocks.
+    """
+    def __init__(self, sstable_statistics, row_body_decoder):
+        serialization_header = sstable_statistics.serialization_header
+        self.row_body_decoder = row_body_decoder
+        self.clustering_decoders = [sstable.row_decoder.compile_value_decoder(typ.name) for typ in serialization_header.clustering_key_types]
+
+    def decode(self, buf, pos):
+        key_len, = sstable.mmap_reader.unpack_partition_header(buf, pos)
+        pos += 2
+        key = bytes(buf[pos:pos+key_len])
+        pos += key_len
+        local_deletion_time, marked_for_delete_at = sstable.mmap_reader.unpack_deletion_time(buf, pos)
+        pos += 12
+
+        rows = []
+        while True:
+            row_flags = buf[pos]
+            pos += 1
+            if row_flags & sstable.sstable_data.RowFlag.END_OF_PARTITION:
+                break
+
+            clustering = ()
+            if self.clustering_decoders:
+                # The clustering_block_header
+                pos += 1
+                values = []
+                for decode_value in self.clustering_decoders:
+                    value, pos = decode_value(buf, pos)
+                    values.append(compact_value(value.cell_value))
+                clustering = tuple(values)
+
+            serialized_row_body_size, pos = sstable.varint.decode(buf, pos)
+            decoded = self.row_body_decoder.decode(buf[pos:pos+serialized_row_body_size], row_flags, pos)
+            if decoded is None:
+                raise sstable.row_decoder.Fallback()
+            row_body, row_body_size = decoded
+            pos += row_body_size
+            rows.append(make_row(row_flags, clustering, row_body))
+
+        return Partition(key, local_deletion_time, marked_for_delete_at, rows), pos
+
+def iter_partitions(sstable_statistics, data_stream, row_body_decoder=None):
+    r"""
+    Yields a Partition for every partition of Data.db. Partitions the
+    compiled decoders can't decode are parsed by the grammar and converted,
+    so the result is the same as from_partition of
+    sstable.sstable_data.iter_partitions.
+    """
+    if row_body_decoder is None:
+        row_body_decoder = sstable.row_decoder.compile_row_body_decoder(sstable_statistics.serialization_header)
+    stream, buf = sstable.mmap_reader.map_stream(data_stream)
+    partition_decoder = PartitionDecoder(sstable_statistics, row_body_decoder)
+    can_decode = None not in partition_decoder.clustering_decoders
+
+    def parse_partition():
+        start = stream.tell()
+        if can_decode:
+            try:
+                p, end = partition_decoder.decode(buf, start)
+                stream.seek(end)
+                return p
+            except Exception:
+                stream.seek(start)
+        return from_partition(sstable.sstable_data.partition.parse_stream(stream, sstable_statistics=sstable_statistics, row_body_decoder=row_body_decoder))
+
+    return sstable.greedy_range.iter_with_exception_handling(parse_partition, stream)
+
+def rows_of(partitions):
+    r"""
+    Yields (partition, row) for every row, like sstable.sstable_data.rows_of.
+    """
+    for p in partitions:
+        for row in p.rows:
+            yield p, row
@@ -0,0 +1,280 @@
+import os
+import sys
+import time
+import argparse
+import contextlib
+
+import construct
+
+import sstable.merge
+import sstable.sstable_data
+import sstable.sstable_index
+import sstable.sstable_reader
+import sstable.sstable_statistics
+import sstable.compressed_data
+
+# Compacts SSTables of a table directory into one new SSTable. Partitions are
+# merged with sstable.merge, which drops the shadowed rows and cells, the
+# tombstones that nothing can need anymore are purged, and every partition
+# is written as soon as it is merged, so only one partition per input is in
+# memory.
+# https://github.com/apache/cassandra/blob/cassandra-3.0/src/java/org/apache/cassandra/db/compaction/CompactionIterator.java
+#
+# A tombstone is purgeable once gc_grace_seconds have passed since the
+# deletion, if it is older than all the data of the SSTables of the table
+# that are not compacted, since it could still shadow some of it.
+# https://github.com/apache/cassandra/blob/cassandra-3.0/src/java/org/apache/cassandra/db/compaction/CompactionController.java
+#
+# The grammar doesn't parse the TTL and the local deletion time of rows and
+# cells. Expired data is only dropped with fully expired SSTables, whose
+# max_local_deletion_time is before gc_before, and cell tombstones are taken
+# as deleted when they were written.
+#
+# The output has Data.db, Index.db (without promoted indexes) and a
+# Statistics.db with only the serialization header, like sstable/import.py
+# builds.
+
+# Default gc_grace_seconds of a table, 10 days
+GC_GRACE_SECONDS = 864000
+# local_deletion_time of a live partition, Integer.MAX_VALUE
+NO_DELETION_TIME = 0x7fffffff
+
+def build_statistics(serialization_header):
+    return sstable.sstable_statistics.statistics_format.build({
+        "metadata_count": 1,
+        "toc": [{"type": sstable.sstable_statistics.SERIALIZATION_METADATA, "offset": (1 + 2) * 4}],
+        "validation_metadata": None,
+        "compaction_metadata": None,
+        "statistics_metadata": None,
+        "serialization_header": serialization_header,
+    })
+
+class SSTableWriter:
+    r"""
+    Writes partitions, with the fields of sstable.sstable_data.partition, to
+    a new SSTable. The components are written to temporary files, and renamed
+    by close, Data.db last, so a failed compaction leaves no SSTable behind.
+    Rows have a cell for every column, None for the ones they don't have,
+    like the rows of sstable.merge.
+    """
+    def __init__(self, table_dir, generation, serialization_header):
+        self.paths = [sstable.sstable_reader.component_path(table_dir, generation, component) for component in ["Statistics", "Index", "Data"]]
+        statistics_bytes = build_statistics(serialization_header)
+        self.statistics = sstable.sstable_statistics.statistics_format.parse(statistics_bytes)
+        with open(self.paths[0] + ".tmp", "wb") as f:
+            f.write(statistics_bytes)
+        self.index_file = open(self.paths[1] + ".tmp", "wb")
+        self.data_file = open(self.paths[2] + ".tmp", "wb")
+        self.data_size = 0
+        self.partitions = 0
+        self.rows = 0
+
+    def build_unfiltered(self, unfiltered, previous_unfiltered_size):
+        RowFlag = sstable.sstable_data.RowFlag
+        cells = unfiltered.row.row_body.cells
+        present = [i for i, cell in enumerate(cells) if cell is not None]
+        row_flags = unfiltered.row_flags & ~RowFlag.HAS_ALL_COLUMNS
+        if len(present) == len(cells):
+            row_flags |= RowFlag.HAS_ALL_COLUMNS
+        row_body = construct.Container(
+            previous_unfiltered_size=previous_unfiltered_size,
+            timestamp_diff=unfiltered.row.row_body.timestamp_diff,
+            missing_columns=None if row_flags & RowFlag.HAS_ALL_COLUMNS else present,
+            cells=[cells[i] for i in present],
+        )
+        serialized_row_body_size = len(sstable.sstable_data.row_body_format.build(row_body, overridden_row_flags=row_flags, sstable_statistics=self.statistics))
+        return sstable.sstable_data.unfiltered.build({
+            "row_flags": row_flags,
+            "row": {
+                "clustering_block": unfiltered.row.clustering_block,
+                "serialized_row_body_size": serialized_row_body_size,
+                "row_body": row_body,
+            },
+        }, sstable_statistics=self.statistics)
+
+    def write_partition(self, partition):
+        header = partition.partition_header
+        chunks = [sstable.sstable_data.partition_header.build(header)]
+        # The distance from the start of the previous unfiltered, or of the
+        # partition for the first one
+        # https://github.com/apache/cassandra/blob/cassandra-3.0/src/java/org/apache/cassandra/db/ColumnIndex.java
+        pos = previous_start = 0
+        pos += len(chunks[0])
+        for unfiltered in partition.unfiltereds:
+            if unfiltered.row_flags & sstable.sstable_data.RowFlag.END_OF_PARTITION:
+                continue
+            chunks.append(self.build_unfiltered(unfiltered, pos - previous_start))
+            previous_start = pos
+            pos += len(chunks[-1])
+            self.rows += 1
+        chunks.append(bytes([sstable.sstable_data.RowFlag.END_OF_PARTITION]))
+
+        self.index_file.write(sstable.sstable_index.index_entry.build({
+            "key_len": len(header.key),
+            "key": header.key,
+            "position": self.data_size,
+            "promoted_index_size": 0,
+            "promoted_index": None,
+        }))
+        data = b"".join(chunks)
+        self.data_file.write(data)
+        self.data_size += len(data)
+        self.partitions += 1
+
+    def close(self):
+        self.index_file.close()
+        self.data_file.close()
+        for path in self.paths:
+            os.replace(path + ".tmp", path)
+
+    def abort(self):
+        self.index_file.close()
+        self.data_file.close()
+        for path in self.paths:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path + ".tmp")
+
+def purge_partition(partition, gc_before, max_purgeable_timestamp, stats):
+    r"""
+    Returns partition without its purgeable tombstones, or None if nothing
+    is left of it. gc_before is in seconds, like local deletion times.
+    """
+    RowFlag = sstable.sstable_data.RowFlag
+    header = partition.partition_header
+    deletion_time = header.deletion_time
+    if deletion_time.marked_for_delete_at != sstable.merge.LIVE:
+        marked_for_delete_at = sstable.merge.to_signed64(deletion_time.marked_for_delete_at)
+        if deletion_time.local_deletion_time < gc_before and marked_for_delete_at < max_purgeable_timestamp:
+            header = construct.Container(header, deletion_time=construct.Container(local_deletion_time=NO_DELETION_TIME, marked_for_delete_at=sstable.merge.LIVE))
+            stats.purged_tombstones += 1
+
+    unfiltereds = []
+    for unfiltered in partition.unfiltereds:
+        if unfiltered.row_flags & RowFlag.END_OF_PARTITION:
+            continue
+        row_body = unfiltered.row.row_body
+        cells = list(row_body.cells)
+        for i, (cell, timestamp) in enumerate(zip(cells, row_body.cell_timestamps)):
+            if cell is None or not cell.get("cell_flags", 0) & sstable.sstable_data.CellFlag.IS_DELETED:
+                continue
+            if timestamp // 1000000 < gc_before and timestamp < max_purgeable_timestamp:
+                cells[i] = None
+                stats.purged_tombstones += 1
+        if not unfiltered.row_flags & RowFlag.HAS_TIMESTAMP and all(cell is None for cell in cells):
+            continue
+        unfiltereds.append(construct.Container(unfiltered, row=construct.Container(unfiltered.row, row_body=construct.Container(row_body, cells=cells))))
+
+    if not unfiltereds and header.deletion_time.marked_for_delete_at == sstable.merge.LIVE:
+        return None
+    unfiltereds.append(construct.Container(row_flags=RowFlag.END_OF_PARTITION, row=None))
+    return construct.Container(partition_header=header, unfiltereds=unfiltereds)
+
+def may_be_fully_expired(sstable_statistics, gc_before):
+    # Everything in it is deleted or expired, and older than gc_before
+    statistics_metadata = sstable_statistics.statistics_metadata
+    if statistics_metadata is None:
+        return False
+    return statistics_metadata.max_local_deletion_time < gc_before
+
+def fully_expired(inputs_statistics, gc_before, max_purgeable_timestamp):
+    r"""
+    The indexes of the inputs that can be dropped without being read: the
+    ones that may be fully expired and are older than all the data of the
+    SSTables that are not compacted and of the inputs that are not dropped,
+    since they could shadow some of it.
+    https://github.com/apache/cassandra/blob/cassandra-3.0/src/java/org/apache/cassandra/db/compaction/CompactionController.java#L98-L144
+    """
+    candidates = [i for i, statistics in enumerate(inputs_statistics) if may_be_fully_expired(statistics, gc_before)]
+    for i, statistics in enumerate(inputs_statistics):
+        if i not in candidates:
+            max_purgeable_timestamp = min(max_purgeable_timestamp, min_timestamp(statistics))
+    return [i for i in candidates if inputs_statistics[i].statistics_metadata.max_timestamp < max_purgeable_timestamp]
+
+def min_timestamp(sstable_statistics):
+    if sstable_statistics.statistics_metadata is not None:
+        return sstable_statistics.statistics_metadata.min_timestamp
+    return sstable.sstable_statistics.min_timestamp(sstable_statistics.serialization_header)
+
+def compact(table_dir, output_dir, generations=None, output_generation=None, gc_grace_seconds=GC_GRACE_SECONDS, now=None, compiled=True):
+    r"""
+    Compacts the SSTables of the given generations in table_dir (all of them
+    by default) into a new SSTable in output_dir, with the generation after
+    the last one in output_dir by default. The inputs are left as they are.
+    now is in seconds since the epoch. Returns the counts of what was done.
+    """
+    all_generations = sstable.sstable_reader.list_generations(table_dir)
+    generations = all_generations if generations is None else sorted(generations)
+    readers = [sstable.sstable_reader.SSTableReader(table_dir, generation, compiled=compiled) for generation in generations]
+    others = [sstable.sstable_reader.SSTableReader(table_dir, generation, compiled=False) for generation in all_generations if generation not in generations]
+    now = int(time.time()) if now is None else now
+    gc_before = now - gc_grace_seconds
+    max_purgeable_timestamp = min((min_timestamp(reader.statistics) for reader in others), default=1 << 63)
+
+    stats = construct.Container(
+        sstables=len(readers),
+        fully_expired=0,
+        generation=None,
+        partitions=0,
+        rows=0,
+        purged_tombstones=0,
+        bytes_in=sum(os.path.getsize(reader.path("Data")) for reader in readers),
+        bytes_out=0,
+        seconds=0,
+    )
+    start = time.perf_counter()
+    expired = fully_expired([reader.statistics for reader in readers], gc_before, max_purgeable_timestamp)
+    stats.fully_expired = len(expired)
+    inputs = [reader for i, reader in enumerate(readers) if i not in expired]
+    if not inputs:
+        stats.seconds = time.perf_counter() - start
+        return stats
+
+    # Rows of a partition in several inputs are sorted by clustering_sort_key,
+    # which can't order all the types, and Data.db must be in order
+    merger = sstable.merge.Merger([reader.statistics for reader in inputs])
+    unordered_types = sstable.merge.unordered_clustering_types(merger.statistics.serialization_header.clustering_key_types)
+    if len(inputs) > 1 and unordered_types:
+        raise Exception(f"Can't compact SSTables with clustering columns of type {unordered_types[0]}, their rows can't be sorted")
+
+    if output_generation is None:
+        os.makedirs(output_dir, exist_ok=True)
+        output_generation = max(sstable.sstable_reader.list_generations(output_dir), default=0) + 1
+    stats.generation = output_generation
+    writer = SSTableWriter(output_dir, output_generation, merger.statistics.serialization_header)
+    try:
+        with contextlib.ExitStack() as stack:
+            iterators = []
+            for reader in inputs:
+                data_file = stack.enter_context(sstable.compressed_data.open_data_file(reader.path("Data")))
+                iterators.append(sstable.sstable_data.iter_partitions(reader.statistics, data_file, row_body_decoder=reader.row_body_decoder))
+            for partition in merger.merge(iterators):
+                partition = purge_partition(partition, gc_before, max_purgeable_timestamp, stats)
+                if partition is not None:
+                    writer.write_partition(partition)
+    except BaseException:
+        writer.abort()
+        raise
+    writer.close()
+
+    stats.partitions = writer.partitions
+    stats.rows = writer.rows
+    stats.bytes_out = writer.data_size
+    stats.seconds = time.perf_counter() - start
+    return stats
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('dir', type=str)
+    parser.add_argument('output_dir', type=str)
+    parser.add_argument('--generations', type=str, help="comma separated generations to compact, all by default")
+    parser.add_argument('--gc-grace-seconds', type=int, default=GC_GRACE_SECONDS)
+    parser.add_argument('--now', type=int, help="current time in seconds since the epoch, for purging tombstones")
+    parser.add_argument('--engine', type=str, default="compiled", choices=["compiled", "construct"])
+    args = parser.parse_args()
+
+    generations = [int(generation) for generation in args.generations.split(",")] if args.generations else None
+    stats = compact(args.dir, args.output_dir, generations=generations, gc_grace_seconds=args.gc_grace_seconds, now=args.now, compiled=args.engine == "compiled")
+    output = f"me-{stats.generation}-big-Data.db" if stats.generation is not None else "nothing"
+    throughput = stats.bytes_in / stats.seconds / 1e6 if stats.seconds else 0
+    print(f"Compacted {stats.sstables} SSTables ({stats.fully_expired} fully expired) into {output}: {stats.partitions} partitions, {stats.rows} rows, {stats.purged_tombstones} tombstones purged", file=sys.stderr)
+    print(f"{stats.bytes_in} bytes in, {stats.bytes_out} bytes out ({stats.bytes_out / max(stats.bytes_in, 1):.1%}), {stats.seconds:.3f}s, {throughput:.2f} MB/s", file=sys.stderr)
@@ -0,0 +1,231 @@
+import io
+import os
+import zlib
+import collections
+
+import construct
+
+import sstable.utils
+
+# Compressed SSTables store Data.db in chunks of chunk_length uncompressed
+# bytes, each compressed on its own and followed by a 4 byte CRC32, and the
+# offsets of the chunks in CompressionInfo.db.
+# https://github.com/apache/cassandra/blob/cassandra-3.0/src/java/org/apache/cassandra/io/compress/CompressionMetadata.java
+#
+# CompressedDataReader is a seekable stream over the uncompressed Data.db that
+# only decompresses the chunks that are read, so that it can be used in place
+# of the file object of an uncompressed Data.db.
+
+try:
+    import lz4.block
+except ImportError:
+    lz4 = None
+
+try:
+    import snappy
+except ImportError:
+    snappy = None
+
+# Java's writeUTF
+java_utf = construct.PascalString(construct.Int16ub, "utf8")
+
+compression_info_format = construct.Struct(
+    "compressor" / java_utf, # e.g. LZ4Compressor
+    "options_count" / construct.Int32ub,
+    "options" / construct.Array(construct.this.options_count, construct.Struct(
+        "key" / java_utf,
+        "value" / java_utf,
+    )),
+    "chunk_length" / construct.Int32ub,
+    "data_length" / construct.Int64ub, # uncompressed
+    "chunk_count" / construct.Int32ub,
+    "chunk_offsets" / construct.Array(construct.this.chunk_count, construct.Int64ub),
+)
+
+def lz4_block_decompress(src, uncompressed_size):
+    r"""
+    Pure Python decoder of the LZ4 block format:
+    https://github.com/lz4/lz4/blob/dev/doc/lz4_Block_format.md
+    """
+    dst = bytearray()
+    i = 0
+    end = len(src)
+    while i < end:
+        token = src[i]
+        i += 1
+
+        literals_length = token >> 4
+        if literals_length == 15:
+            while True:
+                byte = src[i]
+                i += 1
+                literals_length += byte
+                if byte != 255:
+                    break
+        dst += src[i:i+literals_length]
+        i += literals_length
+        if i >= end:
+            # The last sequence only has literals
+            break
+
+        offset = src[i] | (src[i+1] << 8)
+        i += 2
+        if offset == 0 or offset > len(dst):
+            raise ValueError(f"Invalid LZ4 match offset {offset} at {i - 2}")
+        match_length = token & 15
+        if match_length == 15:
+            while True:
+                byte = src[i]
+                i += 1
+                match_length += byte
+                if byte != 255:
+                    break
+        match_length += 4
+
+        start = len(dst) - offset
+        if offset >= match_length:
+            dst += dst[start:start+match_length]
+        else:
+            # The match overlaps with what it writes, i.e. repeats the last
+            # `offset` bytes
+            pattern = dst[start:]
+            dst += (pattern * (match_length // offset + 1))[:match_length]
+
+    if len(dst) != uncompressed_size:
+        raise ValueError(f"LZ4 block decompressed to {len(dst)} bytes, expected {uncompressed_size}")
+    return bytes(dst)
+
+# abcabcabc, as 3 literals followed by a 6 byte match at offset 3:
+sstable.utils.assert_equal(b"abcabcabc", lz4_block_decompress(bytes([0x32]) + b"abc" + bytes([3, 0]) + bytes([0x00]), 9))
+
+def lz4_decompress(chunk):
+    # Cassandra's LZ4Compressor prefixes the block with its uncompressed
+    # length, in little endian.
+    uncompressed_size = int.from_bytes(chunk[:4], "little")
+    if lz4 is not None:
+        return lz4.block.decompress(chunk[4:], uncompressed_size=uncompressed_size)
+    return lz4_block_decompress(chunk[4:], uncompressed_size)
+
+def snappy_decompress(chunk):
+    if snappy is None:
+        raise Exception("SnappyCompressor needs the python-snappy module")
+    return snappy.uncompress(chunk)
+
+DECOMPRESSORS = {
+    "LZ4Compressor": lz4_decompress,
+    "SnappyCompressor": snappy_decompress,
+    "DeflateCompressor": zlib.decompress,
+    "NoopCompressor": bytes,
+}
+
+DEFAULT_CACHE_SIZE = 16 * 1024 * 1024
+
+def compression_info_path(data_path):
+    return str(data_path)[:-len("Data.db")] + "CompressionInfo.db"
+
+class CompressedDataReader(io.RawIOBase):
+    r"""
+    Read-only, seekable stream over the uncompressed content of a compressed
+    Data.db. The decompressed chunks are kept in an LRU cache of at most
+    cache_size bytes (the chunk being read is always kept).
+    """
+    def __init__(self, compressed_stream, compression_info, cache_size=DEFAULT_CACHE_SIZE):
+        if compression_info.compressor not in DECOMPRESSORS:
+            raise Exception(f"Unsupported compressor {compression_info.compressor}")
+        self.compressed_stream = compressed_stream
+        self.compression_info = compression_info
+        self.decompress = DECOMPRESSORS[compression_info.compressor]
+        self.chunk_length = compression_info.chunk_length
+        self.length = compression_info.data_length
+        self.chunk_offsets = list(compression_info.chunk_offsets)
+        # The last chunk ends at the end of the file
+        self.chunk_offsets.append(compressed_stream.seek(0, io.SEEK_END))
+        self.cache_size = cache_size
+        self.cache = collections.OrderedDict()
+        self.cached_bytes = 0
+        self.chunks_decompressed = 0
+        self.position = 0
+
+    def read_chunk(self, chunk_index):
+        chunk = self.cache.get(chunk_index)
+        if chunk is not None:
+            self.cache.move_to_end(chunk_index)
+            return chunk
+
+        start = self.chunk_offsets[chunk_index]
+        # Without the CRC32 at the end
+        compressed_length = self.chunk_offsets[chunk_index + 1] - start - 4
+        self.compressed_stream.seek(start)
+        chunk = self.decompress(self.compressed_stream.read(compressed_length))
+        self.chunks_decompressed += 1
+
+        self.cache[chunk_index] = chunk
+        self.cached_bytes += len(chunk)
+        while self.cached_bytes > self.cache_size and len(self.cache) > 1:
+            _, evicted = self.cache.popitem(last=False)
+            self.cached_bytes -= len(evicted)
+        return chunk
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self.position + offset
+        elif whence == io.SEEK_END:
+            position = self.length + offset
+        else:
+            raise ValueError(f"Invalid whence {whence}")
+        if position < 0:
+            raise ValueError(f"Negative seek position {position}")
+        self.position = position
+        return position
+
+    def read(self, size=-1):
+        end = self.length if size is None or size < 0 else min(self.position + size, self.length)
+        parts = []
+        while self.position < end:
+            chunk_index, chunk_offset = divmod(self.position, self.chunk_length)
+            chunk = self.read_chunk(chunk_index)
+            part = chunk[chunk_offset:chunk_offset + end - self.position]
+            if not part:
+                break
+            parts.append(part)
+            self.position += len(part)
+        if len(parts) == 1:
+            return parts[0]
+        return b"".join(parts)
+
+    def readall(self):
+        return self.read()
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        self.cache.clear()
+        self.cached_bytes = 0
+        self.compressed_stream.close()
+        super().close()
+
+def open_data_file(data_path, cache_size=DEFAULT_CACHE_SIZE):
+    r"""
+    Opens Data.db, through a CompressedDataReader if the SSTable has a
+    CompressionInfo.db.
+    """
+    info_path = compression_info_path(data_path)
+    if not os.path.exists(info_path):
+        return open(data_path, "rb")
+    with open(info_path, "rb") as f:
+        compression_info = compression_info_format.parse_stream(f)
+    return CompressedDataReader(open(data_path, "rb"), compression_info, cache_size=cache_size)
@@ -0,0 +1,264 @@
+import os
+import csv
+import gzip
+import uuid
+import queue
+import argparse
+import datetime
+import threading
+
+import sstable.utils
+import sstable.dump
+import sstable.query
+import sstable.sstable_data
+import sstable.sstable_statistics
+import sstable.compressed_data
+
+# CSV with the values formatted by their column type, e.g. partition keys
+# decoded with partition_key_type instead of b'\x00\x00\x00\x01', booleans as
+# true and false, timestamps in ISO 8601 and uuids as uuids. Null (missing
+# and empty) values are empty fields. sstable.dump.CsvWriter writes whatever
+# the parser returns, and stays as it is.
+#
+#     python -m sstable.dump --format typed-csv DIR
+#     python -m sstable.csv_export DIR OUTPUT.csv.gz
+
+MARSHAL = "org.apache.cassandra.db.marshal."
+COMPOSITE_TYPE = "org.apache.cassandra.db.marshal.CompositeType("
+
+def format_timestamp(milliseconds):
+    # Like cqlsh, with milliseconds, always in UTC
+    moment = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc) + datetime.timedelta(milliseconds=milliseconds)
+    return moment.isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+sstable.utils.assert_equal("1970-01-01T00:00:00.000Z", format_timestamp(0))
+sstable.utils.assert_equal("1950-01-01T00:00:00.000Z", format_timestamp(-631152000000))
+
+def format_bytes(value):
+    return bytes(value).hex()
+
+def format_boolean(value):
+    return "true" if value else "false"
+
+# The formatters take the values of sstable.sstable_data (and of the compiled
+# decoders). The other types are written as str(value).
+formatters = {
+    MARSHAL + "UTF8Type": str,
+    MARSHAL + "AsciiType": str,
+    MARSHAL + "BytesType": format_bytes,
+    # tinyint, which the grammar leaves as one byte
+    MARSHAL + "ByteType": lambda value: str(int.from_bytes(value, "big", signed=True)),
+    MARSHAL + "BooleanType": format_boolean,
+    MARSHAL + "Int32Type": str,
+    MARSHAL + "LongType": str,
+    MARSHAL + "ShortType": str,
+    MARSHAL + "IntegerType": str,
+    MARSHAL + "DecimalType": repr,
+    MARSHAL + "FloatType": repr,
+    MARSHAL + "DoubleType": repr,
+    MARSHAL + "TimestampType": format_timestamp,
+    MARSHAL + "UUIDType": lambda value: str(uuid.UUID(bytes=bytes(value))),
+    MARSHAL + "TimeUUIDType": lambda value: str(uuid.UUID(bytes=bytes(value))),
+}
+
+def value_formatter(type_name):
+    format_value = formatters.get(sstable.query.base_type(type_name), str)
+    def format_or_null(value):
+        return "" if value is None else format_value(value)
+    return format_or_null
+
+def split_composite(raw):
+    r"""
+    The components of a CompositeType value: a 2 bytes length, the value and
+    an end of component byte each.
+    https://github.com/apache/cassandra/blob/cassandra-3.0/src/java/org/apache/cassandra/db/marshal/CompositeType.java#L33-L55
+    """
+    components = []
+    pos = 0
+    while pos < len(raw):
+        length = int.from_bytes(raw[pos:pos+2], "big")
+        components.append(raw[pos+2:pos+2+length])
+        pos += 2 + length + 1
+    return components
+
+sstable.utils.assert_equal([b"ab", b""], split_composite(b"\x00\x02ab\x00\x00\x00\x00"))
+
+def composite_types(type_name):
+    # CompositeType(a,b(c,d)) -> [a, b(c,d)]
+    types = []
+    depth = 0
+    start = len(COMPOSITE_TYPE)
+    for i in range(start, len(type_name) - 1):
+        if type_name[i] == "(":
+            depth += 1
+        elif type_name[i] == ")":
+            depth -= 1
+        elif type_name[i] == "," and depth == 0:
+            types.append(type_name[start:i])
+            start = i + 1
+    types.append(type_name[start:len(type_name) - 1])
+    return types
+
+sstable.utils.assert_equal([MARSHAL + "UTF8Type", MARSHAL + "ReversedType(" + MARSHAL + "Int32Type)"], composite_types(COMPOSITE_TYPE + MARSHAL + "UTF8Type," + MARSHAL + "ReversedType(" + MARSHAL + "Int32Type))"))
+
+def partition_key_formatter(type_name):
+    r"""
+    Formats partition keys of type_name. Keys are stored without a length,
+    like the clustering values in Statistics.db, so they are decoded with
+    sstable.query.raw_value_decoders. The components of composite keys are
+    joined with ":", like sstabledump does. Keys of other types are written
+    in hex.
+    """
+    if type_name.startswith(COMPOSITE_TYPE):
+        component_formatters = [partition_key_formatter(component_type) for component_type in composite_types(type_name)]
+        return lambda key: ":".join(format_key(component) for format_key, component in zip(component_formatters, split_composite(bytes(key))))
+    decode = sstable.query.raw_value_decoders.get(type_name)
+    if decode is None:
+        if type_name in (MARSHAL + "UUIDType", MARSHAL + "TimeUUIDType"):
+            return formatters[type_name]
+        return format_bytes
+    format_value = formatters[type_name]
+    return lambda key: format_value(decode(bytes(key)))
+
+class TypedCsvWriter:
+    r"""
+    Writes rows like sstable.dump.CsvWriter, with the partition key and every
+    value formatted by its type (see set_column_types, which
+    sstable.dump.write_rows calls). Rows are written BATCH_SIZE at a time
+    with writerows.
+    """
+    BATCH_SIZE = 4096
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.csv_writer = csv.writer(writer)
+        self.rows = []
+        self.format_key = format_bytes
+        self.value_formatters = None
+    def set_column_types(self, partition_key_type, clustering_types, regular_types):
+        self.format_key = partition_key_formatter(partition_key_type)
+        self.value_formatters = [value_formatter(type_name) for type_name in clustering_types + regular_types]
+    def set_column_names(self, clustering_column_names, regular_column_names):
+        pass
+    def write_header(self, clustering_column_names, regular_column_names):
+        self.csv_writer.writerow(["partition_key"] + clustering_column_names + regular_column_names)
+    def write_row(self, partition_key_value, clustering_column_values, regular_column_values):
+        values = clustering_column_values + regular_column_values
+        self.rows.append([self.format_key(partition_key_value)] + [format_value(value) for format_value, value in zip(self.value_formatters, values)])
+        if len(self.rows) >= self.BATCH_SIZE:
+            self.flush()
+    def flush(self):
+        if self.rows:
+            self.csv_writer.writerows(self.rows)
+            self.rows.clear()
+
+class BackgroundGzipWriter:
+    r"""
+    A text stream that gzips what is written to it on another thread, so
+    that compressing (zlib releases the GIL) overlaps with decoding. At most
+    max_pending chunks wait to be compressed.
+    """
+    def __init__(self, path, chunk_size=1 << 20, max_pending=16, compresslevel=6):
+        self.file = gzip.open(path, "wb", compresslevel=compresslevel)
+        self.chunk_size = chunk_size
+        self.chunks = []
+        self.size = 0
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.error = None
+        self.thread = threading.Thread(target=self.compress, daemon=True)
+        self.thread.start()
+
+    def compress(self):
+        while True:
+            chunk = self.queue.get()
+            if chunk is None:
+                return
+            try:
+                self.file.write(chunk.encode("utf-8"))
+            except Exception as e:
+                self.error = e
+
+    def write(self, text):
+        self.chunks.append(text)
+        self.size += len(text)
+        if self.size >= self.chunk_size:
+            self.flush()
+        return len(text)
+
+    def send(self):
+        if self.chunks:
+            self.queue.put("".join(self.chunks))
+            self.chunks = []
+            self.size = 0
+
+    def flush(self):
+        self.send()
+        if self.error is not None:
+            raise self.error
+
+    def close(self, raise_error=True):
+        r"""
+        Writes what is left and closes the file. Without raise_error, the
+        errors of the compressor and of closing the file are not raised.
+        """
+        self.send()
+        self.queue.put(None)
+        self.thread.join()
+        try:
+            self.file.close()
+        except Exception as e:
+            self.error = self.error or e
+        if raise_error and self.error is not None:
+            raise self.error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # An error of the compressor doesn't hide the one of the export
+        self.close(raise_error=exc_type is None)
+
+def open_output(path, compress=None, buffer_size=1 << 20):
+    r"""
+    A text stream for the CSV, gzipped if compress is set (by default, if path
+    ends with .gz).
+    """
+    if compress is None:
+        compress = path.endswith(".gz")
+    if compress:
+        return BackgroundGzipWriter(path, chunk_size=buffer_size)
+    return open(path, "w", newline="", buffering=buffer_size)
+
+def export(table_dir, output_path, compress=None, engine="compiled", columns=None, generation=1):
+    r"""
+    Writes the SSTable of the given generation in table_dir to output_path
+    as typed CSV. Returns the number of rows.
+    """
+    path = lambda component: os.path.join(table_dir, f"me-{generation}-big-{component}.db")
+    with open(path("Statistics"), "rb") as f:
+        parsed_statistics = sstable.sstable_statistics.statistics_format.parse_stream(f)
+    row_body_decoder = sstable.dump.make_row_body_decoder(parsed_statistics, engine, columns=columns)
+    count = 0
+    def counted(rows):
+        nonlocal count
+        for row in rows:
+            count += 1
+            yield row
+    with open_output(output_path, compress=compress) as output, sstable.compressed_data.open_data_file(path("Data")) as data_file:
+        writer = TypedCsvWriter(output)
+        rows = sstable.sstable_data.iter_rows(parsed_statistics, data_file, row_body_decoder=row_body_decoder)
+        sstable.dump.write_rows(parsed_statistics, counted(rows), writer, columns=columns)
+    return count
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('dir', type=str)
+    parser.add_argument('output', type=str, help="the CSV file, gzipped if it ends with .gz")
+    parser.add_argument('--gzip', action='store_true', help="gzip the output whatever its name")
+    parser.add_argument('--engine', type=str, default="compiled")
+    parser.add_argument('--columns', type=str, help="comma separated regular columns to export")
+    args = parser.parse_args()
+
+    columns = args.columns.split(",") if args.columns is not None else None
+    count = export(args.dir, args.output, compress=True if args.gzip else None, engine=args.engine, columns=columns)
+    print(f"Exported {count} rows", file=os.sys.stderr)
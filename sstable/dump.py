@@ -3,10 +3,24 @@ import csv
 import io
 import os
 import argparse
+import contextlib
+
+import construct
 
 import sstable.utils
 import sstable.sstable_data
 import sstable.sstable_statistics
+import sstable.row_decoder
+import sstable.mmap_reader
+import sstable.sstable_index
+import sstable.sstable_summary
+import sstable.sstable_reader
+import sstable.compressed_data
+import sstable.row_scan
+import sstable.parallel_dump
+import sstable.merge
+import sstable.metadata_cache
+import sstable.csv_export
 
 
 class CustomJSONEncoder(json.JSONEncoder):
@@ -14,6 +28,8 @@ class CustomJSONEncoder(json.JSONEncoder):
         # If the object is bytes, decode it to a string
         if isinstance(obj, bytes):
             return "".join([sstable.utils.hex(byt) for byt in obj])
+        if isinstance(obj, memoryview):
+            return self.default(bytes(obj))
         # For all other types, use the standard handling
         return json.JSONEncoder.default(self, obj)
 
@@ -21,83 +37,271 @@ class CustomJSONEncoder(json.JSONEncoder):
 class CsvWriter:
     def __init__(self, writer):
         self.writer = csv.writer(writer)
+    def set_column_names(self, clustering_column_names, regular_column_names):
+        pass
     def write_header(self, clustering_column_names, regular_column_names):
         self.writer.writerow([f"partition_key_type"] + clustering_column_names + regular_column_names)
     def write_row(self, partition_key_value, clustering_column_values, regular_column_values):
-        self.writer.writerow([partition_key_value] + clustering_column_values + regular_column_values)
+        row = [partition_key_value] + clustering_column_values + regular_column_values
+        self.writer.writerow([bytes(value) if isinstance(value, memoryview) else value for value in row])
+
+# Same as json.dumps(value, cls=CustomJSONEncoder) for the types of cell
+# values, without going through the encoder object. json.dumps uses the
+# same functions for strings, ints and floats.
+def encode_float(value):
+    if value != value:
+        return "NaN"
+    if value == float("inf"):
+        return "Infinity"
+    if value == -float("inf"):
+        return "-Infinity"
+    return float.__repr__(value)
+
+def encode_bytes(value):
+    return f'"{bytes(value).hex()}"'
+
+def encode_constant(value):
+    return {None: "null", True: "true", False: "false"}[value]
+
+json_encoders = {
+    str: json.encoder.encode_basestring_ascii,
+    int: int.__repr__,
+    float: encode_float,
+    bool: encode_constant,
+    type(None): encode_constant,
+    bytes: encode_bytes,
+    memoryview: encode_bytes,
+}
+
+def encode_json(value):
+    encode = json_encoders.get(type(value))
+    if encode is not None:
+        return encode(value)
+    # Subclasses, e.g. HexDisplayedBytes and HexDisplayedInteger
+    if isinstance(value, (bytes, memoryview)):
+        return encode_bytes(value)
+    if isinstance(value, int) and not isinstance(value, bool):
+        return int.__repr__(value)
+    if isinstance(value, float):
+        return encode_float(value)
+    return json.dumps(value, cls=CustomJSONEncoder)
+
+for _value in ["a\"\u00e9\n", 1, -1.5, float("nan"), True, None, b"\x00\xff", memoryview(b"\x01"), construct.lib.HexDisplayedBytes(b"\x0a"), construct.lib.HexDisplayedInteger.new(10, "0%sX"), [1, "b"]]:
+    sstable.utils.assert_equal(json.dumps(_value, cls=CustomJSONEncoder), encode_json(_value))
 
 class JsonWriter:
+    r"""
+    Writes one JSON object per row, the same as
+    json.dumps({"partition_key_value": ..., "cells": [{"name": ..., "value": ...}, ...]})
+    would. The parts with the column names are made once, and rows are
+    written BATCH_SIZE at a time, see batched.
+    """
+    BATCH_SIZE = 1024
+
     def __init__(self, writer):
         self.writer = writer
-    def write_header(self, clustering_column_names, regular_column_names):
+        self.lines = []
+    def set_column_names(self, clustering_column_names, regular_column_names):
         self.clustering_column_names = clustering_column_names
         self.regular_column_names = regular_column_names
+        names = clustering_column_names + regular_column_names
+        self.cell_prefixes = [f'{", " if i else ""}{{"name": {encode_json(name)}, "value": ' for i, name in enumerate(names)]
+    def write_header(self, clustering_column_names, regular_column_names):
+        self.set_column_names(clustering_column_names, regular_column_names)
     def write_row(self, partition_key_value, clustering_column_values, regular_column_values):
-        # for value in regular_column_values:
-        #     print(f"{type(value)} = {value}")
-
-
-        # old:
-        # print(json.dumps({
-        #     "partition_key_value": partition_key_value,
-        #     "clustering_column_values": clustering_column_values,
-        #     "regular_column_values": regular_column_values,
-        # }, cls=CustomJSONEncoder))
-
-        # new:
-        row = {
-            "partition_key_value": partition_key_value,
-            "cells": [],
-        }
-        for i in range(len(clustering_column_values)):
-            row["cells"].append({
-                "name": self.clustering_column_names[i],
-                "value": clustering_column_values[i],
-            })
-            # row[self.clustering_column_names[i]] = clustering_column_values[i]
-        for i in range(len(regular_column_values)):
-            row["cells"].append({
-                "name": self.regular_column_names[i],
-                "value": regular_column_values[i],
-            })
-            # row[self.regular_column_names[i]] = regular_column_values[i]
-        self.writer.write(json.dumps(row, cls=CustomJSONEncoder) + "\n")
-
-def dump(statistics_stream, data_stream, writer):
-    parsed_statistics = sstable.sstable_statistics.statistics_format.parse_stream(statistics_stream)
-    parsed_data = sstable.sstable_data.data_format.parse_stream(data_stream, sstable_statistics=parsed_statistics)
+        cells = "".join([f"{prefix}{encode_json(value)}}}" for prefix, value in zip(self.cell_prefixes, clustering_column_values + regular_column_values)])
+        self.lines.append(f'{{"partition_key_value": {encode_json(partition_key_value)}, "cells": [{cells}]}}\n')
+        if len(self.lines) >= self.BATCH_SIZE:
+            self.flush()
+    def flush(self):
+        if self.lines:
+            self.writer.write("".join(self.lines))
+            self.lines.clear()
+
+class FlushFirst:
+    r"""
+    A stream that flushes writer before anything is written to it.
+    """
+    def __init__(self, writer, stream):
+        self.writer = writer
+        self.stream = stream
+    def write(self, text):
+        self.writer.flush()
+        return self.stream.write(text)
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+@contextlib.contextmanager
+def batched(writer):
+    r"""
+    Flushes the rows the writer holds at the end. What is printed meanwhile
+    (e.g. the errors of sstable.greedy_range) to the stream the writer writes
+    to still comes after the rows written before it.
+    """
+    flush = getattr(writer, "flush", None)
+    if flush is None:
+        yield
+        return
+    try:
+        if getattr(writer, "writer", None) is os.sys.stdout:
+            with contextlib.redirect_stdout(FlushFirst(writer, os.sys.stdout)):
+                yield
+        else:
+            yield
+    finally:
+        flush()
 
+WRITERS = {
+    "json": JsonWriter,
+    "csv": CsvWriter,
+}
+
+def make_writer(format, stream):
+    # typed-csv is looked up when called, sstable.csv_export imports this module
+    if format == "typed-csv":
+        return sstable.csv_export.TypedCsvWriter(stream)
+    return WRITERS.get(format, JsonWriter)(stream)
+
+# lazy is compiled, with values decoded when the writer reads them
+ENGINES = ["compiled", "construct", "lazy"]
+
+def make_row_body_decoder(parsed_statistics, engine, columns=None):
+    if engine in ("compiled", "lazy"):
+        return sstable.row_decoder.compile_row_body_decoder(parsed_statistics.serialization_header, columns=columns, lazy=engine == "lazy")
+    return None
+
+def write_rows(parsed_statistics, rows, writer, columns=None, header=True):
+    r"""
+    With columns, a list of regular column names, only those columns are
+    written, with None for the rows that don't have them. Without header, the
+    rows are written as if the header had already been written.
+    """
     # header:
     clustering_column_names = [f"clustering_column_{i+1}" for i, typ in enumerate(parsed_statistics.serialization_header.clustering_key_types)]
     regular_column_names = [column.name for column in parsed_statistics.serialization_header.regular_columns]
+    projection = None
+    if columns is not None:
+        projection = sstable.row_decoder.column_indexes(parsed_statistics.serialization_header, columns)
+        regular_column_names = list(columns)
 
-    writer.write_header(list(clustering_column_names), list(regular_column_names))
+    set_column_types = getattr(writer, "set_column_types", None)
+    if set_column_types is not None:
+        serialization_header = parsed_statistics.serialization_header
+        regular_types = [column.type.name for column in serialization_header.regular_columns]
+        if projection is not None:
+            regular_types = [regular_types[column_index] for column_index in projection]
+        set_column_types(serialization_header.partition_key_type.name, [typ.name for typ in serialization_header.clustering_key_types], regular_types)
+    if header:
+        writer.write_header(list(clustering_column_names), list(regular_column_names))
+    else:
+        writer.set_column_names(list(clustering_column_names), list(regular_column_names))
 
-    for partition in parsed_data.partitions:
-        partition_key_value = partition.partition_header.key
-        for unfiltered in partition.unfiltereds:
-            if unfiltered.row_flags & 0x01:
-                continue
+    with batched(writer):
+        for partition, unfiltered in rows:
+            partition_key_value = partition.partition_header.key
             if unfiltered.row.clustering_block:
                 clustering_column_values = map(lambda cell: cell.key.cell_value, unfiltered.row.clustering_block.clustering_cells)
             else:
                 clustering_column_values = []
 
+            cells = unfiltered.row.row_body.cells
+            if projection is not None:
+                cells = sstable.row_decoder.project_cells(unfiltered.row.row_body, projection)
             # We check cell_flags to handle cells where the value is empty
-            regular_column_values = map(lambda cell: cell.cell.cell_value if not cell.cell_flags & 0x04 else None, unfiltered.row.row_body.cells)
+            regular_column_values = map(lambda cell: cell.cell.cell_value if cell is not None and not cell.cell_flags & 0x04 else None, cells)
             writer.write_row(partition_key_value, list(clustering_column_values), list(regular_column_values))
 
+def dump(statistics_stream, data_stream, writer, engine="compiled", mmap=False, columns=None, parsed_statistics=None):
+    r"""
+    With columns, a list of regular column names, only those cells are
+    decoded and written. With parsed_statistics, statistics_stream is not
+    read.
+    """
+    if parsed_statistics is None:
+        parsed_statistics = sstable.sstable_statistics.statistics_format.parse_stream(statistics_stream)
+    row_body_decoder = make_row_body_decoder(parsed_statistics, engine, columns=columns)
+
+    # With mmap, bytes values are memoryviews of the mapped Data.db file
+    reader = sstable.mmap_reader if mmap else sstable.sstable_data
+    write_rows(parsed_statistics, reader.iter_rows(parsed_statistics, data_stream, row_body_decoder=row_body_decoder), writer, columns=columns)
+
+def dump_partition(statistics_stream, index_stream, data_stream, writer, partition_key, engine="compiled", summary_stream=None):
+    r"""
+    Same as dump, but only for the partition with the given key, which is
+    found through Index.db instead of reading all of Data.db. With
+    summary_stream, only the interval of Index.db given by Summary.db is read.
+    """
+    parsed_statistics = sstable.sstable_statistics.statistics_format.parse_stream(statistics_stream)
+    row_body_decoder = make_row_body_decoder(parsed_statistics, engine)
+    if summary_stream is not None:
+        summary = sstable.sstable_summary.read_summary(summary_stream)
+        partition = sstable.sstable_summary.lookup(parsed_statistics, summary, index_stream, data_stream, partition_key, row_body_decoder=row_body_decoder)
+    else:
+        index = sstable.sstable_index.read_index(parsed_statistics, index_stream)
+        partition = sstable.sstable_index.lookup(parsed_statistics, index, data_stream, partition_key, row_body_decoder=row_body_decoder)
+    partitions = [partition] if partition is not None else []
+    write_rows(parsed_statistics, sstable.sstable_data.rows_of(partitions), writer)
+
+def dump_partition_from_sstables(sstables, writer, partition_key):
+    r"""
+    Same as dump_partition, for every generation in the table directory. The
+    SSTables whose Filter.db rules out the key are not read. Returns the
+    counts from sstable.sstable_reader.lookup.
+    """
+    found, stats = sstable.sstable_reader.lookup(sstables, partition_key)
+    # Every generation only has its own columns, so each partition is written
+    # with the statistics of its SSTable, and the header once
+    header = True
+    for reader, partition in found:
+        write_rows(reader.statistics, sstable.sstable_data.rows_of([partition]), writer, header=header)
+        header = False
+    if header and sstables:
+        write_rows(sstables[0].statistics, [], writer)
+    return stats
+
+def dump_merged(table_dir, writer, engine="compiled", columns=None, metadata_cache=None):
+    r"""
+    Same as dump, for all the generations in the table directory merged into
+    one, see sstable.merge.
+    """
+    merged_statistics, partitions = sstable.merge.read_table(table_dir, compiled=engine != "construct", metadata_cache=metadata_cache)
+    write_rows(merged_statistics, sstable.sstable_data.rows_of(partitions), writer, columns=columns)
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('dir', type=str)
-    parser.add_argument('--format', type=str, default="json")
+    parser.add_argument('--format', type=str, default="json", help="json, csv or typed-csv")
+    parser.add_argument('--engine', type=str, default="compiled", choices=ENGINES)
+    parser.add_argument('--mmap', action='store_true', help="read Data.db from a memory map, without copying keys and blobs")
+    parser.add_argument('--columns', type=str, help="comma separated regular columns to dump, the others are not decoded")
+    parser.add_argument('--count', action='store_true', help="only print the number of rows, without decoding the cells")
+    parser.add_argument('--workers', type=int, default=1, help="dump Data.db on this many processes, 0 for one per CPU")
+    parser.add_argument('--merge', action='store_true', help="dump every generation, merged by key and write timestamp")
+    parser.add_argument('--key', type=str, help="only dump the partition with this key, given in hex as in the JSON output, from every generation")
+    parser.add_argument('--metadata-cache', type=str, help="directory where the parsed Statistics.db, Summary.db and Filter.db are kept between runs")
     args = parser.parse_args()
+    metadata_cache = sstable.metadata_cache.MetadataCache(args.metadata_cache) if args.metadata_cache is not None else None
 
-    if args.format == "csv":
-        writer = CsvWriter(os.sys.stdout)
-    else:
-        writer = JsonWriter(os.sys.stdout)
+    writer = make_writer(args.format, os.sys.stdout)
     # dump(args.dir, writer)
-    with open(os.path.join(args.dir, "me-1-big-Statistics.db"), "rb") as statistics_file:
-        with open(os.path.join(args.dir, "me-1-big-Data.db"), "rb") as data_file:
-            dump(statistics_file, data_file, writer)
+    if args.key is not None:
+        sstables = sstable.sstable_reader.open_sstables(args.dir, compiled=args.engine != "construct", metadata_cache=metadata_cache)
+        stats = dump_partition_from_sstables(sstables, writer, bytes.fromhex(args.key))
+        print(f"Found in {stats.found} of {stats.sstables} SSTables, {stats.skipped_by_filter} skipped by Filter.db, {stats.false_positives} false positives", file=os.sys.stderr)
+    elif args.merge:
+        columns = args.columns.split(",") if args.columns is not None else None
+        dump_merged(args.dir, writer, engine=args.engine, columns=columns, metadata_cache=metadata_cache)
+    elif args.count:
+        with open(os.path.join(args.dir, "me-1-big-Statistics.db"), "rb") as statistics_file:
+            with sstable.compressed_data.open_data_file(os.path.join(args.dir, "me-1-big-Data.db")) as data_file:
+                parsed_statistics = sstable.sstable_statistics.statistics_format.parse_stream(statistics_file)
+                print(sstable.row_scan.count_rows(parsed_statistics, data_file))
+    elif args.workers != 1:
+        columns = args.columns.split(",") if args.columns is not None else None
+        sstable.parallel_dump.dump_parallel(args.dir, os.sys.stdout, output_format=args.format, engine=args.engine, columns=columns, workers=args.workers)
+    else:
+        with open(os.path.join(args.dir, "me-1-big-Statistics.db"), "rb") as statistics_file:
+            with sstable.compressed_data.open_data_file(os.path.join(args.dir, "me-1-big-Data.db")) as data_file:
+                columns = args.columns.split(",") if args.columns is not None else None
+                parsed_statistics = metadata_cache.load(args.dir, 1).statistics if metadata_cache is not None else None
+                dump(statistics_file, data_file, writer, engine=args.engine, mmap=args.mmap, columns=columns, parsed_statistics=parsed_statistics)
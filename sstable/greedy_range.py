@@ -10,18 +10,20 @@ import construct
 # Therefore I need to implement my own GreedyRange:
 class GreedyRangeWithExceptionHandling(construct.GreedyRange):
     def _parse(self, stream, context, path):
-        items = []
-        while True:
-            try:
-                item = self.subcon._parse(stream, context, path)
-                items.append(item)
-            except construct.StreamError:
-                break  # EOF reached
-            except Exception as e:
-                print(f"Exception occurred at position {stream.tell()}: {e}")
-                # Decide how to handle the exception (skip, retry, etc.)
-                # Example: skip to the next byte
-                stream.seek(stream.tell() + 1)
-                continue
-        return items
+        return list(iter_with_exception_handling(lambda: self.subcon._parse(stream, context, path), stream))
 
+# Same as GreedyRangeWithExceptionHandling, but yields the items one by one
+# instead of collecting all of them in a list.
+def iter_with_exception_handling(parse_item, stream):
+    while True:
+        try:
+            item = parse_item()
+        except construct.StreamError:
+            break  # EOF reached
+        except Exception as e:
+            print(f"Exception occurred at position {stream.tell()}: {e}")
+            # Decide how to handle the exception (skip, retry, etc.)
+            # Example: skip to the next byte
+            stream.seek(stream.tell() + 1)
+            continue
+        yield item
@@ -0,0 +1,298 @@
+import re
+import heapq
+import functools
+import contextlib
+
+import construct
+
+import sstable.utils
+import sstable.murmur3
+import sstable.query
+import sstable.sstable_data
+import sstable.type_parser
+import sstable.sstable_reader
+import sstable.sstable_statistics
+import sstable.compressed_data
+
+# Reads all the generations of a table directory as one SSTable, like a
+# Cassandra read or compaction would see them. The partitions of every
+# generation are merged by decorated key (token, then key) with a heap, so
+# only one partition per generation is in memory at a time. The rows of the
+# partitions with the same key are merged by clustering key, and for every
+# column the cell with the highest write timestamp wins. For the same
+# timestamp a tombstone wins, then the greater value, like in Cassandra.
+# https://github.com/apache/cassandra/blob/cassandra-3.0/src/java/org/apache/cassandra/db/rows/UnfilteredRowIterators.java#L442
+# https://github.com/apache/cassandra/blob/cassandra-3.0/src/java/org/apache/cassandra/db/rows/Cells.java#L53-L95
+#
+# The grammar doesn't parse the timestamps of the cells, only the one of the
+# row (timestamp_diff), so every cell has the timestamp of its row. This is
+# right for the cells with USE_ROW_TIMESTAMP, which are all the cells written
+# by an INSERT or an UPDATE of the whole row.
+
+# marked_for_delete_at of a live partition, Long.MIN_VALUE read as Int64ub
+LIVE = 1 << 63
+
+def to_signed64(value):
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+sstable.utils.assert_equal(-(1 << 63), to_signed64(LIVE))
+sstable.utils.assert_equal(5, to_signed64(5))
+
+MULTI_CELL_TYPE = re.compile(r"^org\.apache\.cassandra\.db\.marshal\.(ListType|SetType|MapType)\(")
+
+@functools.total_ordering
+class Descending:
+    r"""
+    Sorts values of ReversedType clustering columns the other way around.
+    """
+    __slots__ = ("value",)
+    def __init__(self, value):
+        self.value = value
+    def __eq__(self, other):
+        return self.value == other.value
+    def __lt__(self, other):
+        return other.value < self.value
+
+sstable.utils.assert_equal(["b", "a"], [d.value for d in sorted([Descending("a"), Descending("b")])])
+
+def value_key(struct, cell):
+    r"""
+    Sorts the values of simple cells of type struct (see sstable.type_parser)
+    like ByteBuffer.compareTo sorts their serialized values in Cassandra:
+    byte by byte as signed bytes, the shorter one first if it is a prefix of
+    the other. Tombstones and collections have the empty value.
+    """
+    if cell.get("cell") is None or "cell_flags" not in cell:
+        return b""
+    cell_value = next(subcon for subcon in struct.subcons if subcon.name == "cell_value")
+    # Without the length, which is in the context
+    return bytes(byte ^ 0x80 for byte in cell_value.build(cell.cell.cell_value, **cell.cell))
+
+sstable.utils.assert_equal(True, value_key(sstable.type_parser.text_cell_value, construct.Container(cell_flags=0, cell=construct.Container(cell_value_len=2, cell_value="ab")))
+    < value_key(sstable.type_parser.text_cell_value, construct.Container(cell_flags=0, cell=construct.Container(cell_value_len=1, cell_value="b"))))
+# Signed bytes, -1 is 0xff
+sstable.utils.assert_equal(True, value_key(sstable.type_parser.int_cell_value, construct.Container(cell_flags=0, cell=construct.Container(cell_value=-1)))
+    < value_key(sstable.type_parser.int_cell_value, construct.Container(cell_flags=0, cell=construct.Container(cell_value=1))))
+
+def unordered_clustering_types(clustering_key_types):
+    r"""
+    The names of the clustering types whose decoded values don't sort like
+    in Cassandra (see sstable.query), e.g. uuids, varints and decimals.
+    """
+    return [typ.name for typ in clustering_key_types if sstable.query.base_type(typ.name) not in sstable.query.raw_value_decoders]
+
+def clustering_sort_key(clustering_key_types):
+    r"""
+    Returns a function that sorts clustering keys (tuples of decoded values)
+    like Cassandra does. Only the columns before the first one whose decoded
+    values don't sort like in Cassandra (see sstable.query) are compared, the
+    keys that are equal on those keep the order they were found in.
+    """
+    directions = []
+    for typ in clustering_key_types:
+        if sstable.query.base_type(typ.name) not in sstable.query.raw_value_decoders:
+            break
+        directions.append(sstable.query.REVERSED_TYPE.match(typ.name) is not None)
+    def sort_key(clustering_key):
+        return tuple(Descending(value) if reversed_ else value for value, reversed_ in zip(clustering_key, directions))
+    return sort_key
+
+def clustering_key(unfiltered):
+    if not unfiltered.row.clustering_block:
+        return ()
+    return tuple(bytes(value) if isinstance(value, memoryview) else value for value in (cell.key.cell_value for cell in unfiltered.row.clustering_block.clustering_cells))
+
+def merged_regular_columns(serialization_headers):
+    r"""
+    Every generation only has the columns set in its own rows. The merged
+    columns are all of them, sorted like Cassandra sorts them: simple columns
+    first, then by name.
+    https://github.com/apache/cassandra/blob/cassandra-3.0/src/java/org/apache/cassandra/db/Columns.java#L56-L66
+    """
+    columns = {}
+    for header in serialization_headers:
+        for column in header.regular_columns:
+            columns.setdefault(column.name, column)
+    return sorted(columns.values(), key=lambda column: (MULTI_CELL_TYPE.match(column.type.name) is not None, column.name))
+
+def merged_statistics(sstables_statistics):
+    r"""
+    Statistics.db of the newest generation, with a serialization header that
+    has the columns and the smallest timestamp of all the generations. Rows
+    of the merged partitions are relative to it, so they can be written with
+    sstable.dump.write_rows.
+    """
+    newest = sstables_statistics[-1]
+    headers = [statistics.serialization_header for statistics in sstables_statistics]
+    regular_columns = merged_regular_columns(headers)
+    min_timestamp = min(sstable.sstable_statistics.min_timestamp(header) for header in headers)
+    statistics = construct.Container(newest)
+    statistics.serialization_header = construct.Container(
+        newest.serialization_header,
+        min_timestamp=(min_timestamp - sstable.sstable_statistics.TIMESTAMP_EPOCH) % (1 << 64),
+        regular_column_count=len(regular_columns),
+        regular_columns=regular_columns,
+    )
+    return statistics
+
+class Merger:
+    r"""
+    Merges partitions of the SSTables whose Statistics.db are
+    sstables_statistics, oldest generation first. The merged partitions and
+    rows have the same fields as the parsed ones, with the columns of
+    self.statistics. Rows have a cell for every column, None for the columns
+    they don't have (like rows decoded with a projection), and
+    cell_timestamps, the write timestamp of each cell.
+    """
+    def __init__(self, sstables_statistics):
+        self.statistics = merged_statistics(sstables_statistics)
+        self.min_timestamp = sstable.sstable_statistics.min_timestamp(self.statistics.serialization_header)
+        self.min_timestamps = [sstable.sstable_statistics.min_timestamp(statistics.serialization_header) for statistics in sstables_statistics]
+        self.column_names = [[column.name for column in statistics.serialization_header.regular_columns] for statistics in sstables_statistics]
+        self.column_types = [[column.type.name for column in statistics.serialization_header.regular_columns] for statistics in sstables_statistics]
+        self.names = [column.name for column in self.statistics.serialization_header.regular_columns]
+        self.sort_key = clustering_sort_key(self.statistics.serialization_header.clustering_key_types)
+
+    def value_key(self, input_index, column_index, cell):
+        return value_key(sstable.type_parser.parse_type(self.column_types[input_index][column_index]), cell)
+
+    def row_timestamp(self, input_index, unfiltered):
+        if unfiltered.row_flags & sstable.sstable_data.RowFlag.HAS_TIMESTAMP:
+            return self.min_timestamps[input_index] + unfiltered.row.row_body.timestamp_diff
+        # Only the cells have timestamps, which the grammar doesn't parse
+        return self.min_timestamps[input_index]
+
+    def merge(self, partition_iterators):
+        r"""
+        Yields the merged partitions of partition_iterators (one per SSTable,
+        in the same order as sstables_statistics) in Data.db order.
+        """
+        iterators = [iter(partitions) for partitions in partition_iterators]
+        heap = []
+        def push(input_index):
+            partition = next(iterators[input_index], None)
+            if partition is not None:
+                heapq.heappush(heap, (sstable.murmur3.decorated_key(partition.partition_header.key), input_index, partition))
+        for input_index in range(len(iterators)):
+            push(input_index)
+        while heap:
+            key, input_index, partition = heapq.heappop(heap)
+            versions = [(input_index, partition)]
+            push(input_index)
+            while heap and heap[0][0] == key:
+                _, input_index, partition = heapq.heappop(heap)
+                versions.append((input_index, partition))
+                push(input_index)
+            yield self.merge_partition(sorted(versions, key=lambda version: version[0]))
+
+    def merge_partition(self, versions):
+        r"""
+        versions are (input_index, partition) with the same key, oldest
+        first. The partition deletion with the highest timestamp wins, and
+        shadows the rows and cells written at or before it.
+        """
+        deletion_time = max((partition.partition_header.deletion_time for _, partition in versions), key=lambda deletion_time: to_signed64(deletion_time.marked_for_delete_at))
+        deleted_at = to_signed64(deletion_time.marked_for_delete_at)
+
+        rows = {}
+        for input_index, partition in versions:
+            for unfiltered in partition.unfiltereds:
+                if unfiltered.row_flags & sstable.sstable_data.RowFlag.END_OF_PARTITION:
+                    continue
+                rows.setdefault(clustering_key(unfiltered), []).append((input_index, unfiltered))
+        # sorted is stable, so a single version keeps the order of Data.db
+        unfiltereds = []
+        for key in sorted(rows, key=self.sort_key):
+            unfiltered = self.merge_row(rows[key], deleted_at)
+            if unfiltered is not None:
+                unfiltereds.append(unfiltered)
+        unfiltereds.append(construct.Container(row_flags=sstable.sstable_data.RowFlag.END_OF_PARTITION, row=None))
+
+        partition_header = versions[-1][1].partition_header
+        return construct.Container(
+            partition_header=construct.Container(partition_header, deletion_time=deletion_time),
+            unfiltereds=unfiltereds,
+        )
+
+    def merge_row(self, versions, deleted_at):
+        r"""
+        versions are (input_index, unfiltered) with the same clustering key,
+        oldest first. Returns None if the partition deletion shadows all of
+        it. For the same timestamp a tombstone wins over a live cell, then the
+        greater value (see value_key), like in Cassandra, and the newer
+        generation wins otherwise.
+        """
+        RowFlag = sstable.sstable_data.RowFlag
+        row_timestamp = None
+        cells = {}
+        for input_index, unfiltered in versions:
+            timestamp = self.row_timestamp(input_index, unfiltered)
+            if unfiltered.row_flags & RowFlag.HAS_TIMESTAMP:
+                row_timestamp = timestamp if row_timestamp is None else max(row_timestamp, timestamp)
+            row_body = unfiltered.row.row_body
+            present = row_body.missing_columns if row_body.missing_columns is not None else range(len(row_body.cells))
+            for column_index, cell in zip(present, row_body.cells):
+                if cell is None:
+                    continue
+                is_deleted = cell.get("cell_flags", 0) & sstable.sstable_data.CellFlag.IS_DELETED != 0
+                version = (timestamp, is_deleted)
+                name = self.column_names[input_index][column_index]
+                previous = cells.get(name)
+                if previous is None or version > previous[0]:
+                    cells[name] = (version, cell, input_index, column_index)
+                elif version == previous[0]:
+                    # Values are only built on a tie, and the newer
+                    # generation wins if they are equal too
+                    if self.value_key(input_index, column_index, cell) >= self.value_key(previous[2], previous[3], previous[1]):
+                        cells[name] = (version, cell, input_index, column_index)
+
+        cells = {name: (version, cell) for name, (version, cell, _, _) in cells.items() if version[0] > deleted_at}
+        if row_timestamp is not None and row_timestamp <= deleted_at:
+            row_timestamp = None
+        if row_timestamp is None and not cells:
+            return None
+
+        row_flags = RowFlag.HAS_ALL_COLUMNS
+        if row_timestamp is not None:
+            row_flags |= RowFlag.HAS_TIMESTAMP
+        # The grammar reads every cell of a row with HAS_COMPLEX_DELETION as a
+        # collection (which has no cell_flags), and every other cell as a
+        # simple one, so the flag follows the cells that won
+        complex_cells = ["cell_flags" not in cell for _, cell in cells.values()]
+        if any(complex_cells):
+            if not all(complex_cells):
+                raise Exception("Can't merge collection cells and other cells into one row")
+            row_flags |= RowFlag.HAS_COMPLEX_DELETION
+        newest = versions[-1][1]
+        return construct.Container(
+            row_flags=row_flags,
+            row=construct.Container(
+                clustering_block=newest.row.clustering_block,
+                serialized_row_body_size=None,
+                row_body=construct.Container(
+                    row_body_start=None,
+                    previous_unfiltered_size=None,
+                    timestamp_diff=row_timestamp - self.min_timestamp if row_timestamp is not None else 0,
+                    missing_columns=None,
+                    cells=[cells[name][1] if name in cells else None for name in self.names],
+                    cell_timestamps=[cells[name][0][0] if name in cells else None for name in self.names],
+                ),
+            ),
+        )
+
+def read_table(table_dir, compiled=True, metadata_cache=None):
+    r"""
+    Returns the merged Statistics.db of all the generations in table_dir and
+    an iterator of their merged partitions. Data.db files are opened when
+    the iteration starts and closed when it ends.
+    """
+    sstables = sstable.sstable_reader.open_sstables(table_dir, compiled=compiled, metadata_cache=metadata_cache)
+    merger = Merger([reader.statistics for reader in sstables])
+    def partitions():
+        with contextlib.ExitStack() as stack:
+            iterators = []
+            for reader in sstables:
+                data_file = stack.enter_context(sstable.compressed_data.open_data_file(reader.path("Data")))
+                iterators.append(sstable.sstable_data.iter_partitions(reader.statistics, data_file, row_body_decoder=reader.row_body_decoder))
+            yield from merger.merge(iterators)
+    return merger.statistics, partitions()
@@ -0,0 +1,93 @@
+import os
+import pickle
+import hashlib
+
+import construct
+
+import sstable.utils
+import sstable.sstable_reader
+
+# Keeps the parsed Statistics.db, Summary.db and Filter.db of SSTables in a
+# cache directory, one file per SSTable, so that opening many SSTables again
+# is one read and one unpickle per SSTable instead of running the grammar.
+#
+# An entry is valid for the path and generation of the SSTable and the size
+# and mtime of its components; when any of them changes the SSTable is parsed
+# again and its entry is overwritten. CACHE_VERSION is part of every entry,
+# and must be changed when the parsed objects change shape.
+#
+# Entries are pickles, so the cache directory must be as trusted as the
+# code that reads it.
+
+CACHE_VERSION = 1
+CACHED_COMPONENTS = ["Statistics", "Summary", "Filter"]
+
+def plain(obj):
+    r"""
+    A copy of a parsed Container without the entries the grammar adds while
+    parsing (`_io`, the stream, can't be pickled). Containers compare equal
+    with or without them.
+    """
+    if isinstance(obj, construct.Container):
+        return construct.Container((key, plain(value)) for key, value in obj.items() if not (isinstance(key, str) and key.startswith("_")))
+    if isinstance(obj, construct.ListContainer):
+        return construct.ListContainer(plain(value) for value in obj)
+    return obj
+
+sstable.utils.assert_equal(["a", "b"], list(plain(construct.Container(a=1, _io=None, b=construct.ListContainer([construct.Container(_io=None)])))))
+
+def cache_key(table_dir, generation):
+    r"""
+    What the entry of an SSTable must have been made from: its path,
+    generation and the (size, mtime) of each cached component, None for the
+    ones that don't exist.
+    """
+    components = []
+    for component in CACHED_COMPONENTS:
+        try:
+            st = os.stat(sstable.sstable_reader.component_path(table_dir, generation, component))
+            components.append((component, st.st_size, st.st_mtime_ns))
+        except FileNotFoundError:
+            components.append((component, None, None))
+    return (CACHE_VERSION, os.path.abspath(table_dir), generation, tuple(components))
+
+class MetadataCache:
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+        self.stats = construct.Container(hits=0, misses=0)
+
+    def entry_path(self, table_dir, generation):
+        # One file per SSTable, a changed SSTable overwrites its old entry
+        name = hashlib.sha256(f"{os.path.abspath(table_dir)}\0{generation}".encode()).hexdigest()
+        return os.path.join(self.cache_dir, f"{name}.pickle")
+
+    def load(self, table_dir, generation):
+        r"""
+        Returns the metadata of the SSTable like
+        sstable.sstable_reader.read_metadata, from the cache if its entry is
+        still valid.
+        """
+        key = cache_key(table_dir, generation)
+        path = self.entry_path(table_dir, generation)
+        try:
+            with open(path, "rb") as f:
+                cached_key, metadata = pickle.loads(f.read())
+            if cached_key == key:
+                self.stats.hits += 1
+                return metadata
+        except FileNotFoundError:
+            pass
+        except Exception:
+            # A partly written or old entry, replaced below
+            pass
+
+        self.stats.misses += 1
+        metadata = sstable.sstable_reader.read_metadata(table_dir, generation)
+        metadata.statistics = plain(metadata.statistics)
+        # Readers never see partly written entries
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(pickle.dumps((key, metadata), protocol=pickle.HIGHEST_PROTOCOL))
+        os.replace(tmp_path, path)
+        return metadata
@@ -0,0 +1,138 @@
+import io
+import os
+import mmap
+import struct
+
+import construct
+
+import sstable.varint
+import sstable.greedy_range
+import sstable.sstable_data
+import sstable.row_decoder
+import sstable.compressed_data
+
+# Reads Data.db from a memory map instead of a file object. The partitions
+# have the same shape as the ones parsed by sstable.sstable_data.partition,
+# except that bytes fields (partition keys, blobs, ...) are memoryview slices
+# of the mapping instead of copies. Writers turn them into bytes when they
+# need to.
+#
+# Like the compiled row body decoder, anything this reader cannot handle is
+# parsed by the grammar (from the same mapping), so the results and the error
+# messages are the same as sstable.sstable_data.iter_partitions.
+
+unpack_partition_header = struct.Struct(">H").unpack_from
+unpack_deletion_time = struct.Struct(">IQ").unpack_from
+
+def map_stream(data_stream):
+    r"""
+    Returns (stream, buf): a seekable stream for the grammar and a memoryview
+    of the same bytes, both positioned like data_stream.
+    """
+    if hasattr(data_stream, "getbuffer"):
+        # io.BytesIO
+        return data_stream, data_stream.getbuffer()
+    if isinstance(data_stream, sstable.compressed_data.CompressedDataReader):
+        # Nothing to map, decompress it all instead
+        position = data_stream.tell()
+        data_stream.seek(0)
+        stream = io.BytesIO(data_stream.read())
+        stream.seek(position)
+        return stream, stream.getbuffer()
+    fileno = data_stream.fileno()
+    if os.fstat(fileno).st_size == 0:
+        # empty files cannot be mapped
+        return io.BytesIO(b""), memoryview(b"")
+    # The mapping is released when the last memoryview into it is gone.
+    mapped = mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+    mapped.seek(data_stream.tell())
+    return mapped, memoryview(mapped)
+
+class PartitionDecoder:
+    def __init__(self, sstable_statistics, row_body_decoder):
+        serialization_header = sstable_statistics.serialization_header
+        self.row_body_decoder = row_body_decoder
+        self.clustering_decoders = [sstable.row_decoder.compile_value_decoder(typ.name) for typ in serialization_header.clustering_key_types]
+        self.has_clustering_columns = serialization_header.clustering_key_count > 0
+
+    def decode(self, buf, pos):
+        r"""
+        Decodes the partition that starts at buf[pos]. Returns the partition
+        and the position after it. Raises for anything that should be parsed
+        by the grammar.
+        """
+        key_len, = unpack_partition_header(buf, pos)
+        pos += 2
+        key = buf[pos:pos+key_len]
+        pos += key_len
+        local_deletion_time, marked_for_delete_at = unpack_deletion_time(buf, pos)
+        pos += 12
+        partition_header = construct.Container(
+            key_len=key_len,
+            key=key,
+            deletion_time=construct.Container(
+                local_deletion_time=local_deletion_time,
+                marked_for_delete_at=marked_for_delete_at,
+            ),
+        )
+
+        unfiltereds = []
+        while True:
+            row_flags = buf[pos]
+            pos += 1
+            if row_flags & sstable.sstable_data.RowFlag.END_OF_PARTITION:
+                unfiltereds.append(construct.Container(row_flags=row_flags, row=None))
+                break
+
+            clustering_block = None
+            if self.has_clustering_columns:
+                clustering_block_header = buf[pos]
+                pos += 1
+                clustering_cells = []
+                for decode_value in self.clustering_decoders:
+                    key, pos = decode_value(buf, pos)
+                    clustering_cells.append(construct.Container(key=key))
+                clustering_block = construct.Container(
+                    clustering_block_header=clustering_block_header,
+                    clustering_cells=clustering_cells,
+                )
+
+            serialized_row_body_size, pos = sstable.varint.decode(buf, pos)
+            decoded = self.row_body_decoder.decode(buf[pos:pos+serialized_row_body_size], row_flags, pos)
+            if decoded is None:
+                raise sstable.row_decoder.Fallback()
+            row_body, row_body_size = decoded
+            pos += row_body_size
+            unfiltereds.append(construct.Container(
+                row_flags=row_flags,
+                row=construct.Container(
+                    clustering_block=clustering_block,
+                    serialized_row_body_size=serialized_row_body_size,
+                    row_body=row_body,
+                ),
+            ))
+
+        return construct.Container(partition_header=partition_header, unfiltereds=unfiltereds), pos
+
+def iter_partitions(sstable_statistics, data_stream, row_body_decoder=None):
+    if row_body_decoder is None:
+        row_body_decoder = sstable.row_decoder.compile_row_body_decoder(sstable_statistics.serialization_header)
+    stream, buf = map_stream(data_stream)
+    partition_decoder = PartitionDecoder(sstable_statistics, row_body_decoder)
+    can_decode = None not in partition_decoder.clustering_decoders
+
+    def parse_partition():
+        start = stream.tell()
+        if can_decode:
+            try:
+                p, end = partition_decoder.decode(buf, start)
+                stream.seek(end)
+                return p
+            except Exception:
+                stream.seek(start)
+        return sstable.sstable_data.partition.parse_stream(stream, sstable_statistics=sstable_statistics, row_body_decoder=row_body_decoder)
+
+    return sstable.greedy_range.iter_with_exception_handling(parse_partition, stream)
+
+def iter_rows(sstable_statistics, data_stream, row_body_decoder=None):
+    return sstable.sstable_data.rows_of(iter_partitions(sstable_statistics, data_stream, row_body_decoder=row_body_decoder))
@@ -0,0 +1,202 @@
+import array
+
+import sstable.utils
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Cassandra's variant of MurmurHash3 x64_128, used by Murmur3Partitioner for
+# tokens and by the bloom filters in Filter.db.
+# https://github.com/apache/cassandra/blob/cassandra-3.0/src/java/org/apache/cassandra/utils/MurmurHash.java#L183-L279
+#
+# NOTE: Unlike the reference implementation, Cassandra reads the tail bytes
+# as signed Java bytes, so they are sign extended before being shifted.
+
+MASK_64 = 0xffff_ffff_ffff_ffff
+C1 = 0x87c3_7b91_1142_53d5
+C2 = 0x4cf5_ad43_2745_937f
+MIN_TOKEN = -(1 << 63)
+MAX_TOKEN = (1 << 63) - 1
+
+def rotl64(v, n):
+    return ((v << n) | (v >> (64 - n))) & MASK_64
+
+def fmix(k):
+    k ^= k >> 33
+    k = (k * 0xff51_afd7_ed55_8ccd) & MASK_64
+    k ^= k >> 33
+    k = (k * 0xc4ce_b9fe_1a85_ec53) & MASK_64
+    k ^= k >> 33
+    return k
+
+def to_signed(v):
+    return v - (1 << 64) if v & (1 << 63) else v
+
+def hash3_x64_128(key, seed=0):
+    r"""
+    Returns the two halves of the hash as signed 64-bit integers, like the
+    long[2] result in Cassandra.
+    """
+    length = len(key)
+    nblocks = length >> 4
+    h1 = seed & MASK_64
+    h2 = seed & MASK_64
+
+    for i in range(nblocks):
+        k1 = int.from_bytes(key[i*16:i*16+8], "little")
+        k2 = int.from_bytes(key[i*16+8:i*16+16], "little")
+
+        k1 = (k1 * C1) & MASK_64
+        k1 = rotl64(k1, 31)
+        k1 = (k1 * C2) & MASK_64
+        h1 ^= k1
+        h1 = rotl64(h1, 27)
+        h1 = (h1 + h2) & MASK_64
+        h1 = (h1 * 5 + 0x52dc_e729) & MASK_64
+
+        k2 = (k2 * C2) & MASK_64
+        k2 = rotl64(k2, 33)
+        k2 = (k2 * C1) & MASK_64
+        h2 ^= k2
+        h2 = rotl64(h2, 31)
+        h2 = (h2 + h1) & MASK_64
+        h2 = (h2 * 5 + 0x3849_5ab5) & MASK_64
+
+    tail = key[nblocks*16:]
+    k1 = 0
+    k2 = 0
+    for i in range(len(tail) - 1, -1, -1):
+        # sign extended, see the NOTE above
+        byte = tail[i] - 256 if tail[i] > 127 else tail[i]
+        if i >= 8:
+            k2 ^= (byte << ((i - 8) * 8)) & MASK_64
+        else:
+            k1 ^= (byte << (i * 8)) & MASK_64
+    if len(tail) > 8:
+        k2 = (k2 * C2) & MASK_64
+        k2 = rotl64(k2, 33)
+        k2 = (k2 * C1) & MASK_64
+        h2 ^= k2
+    if len(tail) > 0:
+        k1 = (k1 * C1) & MASK_64
+        k1 = rotl64(k1, 31)
+        k1 = (k1 * C2) & MASK_64
+        h1 ^= k1
+
+    h1 ^= length
+    h2 ^= length
+    h1 = (h1 + h2) & MASK_64
+    h2 = (h2 + h1) & MASK_64
+    h1 = fmix(h1)
+    h2 = fmix(h2)
+    h1 = (h1 + h2) & MASK_64
+    h2 = (h2 + h1) & MASK_64
+    return to_signed(h1), to_signed(h2)
+
+def token(partition_key):
+    r"""
+    Murmur3Partitioner token of a partition key (as stored in Data.db).
+    https://github.com/apache/cassandra/blob/cassandra-3.0/src/java/org/apache/cassandra/dht/Murmur3Partitioner.java#L207-L214
+    """
+    h1 = hash3_x64_128(partition_key)[0]
+    # MIN_TOKEN is reserved for the minimum bound of the token ring
+    return MAX_TOKEN if h1 == MIN_TOKEN else h1
+
+def decorated_key(partition_key):
+    r"""
+    Partitions are sorted by token, and by key for the same token.
+    """
+    return token(partition_key), bytes(partition_key)
+
+# SELECT token(id) FROM ... WHERE id = 1; with id int:
+sstable.utils.assert_equal(-4069959284402364209, token(b"\x00\x00\x00\x01"))
+
+def _rotl64_numpy(v, n):
+    return (v << numpy.uint64(n)) | (v >> numpy.uint64(64 - n))
+
+def _fmix_numpy(k):
+    k ^= k >> numpy.uint64(33)
+    k *= numpy.uint64(0xff51_afd7_ed55_8ccd)
+    k ^= k >> numpy.uint64(33)
+    k *= numpy.uint64(0xc4ce_b9fe_1a85_ec53)
+    k ^= k >> numpy.uint64(33)
+    return k
+
+def _tokens_numpy(keys, length):
+    r"""
+    Same as token for many keys of the same length, one key per row of a
+    numpy uint8 array. uint64 arithmetic wraps around like MASK_64.
+    """
+    n = len(keys)
+    nblocks = length >> 4
+    c1 = numpy.uint64(C1)
+    c2 = numpy.uint64(C2)
+    h1 = numpy.zeros(n, dtype=numpy.uint64)
+    h2 = numpy.zeros(n, dtype=numpy.uint64)
+
+    if nblocks:
+        blocks = numpy.ascontiguousarray(keys[:, :nblocks*16]).view("<u8").astype(numpy.uint64)
+    for i in range(nblocks):
+        k1 = blocks[:, 2*i] * c1
+        k1 = _rotl64_numpy(k1, 31) * c2
+        h1 ^= k1
+        h1 = _rotl64_numpy(h1, 27) + h2
+        h1 = h1 * numpy.uint64(5) + numpy.uint64(0x52dc_e729)
+
+        k2 = blocks[:, 2*i+1] * c2
+        k2 = _rotl64_numpy(k2, 33) * c1
+        h2 ^= k2
+        h2 = _rotl64_numpy(h2, 31) + h1
+        h2 = h2 * numpy.uint64(5) + numpy.uint64(0x3849_5ab5)
+
+    tail_length = length - nblocks*16
+    # sign extended, see the NOTE above
+    tail = keys[:, nblocks*16:].view(numpy.int8).astype(numpy.int64).view(numpy.uint64)
+    k1 = numpy.zeros(n, dtype=numpy.uint64)
+    k2 = numpy.zeros(n, dtype=numpy.uint64)
+    for i in range(tail_length - 1, -1, -1):
+        if i >= 8:
+            k2 ^= tail[:, i] << numpy.uint64((i - 8) * 8)
+        else:
+            k1 ^= tail[:, i] << numpy.uint64(i * 8)
+    if tail_length > 8:
+        k2 = _rotl64_numpy(k2 * c2, 33) * c1
+        h2 ^= k2
+    if tail_length > 0:
+        k1 = _rotl64_numpy(k1 * c1, 31) * c2
+        h1 ^= k1
+
+    h1 ^= numpy.uint64(length)
+    h2 ^= numpy.uint64(length)
+    h1 += h2
+    h2 += h1
+    h1 = _fmix_numpy(h1)
+    h2 = _fmix_numpy(h2)
+    h1 += h2
+    result = h1.view(numpy.int64)
+    # MIN_TOKEN is reserved, see token
+    result[result == MIN_TOKEN] = MAX_TOKEN
+    return result
+
+def tokens(partition_keys):
+    r"""
+    The tokens of many partition keys, as an array('q'). With numpy, the keys
+    of the same length are hashed together, one vectorized operation per
+    step of the hash instead of one Python loop per key.
+    """
+    partition_keys = [bytes(key) for key in partition_keys]
+    if numpy is None:
+        return array.array("q", map(token, partition_keys))
+
+    result = numpy.empty(len(partition_keys), dtype=numpy.int64)
+    by_length = {}
+    for i, key in enumerate(partition_keys):
+        by_length.setdefault(len(key), []).append(i)
+    for length, indexes in by_length.items():
+        keys = numpy.frombuffer(b"".join(partition_keys[i] for i in indexes), dtype=numpy.uint8).reshape(len(indexes), length)
+        result[indexes] = _tokens_numpy(keys, length)
+    return array.array("q", result.tolist())
+
+sstable.utils.assert_equal(array.array("q", [token(b"\x00\x00\x00\x01"), token(b""), token(b"\xff" * 33)]), tokens([b"\x00\x00\x00\x01", b"", b"\xff" * 33]))
@@ -0,0 +1,185 @@
+import io
+import os
+import bisect
+import functools
+import contextlib
+import concurrent.futures
+
+import construct
+
+import sstable.utils
+import sstable.dump
+import sstable.row_scan
+import sstable.greedy_range
+import sstable.mmap_reader
+import sstable.sstable_data
+import sstable.sstable_index
+import sstable.sstable_statistics
+import sstable.compressed_data
+
+# Dumps one Data.db on several processes. Data.db is split into byte ranges
+# that start at partition boundaries (from Index.db, or from a scan of the
+# partition headers and row sizes when there's no Index.db), each range is
+# dumped by a worker process into a string, and the strings are written in
+# the order of the ranges. The output is the same as sstable.dump.dump,
+# including the "Exception occurred at position" messages, which are printed
+# by the workers into the same strings.
+
+def index_positions(index_stream):
+    r"""
+    The Data.db positions of all the partitions in Index.db.
+    """
+    buf = index_stream.read()
+    positions = []
+    pos = 0
+    while pos < len(buf):
+        _, position, pos = sstable.sstable_index.read_entry(buf, pos)
+        positions.append(position)
+    return positions
+
+def scan_positions(sstable_statistics, data_stream):
+    r"""
+    The Data.db positions of the partitions, found by jumping over the rows
+    by their sizes. Stops at the first partition that can't be scanned.
+    """
+    stream, buf = sstable.mmap_reader.map_stream(data_stream)
+    scanner = sstable.row_scan.RowScanner(sstable_statistics)
+    positions = []
+    pos = stream.tell()
+    while pos < len(buf):
+        positions.append(pos)
+        try:
+            _, _, pos = scanner.scan_partition(stream, buf, pos, None, None, False)
+        except Exception:
+            # The range of the last partition goes to the end of the file
+            break
+    return positions
+
+def split_ranges(positions, data_size, count):
+    r"""
+    Splits [positions[0], data_size) into at most count ranges of about the
+    same size, each starting at one of positions.
+    """
+    if not positions:
+        return []
+    starts = [positions[0]]
+    range_size = (data_size - positions[0]) / count
+    for i in range(1, count):
+        # The last partition that starts before the end of range i
+        j = bisect.bisect_right(positions, positions[0] + i * range_size) - 1
+        if positions[j] > starts[-1]:
+            starts.append(positions[j])
+    return list(zip(starts, starts[1:] + [data_size]))
+
+sstable.utils.assert_equal([(0, 10), (10, 40)], split_ranges([0, 10, 30], 40, 2))
+sstable.utils.assert_equal([(0, 40)], split_ranges([0], 40, 4))
+
+# The Data.db bytes of a range. The parent keeps the output of up to
+# workers * 2 ranges, so this bounds its memory whatever the size of Data.db.
+RANGE_SIZE = 64 << 20
+
+def range_count(data_size, workers, range_size=RANGE_SIZE):
+    # More ranges than workers, so that the workers finishing early get more
+    return max(workers * 4, -(-data_size // range_size))
+
+sstable.utils.assert_equal(8, range_count(100, 2))
+sstable.utils.assert_equal(160, range_count(10 << 30, 2))
+
+@functools.lru_cache(maxsize=None)
+def read_statistics(statistics_path):
+    # Once per worker process and SSTable
+    with open(statistics_path, "rb") as f:
+        return sstable.sstable_statistics.statistics_format.parse_stream(f)
+
+@functools.lru_cache(maxsize=None)
+def row_body_decoder_for(statistics_path, engine, columns):
+    return sstable.dump.make_row_body_decoder(read_statistics(statistics_path), engine, columns=list(columns) if columns is not None else None)
+
+def dump_range(statistics_path, data_path, start, end, output_format="json", engine="compiled", columns=None):
+    r"""
+    Dumps the partitions of Data.db that start in [start, end). Returns the
+    output as a string, the position where parsing stopped, which is end
+    unless the grammar stopped early (at what it took for the end of the
+    file) or a partition went past end, and the exception that stopped the
+    writer, if any.
+    """
+    parsed_statistics = read_statistics(statistics_path)
+    row_body_decoder = row_body_decoder_for(statistics_path, engine, tuple(columns) if columns is not None else None)
+    output = io.StringIO()
+    writer = sstable.dump.make_writer(output_format, output)
+    with sstable.compressed_data.open_data_file(data_path) as data_stream, contextlib.redirect_stdout(output):
+        data_stream.seek(start)
+        def parse_partition():
+            if data_stream.tell() >= end:
+                # The next range starts here
+                raise construct.StreamError("end of range")
+            return sstable.sstable_data.partition.parse_stream(data_stream, sstable_statistics=parsed_statistics, row_body_decoder=row_body_decoder)
+        partitions = sstable.greedy_range.iter_with_exception_handling(parse_partition, data_stream)
+        error = None
+        try:
+            sstable.dump.write_rows(parsed_statistics, sstable.sstable_data.rows_of(partitions), writer, columns=columns, header=False)
+        except Exception as e:
+            # Raised after the rows before it are written, like in the
+            # sequential dump
+            error = e
+        position = data_stream.tell()
+    return output.getvalue(), position, error
+
+def dump_parallel(table_dir, output, output_format="json", engine="compiled", columns=None, workers=None, generation=1, range_size=RANGE_SIZE):
+    r"""
+    Same as sstable.dump.dump for the SSTable of the given generation in
+    table_dir, on workers processes. output is a text stream.
+    """
+    path = lambda component: os.path.join(table_dir, f"me-{generation}-big-{component}.db")
+    statistics_path, data_path = path("Statistics"), path("Data")
+    parsed_statistics = read_statistics(statistics_path)
+    workers = workers or os.cpu_count() or 1
+
+    if os.path.exists(path("Index")):
+        with open(path("Index"), "rb") as f:
+            positions = index_positions(f)
+    else:
+        with sstable.compressed_data.open_data_file(data_path) as f:
+            positions = scan_positions(parsed_statistics, f)
+    with sstable.compressed_data.open_data_file(data_path) as f:
+        data_size = f.seek(0, io.SEEK_END)
+    if not positions or positions[0] != 0:
+        # Whatever is before the first partition is dumped as usual
+        positions = [0] + positions
+    ranges = split_ranges(positions, data_size, range_count(data_size, workers, range_size))
+
+    writer = sstable.dump.make_writer(output_format, output)
+    sstable.dump.write_rows(parsed_statistics, [], writer, columns=columns)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        # Bounded, so that only a few ranges wait in memory to be written
+        max_pending = workers * 2
+        pending = []
+        ranges = iter(ranges)
+        while True:
+            for start, end in ranges:
+                pending.append((executor.submit(dump_range, statistics_path, data_path, start, end, output_format, engine, columns), end))
+                if len(pending) >= max_pending:
+                    break
+            if not pending:
+                break
+            future, end = pending.pop(0)
+            text, position, error = future.result()
+            output.write(text)
+            if error is not None:
+                raise error
+            if position == end:
+                continue
+
+            # After an error, the grammar resyncs one byte at a time, and what
+            # it parses there can go past the end of the range, or be taken
+            # for the end of the file. The sequential dump would go on from
+            # where this range stopped, so do the same.
+            for future, _ in pending:
+                future.cancel()
+            if position < end:
+                break
+            text, _, error = dump_range(statistics_path, data_path, position, data_size, output_format, engine, columns)
+            output.write(text)
+            if error is not None:
+                raise error
+            break
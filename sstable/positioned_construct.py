@@ -9,6 +9,9 @@ all_keys = []
 
 def wrap_func(cls):
     original_read = cls._parse
+    if getattr(original_read, "positioned", False):
+        # Already wrapped by an earlier init()
+        return
     debug = False
     
     def new_parse(self, stream, context, path):
@@ -39,6 +42,7 @@ def wrap_func(cls):
             global_position_map[(start_pos, end_pos)] = current
         return ret
     
+    new_parse.positioned = True
     cls._parse = new_parse
 
 
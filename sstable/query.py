@@ -0,0 +1,257 @@
+import os
+import re
+import sys
+import struct
+import argparse
+
+import construct
+
+import sstable.utils
+import sstable.dump
+import sstable.sstable_data
+import sstable.sstable_reader
+import sstable.sstable_statistics
+import sstable.compressed_data
+import sstable.row_scan
+
+# Scans the SSTables of a table directory that can have rows in a slice, e.g.
+# the rows written since some time, or the rows in a range of clustering keys.
+# Statistics.db of every SSTable has the range of the write timestamps and of
+# each clustering column of its rows, so the SSTables that can't have any row
+# in the slice are skipped without opening their Data.db.
+# https://github.com/apache/cassandra/blob/cassandra-3.0/src/java/org/apache/cassandra/db/SinglePartitionReadCommand.java#L612-L680
+#
+# min_clustering_key and max_clustering_key are the smallest and the largest
+# value of each clustering column on its own, not the first and the last
+# clustering key, e.g. the keys (1, 9) and (2, 3) give (1, 3) and (2, 9).
+# They have as many values as the longest clustering prefix, which can be
+# fewer than the clustering columns.
+# https://github.com/apache/cassandra/blob/cassandra-3.0/src/java/org/apache/cassandra/io/sstable/metadata/MetadataCollector.java#L236-L266
+
+MARSHAL = "org.apache.cassandra.db.marshal."
+REVERSED_TYPE = re.compile(r"^org\.apache\.cassandra\.db\.marshal\.ReversedType\((.*)\)$")
+
+# Clustering values in Statistics.db don't have a length. Only the types whose
+# decoded values sort like Cassandra sorts them are here, the other clustering
+# columns are never used to skip SSTables.
+raw_value_decoders = {
+    MARSHAL + "UTF8Type": lambda raw: str(raw, "utf-8"),
+    MARSHAL + "AsciiType": lambda raw: str(raw, "ascii"),
+    MARSHAL + "BytesType": bytes,
+    MARSHAL + "BooleanType": lambda raw: raw[0],
+    MARSHAL + "Int32Type": lambda raw: struct.unpack(">i", raw)[0],
+    MARSHAL + "LongType": lambda raw: struct.unpack(">q", raw)[0],
+    MARSHAL + "TimestampType": lambda raw: struct.unpack(">q", raw)[0],
+    MARSHAL + "FloatType": lambda raw: struct.unpack(">f", raw)[0],
+    MARSHAL + "DoubleType": lambda raw: struct.unpack(">d", raw)[0],
+}
+
+# Values given on the command line, decoded like the values in Data.db
+value_parsers = {
+    MARSHAL + "UTF8Type": str,
+    MARSHAL + "AsciiType": str,
+    MARSHAL + "BytesType": bytes.fromhex,
+    MARSHAL + "BooleanType": lambda text: int(text.lower() == "true"),
+    MARSHAL + "Int32Type": int,
+    MARSHAL + "LongType": int,
+    MARSHAL + "TimestampType": int,
+    MARSHAL + "FloatType": float,
+    MARSHAL + "DoubleType": float,
+}
+
+def base_type(type_name):
+    match = REVERSED_TYPE.match(type_name)
+    return match.group(1) if match else type_name
+
+def clustering_ranges(sstable_statistics):
+    r"""
+    The (smallest, largest) value of each clustering column in the SSTable,
+    up to the first column that can't be compared.
+    """
+    types = sstable_statistics.serialization_header.clustering_key_types
+    min_key = sstable_statistics.statistics_metadata.min_clustering_key.column
+    max_key = sstable_statistics.statistics_metadata.max_clustering_key.column
+    ranges = []
+    for typ, min_column, max_column in zip(types, min_key, max_key):
+        decode = raw_value_decoders.get(base_type(typ.name))
+        if decode is None:
+            break
+        try:
+            values = decode(min_column.name), decode(max_column.name)
+        except (struct.error, IndexError, UnicodeDecodeError):
+            # e.g. an empty value
+            break
+        # For ReversedType columns the order is the other way around
+        ranges.append((min(values), max(values)))
+    return ranges
+
+class Slice:
+    r"""
+    The rows written between since and until (write timestamps in
+    microseconds, inclusive) whose clustering key is between start and end
+    (clustering prefixes, i.e. lists of values for the first clustering
+    columns, inclusive, compared value by value). None means unbounded.
+    """
+    def __init__(self, since=None, until=None, start=None, end=None):
+        self.since = since
+        self.until = until
+        self.start = start or []
+        self.end = end or []
+
+    def skip_reason(self, sstable_statistics):
+        r"""
+        Why no row of the SSTable can be in the slice, or None if some can.
+        """
+        statistics_metadata = sstable_statistics.statistics_metadata
+        if statistics_metadata is None:
+            return None
+        if self.since is not None and statistics_metadata.max_timestamp < self.since:
+            return "timestamp"
+        if self.until is not None and statistics_metadata.min_timestamp > self.until:
+            return "timestamp"
+        if not self.clustering_ranges_intersect(clustering_ranges(sstable_statistics)):
+            return "clustering"
+        return None
+
+    def clustering_ranges_intersect(self, ranges):
+        # Same as Slice.intersects in Cassandra: a column is only compared if
+        # the start and the end have the same values for the columns before it
+        # https://github.com/apache/cassandra/blob/cassandra-3.0/src/java/org/apache/cassandra/db/Slice.java#L222-L248
+        for i, (smallest, largest) in enumerate(ranges):
+            start = self.start[i] if i < len(self.start) else None
+            end = self.end[i] if i < len(self.end) else None
+            if end is not None and end < smallest:
+                return False
+            if start is not None and start > largest:
+                return False
+            if start is None or end is None or start != end:
+                break
+        return True
+
+    def clustering_predicate(self):
+        if not self.start and not self.end:
+            return None
+        start, end = self.start, self.end
+        def predicate(clustering_values):
+            if start and list(clustering_values[:len(start)]) < start:
+                return False
+            if end and list(clustering_values[:len(end)]) > end:
+                return False
+            return True
+        return predicate
+
+    def timestamp_predicate(self, sstable_statistics):
+        if self.since is None and self.until is None:
+            return None
+        min_timestamp = sstable.sstable_statistics.min_timestamp(sstable_statistics.serialization_header)
+        since, until = self.since, self.until
+        def predicate(unfiltered):
+            # Rows without liveness info only have cell timestamps, and are
+            # kept
+            if not unfiltered.row_flags & sstable.sstable_data.RowFlag.HAS_TIMESTAMP:
+                return True
+            timestamp = min_timestamp + unfiltered.row.row_body.timestamp_diff
+            return (since is None or timestamp >= since) and (until is None or timestamp <= until)
+        return predicate
+
+sstable.utils.assert_equal(True, Slice(start=["b"], end=["c"]).clustering_ranges_intersect([("a", "b")]))
+sstable.utils.assert_equal(False, Slice(start=["c"]).clustering_ranges_intersect([("a", "b")]))
+sstable.utils.assert_equal(False, Slice(start=[1, 5], end=[1, 6]).clustering_ranges_intersect([(1, 2), (7, 9)]))
+sstable.utils.assert_equal(True, Slice(start=[1, 5], end=[2, 6]).clustering_ranges_intersect([(1, 2), (7, 9)]))
+
+def parse_clustering_prefix(sstable_statistics, text):
+    r"""
+    Comma separated clustering values, e.g. "a,1", for the first clustering
+    columns.
+    """
+    if not text:
+        return []
+    types = sstable_statistics.serialization_header.clustering_key_types
+    texts = text.split(",")
+    if len(texts) > len(types):
+        raise Exception(f"{text} has {len(texts)} values, but there are only {len(types)} clustering columns")
+    values = []
+    for typ, value_text in zip(types, texts):
+        parse_value = value_parsers.get(base_type(typ.name))
+        if parse_value is None:
+            raise Exception(f"Clustering ranges are not supported for {typ.name}")
+        values.append(parse_value(value_text))
+    return values
+
+def iter_rows(data_path, sstable_statistics, query_slice, row_body_decoder=None):
+    timestamp_predicate = query_slice.timestamp_predicate(sstable_statistics)
+    with sstable.compressed_data.open_data_file(data_path) as data_file:
+        rows = sstable.row_scan.iter_rows(sstable_statistics, data_file, clustering_predicate=query_slice.clustering_predicate(), row_body_decoder=row_body_decoder)
+        for partition, unfiltered in rows:
+            if timestamp_predicate is None or timestamp_predicate(unfiltered):
+                yield partition, unfiltered
+
+def scan(table_dir, query_slice, row_body_decoder_factory=None):
+    r"""
+    Yields (sstable_statistics, rows) for every generation in table_dir that
+    can have rows in query_slice, oldest generation first, rows being an
+    iterator of the (partition, unfiltered) that are in query_slice. Only
+    Statistics.db is read for the SSTables that are skipped. Returns the counts
+    of what was done, like sstable.sstable_reader.lookup.
+    """
+    stats = construct.Container(
+        sstables=0,
+        skipped_by_timestamp=0,
+        skipped_by_clustering=0,
+        scanned=0,
+    )
+    for generation in sstable.sstable_reader.list_generations(table_dir):
+        stats.sstables += 1
+        with open(sstable.sstable_reader.component_path(table_dir, generation, "Statistics"), "rb") as f:
+            sstable_statistics = sstable.sstable_statistics.statistics_format.parse_stream(f)
+        reason = query_slice.skip_reason(sstable_statistics)
+        if reason is not None:
+            stats[f"skipped_by_{reason}"] += 1
+            continue
+        stats.scanned += 1
+        row_body_decoder = row_body_decoder_factory(sstable_statistics) if row_body_decoder_factory else None
+        data_path = sstable.sstable_reader.component_path(table_dir, generation, "Data")
+        yield sstable_statistics, iter_rows(data_path, sstable_statistics, query_slice, row_body_decoder=row_body_decoder)
+    return stats
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('dir', type=str)
+    parser.add_argument('--format', type=str, default="json", help="json, csv or typed-csv")
+    parser.add_argument('--since', type=int, help="only rows written at or after this timestamp, in microseconds")
+    parser.add_argument('--until', type=int, help="only rows written at or before this timestamp, in microseconds")
+    parser.add_argument('--clustering-range', type=str, help="START:END, each a comma separated clustering prefix, either can be empty")
+    parser.add_argument('--count', action='store_true', help="only print the number of rows")
+    args = parser.parse_args()
+
+    writer = sstable.dump.make_writer(args.format, os.sys.stdout)
+
+    start = end = None
+    generations = sstable.sstable_reader.list_generations(args.dir)
+    if args.clustering_range is not None and generations:
+        # The clustering columns are the same in every generation
+        with open(sstable.sstable_reader.component_path(args.dir, generations[0], "Statistics"), "rb") as f:
+            first_statistics = sstable.sstable_statistics.statistics_format.parse_stream(f)
+        start_text, _, end_text = args.clustering_range.partition(":")
+        start = parse_clustering_prefix(first_statistics, start_text)
+        end = parse_clustering_prefix(first_statistics, end_text)
+
+    query_slice = Slice(since=args.since, until=args.until, start=start, end=end)
+    sstables = scan(args.dir, query_slice, lambda statistics: sstable.dump.make_row_body_decoder(statistics, "compiled"))
+    count = 0
+    header = True
+    while True:
+        try:
+            sstable_statistics, rows = next(sstables)
+        except StopIteration as stop:
+            stats = stop.value
+            break
+        if args.count:
+            count += sum(1 for _ in rows)
+        else:
+            # The header of the first SSTable only
+            sstable.dump.write_rows(sstable_statistics, rows, writer, header=header)
+            header = False
+    if args.count:
+        print(count)
+    print(f"Scanned {stats.scanned} of {stats.sstables} SSTables, {stats.skipped_by_timestamp} skipped by timestamp, {stats.skipped_by_clustering} skipped by clustering range", file=sys.stderr)
@@ -0,0 +1,436 @@
+import io
+import struct
+
+import construct
+
+import sstable.utils
+import sstable.varint
+import sstable.sstable_data
+import sstable.type_parser
+
+# The grammar in sstable.sstable_data looks up the type of every cell through
+# the context (WithContext, DynamicSwitch, Switch, ...) which is flexible, but
+# slow. The serialization header already tells us the type of every column, so
+# here we generate one Python function per header with straight-line code for
+# each column, and use it instead of row_body_format.
+#
+# The generated function returns exactly what row_body_format would return.
+# Anything it doesn't know how to decode (complex cells, unknown types,
+# malformed data) is left to the grammar, so both the output and the error
+# messages stay the same as before.
+
+class Fallback(Exception):
+    pass
+
+read_varint = sstable.varint.decode
+
+def read_enabled_columns(buf, pos, columns_count):
+    # Same as sstable.sstable_data.EnabledColumns
+    if columns_count < 64:
+        mask, pos = read_varint(buf, pos)
+        return [i for i in range(columns_count) if not (1 << i) & mask], pos
+
+    disabled_count, pos = read_varint(buf, pos)
+    enabled_count = columns_count - disabled_count
+    if enabled_count < columns_count // 2:
+        return sstable.varint.decode_many(buf, pos, enabled_count)
+    disabled, pos = sstable.varint.decode_many(buf, pos, disabled_count)
+    disabled = set(disabled)
+    return [i for i in range(columns_count) if i not in disabled], pos
+
+sstable.utils.assert_equal(([3, 4, 6, 7, 8, 9], 1), read_enabled_columns(bytes([0b00100111]), 0, 10))
+sstable.utils.assert_equal(([7, 8], 3), read_enabled_columns(bytes([64, 7, 8]), 0, 66))
+sstable.utils.assert_equal(([i for i in range(66) if i != 7], 2), read_enabled_columns(bytes([1, 7]), 0, 66))
+
+# Python source that decodes one cell value starting at buf[pos], assigns it
+# to `value` and moves `pos` after it. The Containers have the same fields as
+# the structs in sstable.type_parser.java_type_to_construct.
+_length_prefixed_bytes = """
+length, pos = read_varint(buf, pos)
+value = Container(length=length, cell_value=buf[pos:pos+length])
+pos += length
+"""
+_length_prefixed_integer = """
+length, pos = read_varint(buf, pos)
+if length <= 0:
+    raise Fallback()
+value = Container(length=length, cell_value=int.from_bytes(buf[pos:pos+length], "big"))
+pos += length
+"""
+java_type_to_source = {
+    "org.apache.cassandra.db.marshal.UTF8Type": """
+cell_value_len, pos = read_varint(buf, pos)
+value = Container(cell_value_len=cell_value_len, cell_value=str(buf[pos:pos+cell_value_len], "utf-8"))
+pos += cell_value_len
+""",
+    "org.apache.cassandra.db.marshal.ShortType": _length_prefixed_integer,
+    "org.apache.cassandra.db.marshal.IntegerType": _length_prefixed_integer,
+    "org.apache.cassandra.db.marshal.Int32Type": """
+value = Container(cell_value=unpack_int32(buf, pos)[0])
+pos += 4
+""",
+    "org.apache.cassandra.db.marshal.LongType": """
+value = Container(cell_value=unpack_int64(buf, pos)[0])
+pos += 8
+""",
+    "org.apache.cassandra.db.marshal.DecimalType": """
+total_length, pos = read_varint(buf, pos)
+if total_length <= 4:
+    raise Fallback()
+scale = unpack_uint32(buf, pos)[0]
+unscaled_big_int = int.from_bytes(buf[pos+4:pos+total_length], "big")
+value = Container(cell_value=unscaled_big_int * (10**-scale))
+pos += total_length
+""",
+    "org.apache.cassandra.db.marshal.AsciiType": """
+length, pos = read_varint(buf, pos)
+value = Container(length=length, cell_value=str(buf[pos:pos+length], "ascii"))
+pos += length
+""",
+    "org.apache.cassandra.db.marshal.ByteType": _length_prefixed_bytes,
+    "org.apache.cassandra.db.marshal.BytesType": _length_prefixed_bytes,
+    "org.apache.cassandra.db.marshal.BooleanType": """
+value = buf[pos]
+if value > 1:
+    raise Fallback()
+value = Container(cell_value=value)
+pos += 1
+""",
+    "org.apache.cassandra.db.marshal.FloatType": """
+value = Container(cell_value=unpack_float(buf, pos)[0])
+pos += 4
+""",
+    "org.apache.cassandra.db.marshal.DoubleType": """
+value = Container(cell_value=unpack_double(buf, pos)[0])
+pos += 8
+""",
+    "org.apache.cassandra.db.marshal.TimestampType": """
+value = Container(cell_value=unpack_int64(buf, pos)[0])
+pos += 8
+""",
+    "org.apache.cassandra.db.marshal.UUIDType": """
+value = Container(cell_value=HexDisplayedBytes(buf[pos:pos+16]))
+pos += 16
+""",
+}
+
+# Python source that moves `pos` after one cell value without decoding it,
+# for the columns that are not projected.
+_skip_length_prefixed = """
+length, pos = read_varint(buf, pos)
+pos += length
+"""
+java_type_to_skip_source = {
+    "org.apache.cassandra.db.marshal.UTF8Type": _skip_length_prefixed,
+    "org.apache.cassandra.db.marshal.ShortType": _skip_length_prefixed,
+    "org.apache.cassandra.db.marshal.IntegerType": _skip_length_prefixed,
+    "org.apache.cassandra.db.marshal.Int32Type": "pos += 4",
+    "org.apache.cassandra.db.marshal.LongType": "pos += 8",
+    "org.apache.cassandra.db.marshal.DecimalType": _skip_length_prefixed,
+    "org.apache.cassandra.db.marshal.AsciiType": _skip_length_prefixed,
+    "org.apache.cassandra.db.marshal.ByteType": _skip_length_prefixed,
+    "org.apache.cassandra.db.marshal.BytesType": _skip_length_prefixed,
+    "org.apache.cassandra.db.marshal.BooleanType": "pos += 1",
+    "org.apache.cassandra.db.marshal.FloatType": "pos += 4",
+    "org.apache.cassandra.db.marshal.DoubleType": "pos += 8",
+    "org.apache.cassandra.db.marshal.TimestampType": "pos += 8",
+    "org.apache.cassandra.db.marshal.UUIDType": "pos += 16",
+}
+
+def decode_with_construct(buf, pos, codec):
+    stream = io.BytesIO(buf)
+    stream.seek(pos)
+    value = codec.parse_stream(stream)
+    return value, stream.tell()
+
+class LazyCell(construct.Container):
+    r"""
+    A simple_cell whose value is only decoded the first time `cell` is read,
+    and kept from then on. Until then it has cell_flags and a `_lazy` entry
+    with the row body, the position of the value and the function that
+    decodes it. Entries starting with `_` are ignored by Container
+    comparisons, so it is equal to the Container the grammar parses.
+    """
+    def __missing__(self, key):
+        if key == "cell" and dict.__contains__(self, "_lazy"):
+            buf, pos, decode_value = self.pop("_lazy")
+            self["cell"] = decode_value(buf, pos)
+            return dict.__getitem__(self, "cell")
+        raise KeyError(key)
+
+    def decode(self):
+        if dict.__contains__(self, "_lazy"):
+            self["cell"]
+        return self
+
+    def __contains__(self, key):
+        return key == "cell" and dict.__contains__(self, "_lazy") or dict.__contains__(self, key)
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def keys(self):
+        return construct.Container.keys(self.decode())
+
+    def values(self):
+        return construct.Container.values(self.decode())
+
+    def items(self):
+        return construct.Container.items(self.decode())
+
+    def __iter__(self):
+        return construct.Container.__iter__(self.decode())
+
+    def __len__(self):
+        return construct.Container.__len__(self.decode())
+
+    def __eq__(self, other):
+        return construct.Container.__eq__(self.decode(), other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return construct.Container.__repr__(self.decode())
+
+    def __str__(self):
+        return construct.Container.__str__(self.decode())
+
+def lazy_value_decoder(type_name):
+    r"""
+    Returns decode_value(buf, pos) -> value for LazyCell. Values the
+    generated code can't decode are decoded by the grammar's codec of the
+    type, like the grammar would decode that cell.
+    """
+    decode_value = compile_value_decoder(type_name)
+    codec = sstable.type_parser.parse_type(type_name)
+    def decode(buf, pos):
+        try:
+            return decode_value(buf, pos)[0]
+        except Fallback:
+            return decode_with_construct(buf, pos, codec)[0]
+    return decode
+
+def indent(source, level):
+    return "".join(f"{'    ' * level}{line}\n" for line in source.strip().splitlines())
+
+def is_lazy(type_name):
+    return type_name in java_type_to_source and type_name in java_type_to_skip_source
+
+def cell_source(column_index, type_name, level, skip=False, lazy=False):
+    r"""
+    Source of a simple_cell for one column, assigning its Container to
+    `cell_<column_index>`. With skip, the cell is only stepped over. With
+    lazy, the value is stepped over too, and decoded by a LazyCell when it is
+    read, for the types with both a decoder and a skipper.
+    """
+    is_set_type = type_name.startswith("org.apache.cassandra.db.marshal.SetType")
+    if lazy and not skip and is_lazy(type_name):
+        source = indent("cell_flags = buf[pos]\npos += 1", level)
+        source += indent(f"""
+if cell_flags & {sstable.sstable_data.CellFlag.HAS_EMPTY_VALUE}:
+    cell_{column_index} = Container(cell_flags=cell_flags, cell=None)
+else:
+    cell_{column_index} = LazyCell(cell_flags=cell_flags, _lazy=(buf, pos, decode_value_{column_index}))
+""", level)
+        source += indent(java_type_to_skip_source[type_name], level + 1)
+        return source
+    if skip and type_name in java_type_to_skip_source:
+        decode_value = java_type_to_skip_source[type_name]
+    elif type_name in java_type_to_source and not skip:
+        decode_value = java_type_to_source[type_name]
+    else:
+        decode_value = f"value, pos = decode_with_construct(buf, pos, codec_{column_index})"
+
+    source = indent("cell_flags = buf[pos]\npos += 1", level)
+    if is_set_type:
+        source += indent(decode_value, level)
+    elif skip:
+        source += indent(f"if not cell_flags & {sstable.sstable_data.CellFlag.HAS_EMPTY_VALUE}:", level)
+        source += indent(decode_value, level + 1)
+    else:
+        source += indent(f"if cell_flags & {sstable.sstable_data.CellFlag.HAS_EMPTY_VALUE}:\n    value = None\nelse:", level)
+        source += indent(decode_value, level + 1)
+    if not skip:
+        source += indent(f"cell_{column_index} = Container(cell_flags=cell_flags, cell=value)", level)
+    return source
+
+def generate_source(regular_columns, projection=None, lazy=False):
+    r"""
+    With projection, a list of column indexes, only those cells are decoded
+    and the others are skipped. `cells` then has one cell per projected
+    column, None for the columns that are missing from the row. With lazy,
+    cells are LazyCells where possible, see cell_source.
+    """
+    type_names = [column.type.name for column in regular_columns]
+    columns_count = len(type_names)
+    decoded = list(range(columns_count)) if projection is None else projection
+
+    source = "def decode_row_body(buf, row_flags, row_body_start):\n"
+    source += indent(f"""
+if row_flags & {sstable.sstable_data.RowFlag.HAS_COMPLEX_DELETION}:
+    raise Fallback()
+pos = 0
+previous_unfiltered_size, pos = read_varint(buf, pos)
+timestamp_diff, pos = read_varint(buf, pos)
+if row_flags & {sstable.sstable_data.RowFlag.HAS_ALL_COLUMNS}:
+    missing_columns = None
+""", 1)
+    last_decoded = max(decoded, default=-1)
+    for column_index, type_name in enumerate(type_names):
+        if projection is not None and column_index > last_decoded:
+            # Nothing else to decode, the size of the row tells where it ends
+            source += indent("pos = len(buf)", 2)
+            break
+        source += cell_source(column_index, type_name, 2, skip=column_index not in decoded, lazy=lazy)
+    source += indent(f"cells = [{', '.join(f'cell_{i}' for i in decoded)}]", 2)
+    if projection is None:
+        source += indent(f"""
+else:
+    missing_columns, pos = read_enabled_columns(buf, pos, {columns_count})
+    cells = []
+    for column_index in missing_columns:
+        cell, pos = decode_cell[column_index](buf, pos)
+        cells.append(cell)
+""", 1)
+    else:
+        source += indent(f"""
+else:
+    missing_columns, pos = read_enabled_columns(buf, pos, {columns_count})
+    present = {{}}
+    for column_index in missing_columns:
+        if column_index > {last_decoded}:
+            pos = len(buf)
+            break
+        cell, pos = decode_cell[column_index](buf, pos)
+        present[column_index] = cell
+    cells = [present.get(column_index) for column_index in {decoded}]
+""", 1)
+    projection_field = "" if projection is None else f"projection={projection},"
+    source += indent(f"""
+if pos > len(buf):
+    raise Fallback()
+return Container(
+    row_body_start=row_body_start,
+    previous_unfiltered_size=previous_unfiltered_size,
+    timestamp_diff=timestamp_diff,
+    missing_columns=missing_columns,
+    cells=cells,
+    {projection_field}
+), pos
+""", 1)
+
+    # One function per column, used for rows with missing columns:
+    for column_index, type_name in enumerate(type_names):
+        skip = column_index not in decoded
+        source += f"def decode_cell_{column_index}(buf, pos):\n"
+        source += cell_source(column_index, type_name, 1, skip=skip, lazy=lazy)
+        source += indent(f"return {'None' if skip else f'cell_{column_index}'}, pos", 1)
+    source += f"decode_cell = [{', '.join(f'decode_cell_{i}' for i in range(columns_count))}]\n"
+    return source
+
+# Globals of the generated code
+def make_namespace():
+    return {
+        "Container": construct.Container,
+        "LazyCell": LazyCell,
+        "HexDisplayedBytes": construct.lib.HexDisplayedBytes,
+        "Fallback": Fallback,
+        "read_varint": read_varint,
+        "read_enabled_columns": read_enabled_columns,
+        "decode_with_construct": decode_with_construct,
+        "unpack_int32": struct.Struct(">i").unpack_from,
+        "unpack_uint32": struct.Struct(">I").unpack_from,
+        "unpack_int64": struct.Struct(">q").unpack_from,
+        "unpack_float": struct.Struct(">f").unpack_from,
+        "unpack_double": struct.Struct(">d").unpack_from,
+    }
+
+def compile_value_decoder(type_name):
+    r"""
+    Returns decode_value(buf, pos) -> (value, pos) for a single value of
+    type_name, or None if only the grammar knows how to decode it.
+    """
+    if type_name not in java_type_to_source:
+        return None
+    source = "def decode_value(buf, pos):\n"
+    source += indent(java_type_to_source[type_name], 1)
+    source += indent("return value, pos", 1)
+    namespace = make_namespace()
+    exec(compile(source, f"<{type_name}>", "exec"), namespace)
+    return namespace["decode_value"]
+
+sstable.utils.assert_equal((construct.Container(cell_value_len=2, cell_value="hi"), 4), compile_value_decoder("org.apache.cassandra.db.marshal.UTF8Type")(b"\x00\x02hi", 1))
+sstable.utils.assert_equal(None, compile_value_decoder("org.apache.cassandra.db.marshal.ListType(org.apache.cassandra.db.marshal.Int32Type)"))
+
+def column_indexes(serialization_header, columns):
+    r"""
+    Indexes of the regular columns with the given names, in the same order.
+    """
+    names = [column.name for column in serialization_header.regular_columns]
+    for name in columns:
+        if name not in names:
+            raise Exception(f"Unknown column {name}, the regular columns are {', '.join(names)}")
+    return [names.index(name) for name in columns]
+
+def project_cells(row_body, projection):
+    r"""
+    The cells of the projected columns of a row body, None for the columns
+    that are missing from the row. Row bodies decoded with a projection
+    already have only those cells.
+    """
+    if row_body.get("projection") is not None:
+        return row_body.cells
+    if row_body.missing_columns is None:
+        return [row_body.cells[column_index] for column_index in projection]
+    present = dict(zip(row_body.missing_columns, row_body.cells))
+    return [present.get(column_index) for column_index in projection]
+
+class RowBodyDecoder:
+    r"""
+    With columns, a list of regular column names, only those cells are
+    decoded, see generate_source. With lazy, values are decoded when they are
+    first read, see LazyCell. The row bodies then keep the buffers they were
+    decoded from, e.g. a memoryview of the mmap of Data.db, which must still
+    be open when the values are read.
+    """
+    def __init__(self, serialization_header, columns=None, lazy=False):
+        self.projection = None if columns is None else column_indexes(serialization_header, columns)
+        self.source = generate_source(serialization_header.regular_columns, projection=self.projection, lazy=lazy)
+        namespace = make_namespace()
+        for column_index, column in enumerate(serialization_header.regular_columns):
+            if lazy and is_lazy(column.type.name):
+                namespace[f"decode_value_{column_index}"] = lazy_value_decoder(column.type.name)
+            if column.type.name not in java_type_to_source:
+                try:
+                    namespace[f"codec_{column_index}"] = sstable.type_parser.parse_type(column.type.name)
+                except Exception:
+                    # Unknown to the type parser as well, the grammar will report it
+                    namespace[f"codec_{column_index}"] = None
+        exec(compile(self.source, "<row_decoder>", "exec"), namespace)
+        self.decode_row_body = namespace["decode_row_body"]
+
+    def decode(self, buf, row_flags, row_body_start=0):
+        r"""
+        Decodes a whole row body from buf. Returns the row body and the number
+        of bytes used, or None if the row should be parsed by the grammar.
+        """
+        try:
+            return self.decode_row_body(buf, row_flags, row_body_start)
+        except Exception:
+            return None
+
+    def parse_stream(self, stream, row_flags, serialized_row_body_size):
+        start = stream.tell()
+        decoded = self.decode(stream.read(serialized_row_body_size), row_flags, start)
+        if decoded is None:
+            stream.seek(start)
+            return None
+        row_body, size = decoded
+        # The grammar doesn't use serialized_row_body_size, so continue from
+        # where the cells ended, like the grammar does.
+        stream.seek(start + size)
+        return row_body
+
+def compile_row_body_decoder(serialization_header, columns=None, lazy=False):
+    return RowBodyDecoder(serialization_header, columns=columns, lazy=lazy)
@@ -0,0 +1,154 @@
+import struct
+import functools
+
+import construct
+
+import sstable.varint
+import sstable.greedy_range
+import sstable.mmap_reader
+import sstable.row_decoder
+import sstable.sstable_data
+import sstable.type_parser
+
+# Scans Data.db without decoding the rows that are not needed. Every row
+# stores serialized_row_body_size, the size of its body starting at
+# previous_unfiltered_size, so after reading the flags and the clustering
+# block of a row, its body can be jumped over.
+#
+# - iter_rows yields the rows that pass partition_predicate(partition_key) and
+#   clustering_predicate(clustering_values), like sstable.sstable_data.iter_rows.
+# - count_rows only counts them, and never decodes a row body.
+#
+# clustering_values are the cell_value of the clustering cells, as in the
+# output of sstable.dump.
+
+class RowScanner:
+    def __init__(self, sstable_statistics, row_body_decoder=None):
+        serialization_header = sstable_statistics.serialization_header
+        self.sstable_statistics = sstable_statistics
+        self.row_body_decoder = row_body_decoder
+        self.clustering_decoders = []
+        for typ in serialization_header.clustering_key_types:
+            decode_value = sstable.row_decoder.compile_value_decoder(typ.name)
+            if decode_value is None:
+                decode_value = functools.partial(sstable.row_decoder.decode_with_construct, codec=sstable.type_parser.parse_type(typ.name))
+            self.clustering_decoders.append(decode_value)
+        self.has_clustering_columns = serialization_header.clustering_key_count > 0
+
+    def scan_partition(self, stream, buf, pos, partition_predicate, clustering_predicate, decode):
+        r"""
+        Scans the partition that starts at buf[pos], stream being a stream of
+        the same bytes for the grammar. Returns the partition header, the rows
+        that pass the predicates (decoded if decode is set, None otherwise)
+        and the position after the partition.
+        """
+        key_len, = sstable.mmap_reader.unpack_partition_header(buf, pos)
+        key = buf[pos+2:pos+2+key_len]
+        local_deletion_time, marked_for_delete_at = sstable.mmap_reader.unpack_deletion_time(buf, pos + 2 + key_len)
+        partition_header = construct.Container(
+            key_len=key_len,
+            key=key,
+            deletion_time=construct.Container(
+                local_deletion_time=local_deletion_time,
+                marked_for_delete_at=marked_for_delete_at,
+            ),
+        )
+        pos += 2 + key_len + 12
+
+        wanted = partition_predicate is None or partition_predicate(key)
+        rows = []
+        while True:
+            unfiltered_start = pos
+            row_flags = buf[pos]
+            pos += 1
+            if row_flags & sstable.sstable_data.RowFlag.END_OF_PARTITION:
+                break
+            if row_flags & (sstable.sstable_data.RowFlag.IS_MARKER | sstable.sstable_data.RowFlag.EXTENSION_FLAG):
+                raise Exception(f"Range tombstone markers and static rows are not supported, row flags {row_flags:#x}")
+
+            clustering_block = None
+            if self.has_clustering_columns:
+                clustering_block_header = buf[pos]
+                pos += 1
+                clustering_cells = []
+                for decode_value in self.clustering_decoders:
+                    value, pos = decode_value(buf, pos)
+                    clustering_cells.append(construct.Container(key=value))
+                clustering_block = construct.Container(
+                    clustering_block_header=clustering_block_header,
+                    clustering_cells=clustering_cells,
+                )
+
+            serialized_row_body_size, row_body_start = sstable.varint.decode(buf, pos)
+            pos = row_body_start + serialized_row_body_size
+            if not wanted:
+                continue
+            clustering_values = [cell.key.cell_value for cell in clustering_block.clustering_cells] if clustering_block else []
+            if clustering_predicate is not None and not clustering_predicate(clustering_values):
+                continue
+            if not decode:
+                rows.append(None)
+                continue
+            row = self.decode_row(stream, buf, unfiltered_start, row_flags, clustering_block, serialized_row_body_size, row_body_start)
+            if row is not None:
+                rows.append(row)
+
+        return partition_header, rows, pos
+
+    def decode_row(self, stream, buf, unfiltered_start, row_flags, clustering_block, serialized_row_body_size, row_body_start):
+        if self.row_body_decoder is not None:
+            decoded = self.row_body_decoder.decode(buf[row_body_start:row_body_start+serialized_row_body_size], row_flags, row_body_start)
+            if decoded is not None:
+                row_body, _ = decoded
+                return construct.Container(
+                    row_flags=row_flags,
+                    row=construct.Container(
+                        clustering_block=clustering_block,
+                        serialized_row_body_size=serialized_row_body_size,
+                        row_body=row_body,
+                    ),
+                )
+        stream.seek(unfiltered_start)
+        try:
+            return sstable.sstable_data.unfiltered.parse_stream(stream, sstable_statistics=self.sstable_statistics)
+        except Exception as e:
+            # The size of the row is known, so only this row is lost
+            print(f"Exception occurred at position {unfiltered_start}: {e}")
+            return None
+
+def scan(sstable_statistics, data_stream, partition_predicate, clustering_predicate, decode, row_body_decoder=None):
+    r"""
+    Yields (partition_header, rows) for every partition, see
+    RowScanner.scan_partition.
+    """
+    stream, buf = sstable.mmap_reader.map_stream(data_stream)
+    scanner = RowScanner(sstable_statistics, row_body_decoder=row_body_decoder)
+
+    def scan_partition():
+        start = stream.tell()
+        if start >= len(buf):
+            raise construct.StreamError("end of Data.db")
+        try:
+            partition_header, rows, end = scanner.scan_partition(stream, buf, start, partition_predicate, clustering_predicate, decode)
+        except (IndexError, struct.error) as e:
+            # Truncated, like the grammar reaching the end of the stream
+            raise construct.StreamError(str(e))
+        stream.seek(end)
+        return partition_header, rows
+
+    return sstable.greedy_range.iter_with_exception_handling(scan_partition, stream)
+
+def iter_rows(sstable_statistics, data_stream, partition_predicate=None, clustering_predicate=None, row_body_decoder=None):
+    r"""
+    Yields (partition, unfiltered) for the rows that pass the predicates. The
+    partitions only have a partition_header.
+    """
+    if row_body_decoder is None:
+        row_body_decoder = sstable.row_decoder.compile_row_body_decoder(sstable_statistics.serialization_header)
+    for partition_header, rows in scan(sstable_statistics, data_stream, partition_predicate, clustering_predicate, True, row_body_decoder=row_body_decoder):
+        partition = construct.Container(partition_header=partition_header)
+        for row in rows:
+            yield partition, row
+
+def count_rows(sstable_statistics, data_stream, partition_predicate=None, clustering_predicate=None):
+    return sum(len(rows) for _, rows in scan(sstable_statistics, data_stream, partition_predicate, clustering_predicate, False))
@@ -76,7 +76,7 @@ simple_cell = construct.Struct(
     "cell" / construct.If(
         # TODO: 0x04 means empty value, e.g. empty '' string (and probably used for tombstones as well?)
         cell_has_non_empty_value,
-        sstable.dynamic_switch.DynamicSwitch(get_cell_type_func, sstable.type_parser.parser.parse),
+        sstable.dynamic_switch.DynamicSwitch(get_cell_type_func, sstable.type_parser.parse_type),
     ),
 )
 
@@ -89,7 +89,7 @@ complex_cell_item = construct.Struct(
     "cell" / construct.If(
         # TODO: 0x04 means empty value, e.g. empty '' string (and probably used for tombstones as well?)
         cell_has_non_empty_value,
-        sstable.dynamic_switch.DynamicSwitch(get_cell_type_func, sstable.type_parser.parser.parse),
+        sstable.dynamic_switch.DynamicSwitch(get_cell_type_func, sstable.type_parser.parse_type),
     ),
 )
 
@@ -110,7 +110,7 @@ clustering_cell = construct.Struct(
     # NOTE: ctx._index seems ok, I used to think it incremented globally
     # "key" / construct.Switch(lambda ctx: ctx._root._.sstable_statistics.serialization_header.clustering_key_types[ctx._index].name, java_type_to_construct),
     ### "key" / construct.Switch(get_clustering_key_type_func, java_type_to_construct),
-    "key" / sstable.dynamic_switch.DynamicSwitch(get_clustering_key_type_func, sstable.type_parser.parser.parse),
+    "key" / sstable.dynamic_switch.DynamicSwitch(get_clustering_key_type_func, sstable.type_parser.parse_type),
 )
 
 def has_complex_deletion(x):
@@ -133,7 +133,7 @@ class EnabledColumns(construct.Construct):
         columns_count = self.columns_count_predicate(context)
 
         if columns_count < 64:
-            mask = sstable.varint.VarInt().parse_stream(stream)
+            mask = sstable.varint.parse(stream)
             enabled_col_indexes = []
             for i in range(columns_count):
                 disabled = (1 << i) & mask
@@ -142,31 +142,59 @@ class EnabledColumns(construct.Construct):
 
             return enabled_col_indexes
         else:
-            disabled_count = sstable.varint.VarInt().parse_stream(stream)
+            # Columns.Serializer.deserializeLargeSubset in https://github.com/apache/cassandra/blob/cassandra-3.0/src/java/org/apache/cassandra/db/Columns.java
+            disabled_count = sstable.varint.parse(stream)
+            enabled_count = columns_count - disabled_count
 
-            indexes = []
-            for i in range(columns_count - disabled_count):
-                index = sstable.varint.VarInt().parse_stream(stream)
-                indexes.append(index)
-
-            if disabled_count >= columns_count/2:
+            if enabled_count < columns_count // 2:
                 # there are fewer enabled colums, so the listed indexes are for
                 # enabled colums to be more space efficient.
-                # We want to return list of enabled indexes.
-                return indexes
+                return [sstable.varint.parse(stream) for _ in range(enabled_count)]
             else:
                 # there are fewer disabled colums, so the listed indexes are
                 # for disabled colums to be more space efficient.
                 # We still want to return the index of enabled columns though
-                return list(set(range(columns_count)) - set(indexes))
+                disabled = {sstable.varint.parse(stream) for _ in range(disabled_count)}
+                return [i for i in range(columns_count) if i not in disabled]
 
     def _build(self, obj, stream, context, path):
-        raise Exception("TODO: please implement _build for EnabledColumns")
+        # The other way around, obj is the list of enabled columns
+        columns_count = self.columns_count_predicate(context)
+        enabled = set(obj)
+        if columns_count < 64:
+            stream.write(sstable.varint.encode(sum(1 << i for i in range(columns_count) if i not in enabled)))
+        else:
+            stream.write(sstable.varint.encode(columns_count - len(enabled)))
+            if len(enabled) < columns_count // 2:
+                listed = sorted(enabled)
+            else:
+                listed = [i for i in range(columns_count) if i not in enabled]
+            for index in listed:
+                stream.write(sstable.varint.encode(index))
+        return obj
 
 sstable.utils.assert_equal([3, 4, 6, 7, 8, 9], EnabledColumns(lambda context: 10).parse(bytes([0b00100111])))
 sstable.utils.assert_equal([10], EnabledColumns(lambda context: 11).parse(bytes([0b10000011, 0b11111111])))
 sstable.utils.assert_equal([], EnabledColumns(lambda context: 66).parse(bytes([66])))
 sstable.utils.assert_equal([7, 8], EnabledColumns(lambda context: 66).parse(bytes([64, 7, 8])))
+sstable.utils.assert_equal([i for i in range(66) if i != 7], EnabledColumns(lambda context: 66).parse(bytes([1, 7])))
+sstable.utils.assert_equal(bytes([0b00100111]), EnabledColumns(lambda context: 10).build([3, 4, 6, 7, 8, 9]))
+sstable.utils.assert_equal(bytes([64, 7, 8]), EnabledColumns(lambda context: 66).build([7, 8]))
+sstable.utils.assert_equal(bytes([1, 7]), EnabledColumns(lambda context: 66).build([i for i in range(66) if i != 7]))
+
+# RowBody parses the row body with the grammar, unless a compiled decoder
+# (see sstable.row_decoder) is passed as the row_body_decoder parsing keyword,
+# e.g. data_format.parse_stream(f, sstable_statistics=..., row_body_decoder=...).
+# The decoder returns None for rows it cannot handle, and those rows are parsed
+# by the grammar as usual.
+class RowBody(construct.Subconstruct):
+    def _parse(self, stream, context, path):
+        decoder = context._root._.get("row_body_decoder")
+        if decoder is not None:
+            row_body = decoder.parse_stream(stream, context._.row_flags, context.serialized_row_body_size)
+            if row_body is not None:
+                return row_body
+        return self.subcon._parsereport(stream, context, path)
 
 row_body_format = construct.Struct(
   "row_body_start" / construct.Tell,
@@ -218,7 +246,7 @@ unfiltered = construct.Struct(
                 ),
             ),
             "serialized_row_body_size" / sstable.varint.VarInt(), # https://github.com/apache/cassandra/blob/cassandra-3.0/src/java/org/apache/cassandra/db/rows/UnfilteredSerializer.java#L169
-            "row_body" / sstable.with_context.WithContext(row_body_format, overridden_row_flags=lambda ctx: ctx._.row_flags),
+            "row_body" / RowBody(sstable.with_context.WithContext(row_body_format, overridden_row_flags=lambda ctx: ctx._.row_flags)),
         ),
     ),
 )
@@ -243,3 +271,26 @@ partition = construct.Struct(
 )
 
 data_format = construct.Struct("partitions" / sstable.greedy_range.GreedyRangeWithExceptionHandling(partition))
+
+
+# data_format parses all partitions into one list. These yield them one at a
+# time instead, so only one partition is kept in memory.
+def iter_partitions(sstable_statistics, data_stream, row_body_decoder=None):
+    return sstable.greedy_range.iter_with_exception_handling(
+        lambda: partition.parse_stream(data_stream, sstable_statistics=sstable_statistics, row_body_decoder=row_body_decoder),
+        data_stream,
+    )
+
+def iter_rows(sstable_statistics, data_stream, row_body_decoder=None):
+    return rows_of(iter_partitions(sstable_statistics, data_stream, row_body_decoder=row_body_decoder))
+
+def rows_of(partitions):
+    r"""
+    Yields (partition, unfiltered) for every row, skipping the end of
+    partition markers.
+    """
+    for p in partitions:
+        for u in p.unfiltereds:
+            if u.row_flags & RowFlag.END_OF_PARTITION:
+                continue
+            yield p, u
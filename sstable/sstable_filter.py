@@ -0,0 +1,58 @@
+import sys
+import array
+
+import construct
+
+import sstable.utils
+import sstable.murmur3
+
+# Filter.db is the bloom filter of the partition keys of the SSTable. When
+# might_contain returns False, the key is definitely not in Index.db and
+# Data.db.
+# https://github.com/apache/cassandra/blob/cassandra-3.0/src/java/org/apache/cassandra/utils/BloomFilterSerializer.java
+# https://github.com/apache/cassandra/blob/cassandra-3.0/src/java/org/apache/cassandra/utils/obs/OffHeapBitSet.java#L122-L138
+
+filter_format = construct.Struct(
+    "hash_count" / construct.Int32ub,
+    "word_count" / construct.Int32ub,
+    # Each word is a big endian int64. Bit i of the filter is bit i % 64 of
+    # word i // 64.
+    "words" / construct.Bytes(construct.this.word_count * 8),
+)
+
+class BloomFilter:
+    def __init__(self, parsed):
+        self.hash_count = parsed.hash_count
+        self.words = array.array("Q")
+        self.words.frombytes(parsed.words)
+        if sys.byteorder != "big":
+            self.words.byteswap()
+        self.size = len(self.words) * 64
+
+    def indexes(self, partition_key):
+        r"""
+        Indexes of the bits that are set for partition_key.
+        https://github.com/apache/cassandra/blob/cassandra-3.0/src/java/org/apache/cassandra/utils/BloomFilter.java#L71-L104
+        """
+        inc, base = sstable.murmur3.hash3_x64_128(partition_key)
+        for _ in range(self.hash_count):
+            # Same as Java's abs(base % size)
+            yield abs(base) % self.size
+            base = sstable.murmur3.to_signed((base + inc) & sstable.murmur3.MASK_64)
+
+    def might_contain(self, partition_key):
+        if self.size == 0:
+            return True
+        words = self.words
+        for index in self.indexes(partition_key):
+            if not (words[index >> 6] >> (index & 63)) & 1:
+                return False
+        return True
+
+def read_filter(filter_stream):
+    return BloomFilter(filter_format.parse_stream(filter_stream))
+
+_test_filter = BloomFilter(filter_format.parse(bytes.fromhex("00000005 00000001 0602040020044010")))
+sstable.utils.assert_equal(True, _test_filter.might_contain(b"vpupkin"))
+sstable.utils.assert_equal(True, _test_filter.might_contain(b"jbellis"))
+sstable.utils.assert_equal(False, _test_filter.might_contain(b"nobody"))
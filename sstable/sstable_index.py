@@ -0,0 +1,132 @@
+import construct
+
+import sstable.utils
+import sstable.varint
+import sstable.greedy_range
+import sstable.sstable_data
+
+construct.setGlobalPrintFullStrings(sstable.utils.PRINT_FULL_STRING)
+
+# Index.db has one entry per partition, in the same order as Data.db, with the
+# position of the partition in Data.db.
+# https://github.com/apache/cassandra/blob/cassandra-3.0/src/java/org/apache/cassandra/db/RowIndexEntry.java
+# https://opensource.docs.scylladb.com/stable/architecture/sstable/sstable3/sstables-3-index.html
+
+class ClusteringPrefixKind:
+    # https://github.com/apache/cassandra/blob/cassandra-3.0/src/java/org/apache/cassandra/db/ClusteringPrefix.java#L59-L69
+    EXCL_END_BOUND = 0
+    INCL_START_BOUND = 1
+    EXCL_END_INCL_START_BOUNDARY = 2
+    STATIC_CLUSTERING = 3
+    CLUSTERING = 4
+    INCL_END_EXCL_START_BOUNDARY = 5
+    INCL_END_BOUND = 6
+    EXCL_START_BOUND = 7
+
+deletion_time = construct.Struct(
+    "local_deletion_time" / construct.Int32ub,
+    "marked_for_delete_at" / construct.Int64ub,
+)
+
+# https://github.com/apache/cassandra/blob/cassandra-3.0/src/java/org/apache/cassandra/db/ClusteringPrefix.java#L285-L300
+clustering_prefix = construct.Struct(
+    "kind" / construct.Int8ub,
+    # Only bounds store their size, clusterings always have all the columns:
+    "size" / construct.If(construct.this.kind != ClusteringPrefixKind.CLUSTERING, construct.Int16ub),
+    "clustering_block_header" / sstable.varint.VarInt(),
+    "clustering_cells" / construct.Array(
+        lambda ctx: ctx.size if ctx.size is not None else ctx._root._.sstable_statistics.serialization_header.clustering_key_count,
+        sstable.sstable_data.clustering_cell,
+    ),
+)
+
+# https://github.com/apache/cassandra/blob/cassandra-3.0/src/java/org/apache/cassandra/io/sstable/IndexHelper.java#L142-L158
+index_info = construct.Struct(
+    "first_name" / clustering_prefix,
+    "last_name" / clustering_prefix,
+    "offset" / sstable.varint.VarInt(),
+    "width" / sstable.varint.SignedVarInt(), # minus 64KiB
+    "end_open_marker_present" / construct.Flag,
+    "end_open_marker" / construct.If(construct.this.end_open_marker_present, deletion_time),
+)
+
+# The promoted index is only written for partitions larger than
+# column_index_size_in_kb, and lists the offsets of blocks of rows inside the
+# partition.
+promoted_index = construct.Struct(
+    "deletion_time" / deletion_time,
+    "columns_index_count" / sstable.varint.VarInt(),
+    "columns_index" / construct.Array(construct.this.columns_index_count, index_info),
+)
+
+index_entry = construct.Struct(
+    "key_len" / construct.Int16ub,
+    "key" / construct.Bytes(construct.this.key_len),
+    "position" / sstable.varint.VarInt(), # in Data.db
+    "promoted_index_size" / sstable.varint.VarInt(),
+    # FixedSized, so that we always continue from the next entry
+    "promoted_index" / construct.If(construct.this.promoted_index_size > 0, construct.FixedSized(construct.this.promoted_index_size, promoted_index)),
+)
+
+index_format = construct.Struct("entries" / sstable.greedy_range.GreedyRangeWithExceptionHandling(index_entry))
+
+_test_statistics = construct.Container(serialization_header=construct.Container(
+    clustering_key_count=1,
+    clustering_key_types=[construct.Container(name="org.apache.cassandra.db.marshal.Int32Type")],
+))
+_test_promoted_index = {
+    "deletion_time": {"local_deletion_time": 0x7fffffff, "marked_for_delete_at": 0x8000000000000000},
+    "columns_index_count": 1,
+    "columns_index": [{
+        "first_name": {"kind": ClusteringPrefixKind.CLUSTERING, "size": None, "clustering_block_header": 0, "clustering_cells": [{"key": {"cell_value": 1}}]},
+        "last_name": {"kind": ClusteringPrefixKind.CLUSTERING, "size": None, "clustering_block_header": 0, "clustering_cells": [{"key": {"cell_value": 9}}]},
+        "offset": 0,
+        "width": 200 - 65536,
+        "end_open_marker_present": False,
+        "end_open_marker": None,
+    }],
+}
+_test_promoted_index_bytes = promoted_index.build(_test_promoted_index, sstable_statistics=_test_statistics)
+_test_index_entry = {
+    "key_len": 4,
+    "key": b"\x00\x00\x00\x01",
+    "position": 300,
+    "promoted_index_size": len(_test_promoted_index_bytes),
+    "promoted_index": _test_promoted_index,
+}
+sstable.utils.assert_equal(_test_index_entry, index_entry.parse(index_entry.build(_test_index_entry, sstable_statistics=_test_statistics), sstable_statistics=_test_statistics))
+
+def read_index(sstable_statistics, index_stream):
+    r"""
+    Returns a dict from partition key (bytes, as stored in Data.db) to its
+    Index.db entry.
+    """
+    parsed = index_format.parse_stream(index_stream, sstable_statistics=sstable_statistics)
+    return {entry.key: entry for entry in parsed.entries}
+
+def lookup(sstable_statistics, index, data_stream, partition_key, row_body_decoder=None):
+    r"""
+    Parses only the partition with the given key, or returns None if there is
+    no such partition. index is the dict returned by read_index.
+    """
+    entry = index.get(bytes(partition_key))
+    if entry is None:
+        return None
+    data_stream.seek(entry.position)
+    return sstable.sstable_data.partition.parse_stream(data_stream, sstable_statistics=sstable_statistics, row_body_decoder=row_body_decoder)
+
+def read_entry(buf, pos):
+    r"""
+    Minimal reader for an index_entry at buf[pos], for scanning Index.db
+    without the grammar. Returns (key, position, next_pos); the promoted index
+    is skipped.
+    """
+    key_len = (buf[pos] << 8) | buf[pos+1]
+    pos += 2
+    key = buf[pos:pos+key_len]
+    pos += key_len
+    position, pos = sstable.varint.decode(buf, pos)
+    promoted_index_size, pos = sstable.varint.decode(buf, pos)
+    return key, position, pos + promoted_index_size
+
+sstable.utils.assert_equal((b"\x00\x00\x00\x01", 300, 4 + len(index_entry.build(_test_index_entry, sstable_statistics=_test_statistics))), read_entry(b"junk" + index_entry.build(_test_index_entry, sstable_statistics=_test_statistics), 4))
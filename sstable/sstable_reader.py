@@ -0,0 +1,122 @@
+import os
+import re
+
+import construct
+
+import sstable.sstable_index
+import sstable.sstable_filter
+import sstable.sstable_summary
+import sstable.sstable_statistics
+import sstable.row_decoder
+import sstable.compressed_data
+import sstable.token_range
+
+# A table directory has one SSTable per generation, e.g. me-1-big-Data.db,
+# me-2-big-Data.db, ... Newer generations have higher numbers.
+
+DATA_FILE_NAME = re.compile(r"^me-(\d+)-big-Data\.db$")
+
+def list_generations(table_dir):
+    generations = []
+    for file_name in os.listdir(table_dir):
+        match = DATA_FILE_NAME.match(file_name)
+        if match:
+            generations.append(int(match.group(1)))
+    return sorted(generations)
+
+def component_path(table_dir, generation, component):
+    return os.path.join(table_dir, f"me-{generation}-big-{component}.db")
+
+def read_metadata(table_dir, generation):
+    r"""
+    The parsed Statistics.db, Summary.db and Filter.db of an SSTable, the
+    last two None if they don't exist.
+    """
+    with open(component_path(table_dir, generation, "Statistics"), "rb") as f:
+        statistics = sstable.sstable_statistics.statistics_format.parse_stream(f)
+    summary = None
+    if os.path.exists(component_path(table_dir, generation, "Summary")):
+        with open(component_path(table_dir, generation, "Summary"), "rb") as f:
+            summary = sstable.sstable_summary.read_summary(f)
+    bloom_filter = None
+    if os.path.exists(component_path(table_dir, generation, "Filter")):
+        with open(component_path(table_dir, generation, "Filter"), "rb") as f:
+            bloom_filter = sstable.sstable_filter.read_filter(f)
+    return construct.Container(statistics=statistics, summary=summary, bloom_filter=bloom_filter)
+
+class SSTableReader:
+    r"""
+    The small components of one SSTable (Statistics.db, Summary.db and
+    Filter.db), read once and kept in memory between lookups. Index.db and
+    Data.db are only opened by lookup and scan_token_range. With
+    metadata_cache, a sstable.metadata_cache.MetadataCache, the small
+    components are only parsed if they changed since they were cached.
+    """
+    def __init__(self, table_dir, generation, compiled=True, metadata_cache=None):
+        self.table_dir = table_dir
+        self.generation = generation
+        if metadata_cache is not None:
+            metadata = metadata_cache.load(table_dir, generation)
+        else:
+            metadata = read_metadata(table_dir, generation)
+        self.statistics = metadata.statistics
+        self.summary = metadata.summary
+        self.bloom_filter = metadata.bloom_filter
+        self.row_body_decoder = None
+        if compiled:
+            self.row_body_decoder = sstable.row_decoder.compile_row_body_decoder(self.statistics.serialization_header)
+
+    def path(self, component):
+        return component_path(self.table_dir, self.generation, component)
+
+    def might_contain(self, partition_key):
+        return self.bloom_filter is None or self.bloom_filter.might_contain(partition_key)
+
+    def lookup(self, partition_key):
+        with open(self.path("Index"), "rb") as index_file, sstable.compressed_data.open_data_file(self.path("Data")) as data_file:
+            if self.summary is not None:
+                return sstable.sstable_summary.lookup(self.statistics, self.summary, index_file, data_file, partition_key, row_body_decoder=self.row_body_decoder)
+            index = sstable.sstable_index.read_index(self.statistics, index_file)
+            return sstable.sstable_index.lookup(self.statistics, index, data_file, partition_key, row_body_decoder=self.row_body_decoder)
+
+    def scan_token_range(self, start=None, end=None):
+        r"""
+        Yields the partitions with a token in (start, end], starting at the
+        first of them as found through Summary.db and Index.db.
+        """
+        with open(self.path("Index"), "rb") as index_file:
+            position = sstable.token_range.data_position(index_file, start, summary=self.summary)
+        if position is None:
+            return
+        with sstable.compressed_data.open_data_file(self.path("Data")) as data_file:
+            yield from sstable.token_range.scan_token_range(self.statistics, data_file, start, end, position=position, row_body_decoder=self.row_body_decoder)
+
+def open_sstables(table_dir, compiled=True, metadata_cache=None):
+    return [SSTableReader(table_dir, generation, compiled=compiled, metadata_cache=metadata_cache) for generation in list_generations(table_dir)]
+
+def lookup(sstables, partition_key):
+    r"""
+    Looks up partition_key in every SSTable, oldest generation first, skipping
+    the ones whose bloom filter rules it out. Returns the list of
+    (sstable, partition) that have the key, and the counts of what was done.
+    """
+    partition_key = bytes(partition_key)
+    stats = construct.Container(
+        sstables=len(sstables),
+        skipped_by_filter=0,
+        # The filter said maybe, but the key wasn't there
+        false_positives=0,
+        found=0,
+    )
+    found = []
+    for reader in sstables:
+        if not reader.might_contain(partition_key):
+            stats.skipped_by_filter += 1
+            continue
+        partition = reader.lookup(partition_key)
+        if partition is None:
+            stats.false_positives += 1
+            continue
+        stats.found += 1
+        found.append((reader, partition))
+    return found, stats
@@ -63,6 +63,27 @@ column = construct.Struct(
     "type" / typ,
 )
 
+# The timestamps of the serialization header (and so the timestamp_diff of
+# the rows in Data.db) are relative to this epoch, 2015-09-22, in microseconds.
+# The timestamps of statistics_metadata are not.
+# https://github.com/apache/cassandra/blob/cassandra-3.0/src/java/org/apache/cassandra/db/rows/EncodingStats.java#L48-L57
+TIMESTAMP_EPOCH = 1442880000000000
+
+def min_timestamp(serialization_header):
+    r"""
+    The smallest timestamp of the rows in Data.db, in microseconds. It is
+    written as an unsigned vint relative to TIMESTAMP_EPOCH, so an SSTable
+    with older timestamps (e.g. 0 in system tables) has a wrapped around
+    value.
+    """
+    diff = serialization_header.min_timestamp
+    if diff >= 1 << 63:
+        diff -= 1 << 64
+    return TIMESTAMP_EPOCH + diff
+
+sstable.utils.assert_equal(0, min_timestamp(construct.Container(min_timestamp=18445301193709551616)))
+sstable.utils.assert_equal(1703358898819865, min_timestamp(construct.Container(min_timestamp=260478898819865)))
+
 VALIDATION_METADATA = 0
 COMPACTION_METADATA = 1
 STATISTICS_METADATA = 2
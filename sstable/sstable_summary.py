@@ -0,0 +1,132 @@
+import sys
+import array
+import bisect
+
+import construct
+
+import sstable.utils
+import sstable.murmur3
+import sstable.sstable_data
+import sstable.sstable_index
+
+construct.setGlobalPrintFullStrings(sstable.utils.PRINT_FULL_STRING)
+
+# Summary.db samples every min_index_interval-th entry of Index.db, so that a
+# partition can be found by a binary search over the summary followed by a
+# scan of at most min_index_interval entries of Index.db.
+# https://github.com/apache/cassandra/blob/cassandra-3.0/src/java/org/apache/cassandra/io/sstable/IndexSummary.java#L289-L320
+#
+# The offsets and the entries are dumped from off-heap memory, so unlike the
+# rest of the file they are in the native byte order of the machine that wrote
+# them, which is little endian in practice.
+
+summary_format = construct.Struct(
+    "min_index_interval" / construct.Int32ub,
+    "offset_count" / construct.Int32ub,
+    "summary_entries_size" / construct.Int64ub, # offsets and entries
+    "sampling_level" / construct.Int32ub,
+    "size_at_full_sampling" / construct.Int32ub,
+    # Offsets of the entries, from the start of the offsets
+    "offsets" / construct.Bytes(construct.this.offset_count * 4),
+    # Each entry is a partition key followed by its int64 position in Index.db
+    "entries" / construct.Bytes(construct.this.summary_entries_size - construct.this.offset_count * 4),
+    "first_key" / construct.Prefixed(construct.Int32ub, construct.GreedyBytes),
+    "last_key" / construct.Prefixed(construct.Int32ub, construct.GreedyBytes),
+)
+
+class Summary:
+    r"""
+    Summary.db in a few flat arrays instead of one object per entry, so that
+    it can be kept in memory for the lifetime of the SSTable.
+    """
+    def __init__(self, parsed):
+        self.min_index_interval = parsed.min_index_interval
+        self.sampling_level = parsed.sampling_level
+        self.first_key = parsed.first_key
+        self.last_key = parsed.last_key
+        self.entries = parsed.entries
+
+        offsets = array.array("I")
+        offsets.frombytes(parsed.offsets)
+        if sys.byteorder != "little":
+            offsets.byteswap()
+        # Entry i is entries[bounds[i]:bounds[i+1]]
+        self.bounds = array.array("I", (offset - len(parsed.offsets) for offset in offsets))
+        self.bounds.append(len(self.entries))
+
+        self.positions = array.array("q")
+        for i in range(len(offsets)):
+            end = self.bounds[i+1]
+            self.positions.append(int.from_bytes(self.entries[end-8:end], "little", signed=True))
+        self.tokens = sstable.murmur3.tokens(self.key(i) for i in range(len(offsets)))
+
+        self.first = sstable.murmur3.decorated_key(self.first_key)
+        self.last = sstable.murmur3.decorated_key(self.last_key)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def key(self, i):
+        return self.entries[self.bounds[i]:self.bounds[i+1]-8]
+
+    def find(self, partition_key):
+        r"""
+        Returns the index of the last sampled entry that is not after
+        partition_key, or -1 if partition_key is before all of them.
+        """
+        token = sstable.murmur3.token(partition_key)
+        i = bisect.bisect_right(self.tokens, token) - 1
+        # Same token, sorted by key
+        while i >= 0 and self.tokens[i] == token and self.key(i) > partition_key:
+            i -= 1
+        return i
+
+    def index_interval(self, partition_key):
+        r"""
+        Returns (start, end) of the part of Index.db that may have
+        partition_key, with end None for the end of the file, or None if the
+        SSTable cannot have partition_key.
+        """
+        key = sstable.murmur3.decorated_key(partition_key)
+        if key < self.first or key > self.last:
+            return None
+        i = self.find(key[1])
+        if i < 0:
+            return None
+        end = self.positions[i+1] if i + 1 < len(self) else None
+        return self.positions[i], end
+
+def read_summary(summary_stream):
+    return Summary(summary_format.parse_stream(summary_stream))
+
+def lookup(sstable_statistics, summary, index_stream, data_stream, partition_key, row_body_decoder=None):
+    r"""
+    Same as sstable.sstable_index.lookup, but only reads the interval of
+    Index.db given by the summary.
+    """
+    partition_key = bytes(partition_key)
+    interval = summary.index_interval(partition_key)
+    if interval is None:
+        return None
+    start, end = interval
+    index_stream.seek(start)
+    buf = index_stream.read() if end is None else index_stream.read(end - start)
+
+    pos = 0
+    while pos < len(buf):
+        key, position, pos = sstable.sstable_index.read_entry(buf, pos)
+        if key == partition_key:
+            data_stream.seek(position)
+            return sstable.sstable_data.partition.parse_stream(data_stream, sstable_statistics=sstable_statistics, row_body_decoder=row_body_decoder)
+    return None
+
+_test_summary = Summary(summary_format.parse(bytes.fromhex(
+    "00000080 00000001 000000000000000d 00000080 00000001"
+    "04000000"
+    "41 0000000000000000"
+    "00000001 41"
+    "00000001 41"
+)))
+sstable.utils.assert_equal(1, len(_test_summary))
+sstable.utils.assert_equal(b"A", _test_summary.key(0))
+sstable.utils.assert_equal((0, None), _test_summary.index_interval(b"A"))
@@ -0,0 +1,62 @@
+import bisect
+
+import sstable.utils
+import sstable.murmur3
+import sstable.sstable_data
+import sstable.sstable_index
+
+# Partitions are sorted by token in Data.db and Index.db, so the partitions of
+# a token range are next to each other. Like in Cassandra, a token range
+# (start, end] doesn't include start, and None means the start or the end of
+# the ring.
+# https://github.com/apache/cassandra/blob/cassandra-3.0/src/java/org/apache/cassandra/dht/Range.java
+
+def in_range(token, start, end):
+    return (start is None or token > start) and (end is None or token <= end)
+
+sstable.utils.assert_equal(False, in_range(1, 1, 2))
+sstable.utils.assert_equal(True, in_range(2, 1, 2))
+sstable.utils.assert_equal(True, in_range(sstable.murmur3.MIN_TOKEN + 1, None, None))
+
+def data_position(index_stream, start, summary=None):
+    r"""
+    Position in Data.db of the first partition with a token after start, or
+    None if there is none. With the summary, Index.db is only read from the
+    last sampled entry that is not after start.
+    """
+    if start is None:
+        return 0
+    interval_starts = [0]
+    if summary is not None and len(summary):
+        i = bisect.bisect_right(summary.tokens, start) - 1
+        interval_starts = list(summary.positions[max(i, 0):])
+
+    # One interval of Index.db at a time, since the partition is usually in
+    # the first one
+    for i, interval_start in enumerate(interval_starts):
+        index_stream.seek(interval_start)
+        if i + 1 < len(interval_starts):
+            buf = index_stream.read(interval_starts[i+1] - interval_start)
+        else:
+            buf = index_stream.read()
+        pos = 0
+        while pos < len(buf):
+            key, position, pos = sstable.sstable_index.read_entry(buf, pos)
+            if sstable.murmur3.token(key) > start:
+                return position
+    return None
+
+def scan_token_range(sstable_statistics, data_stream, start=None, end=None, position=None, row_body_decoder=None):
+    r"""
+    Yields the partitions of Data.db whose token is in (start, end]. Parsing
+    stops at the first partition after end. With position (e.g. from
+    data_position), parsing starts there instead of at the start of Data.db,
+    it must be the position of a partition that is not after the range.
+    """
+    data_stream.seek(position or 0)
+    for partition in sstable.sstable_data.iter_partitions(sstable_statistics, data_stream, row_body_decoder=row_body_decoder):
+        token = sstable.murmur3.token(partition.partition_header.key)
+        if end is not None and token > end:
+            break
+        if start is None or token > start:
+            yield partition
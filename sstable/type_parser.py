@@ -1,3 +1,5 @@
+import functools
+
 import construct
 import sstable.varint
 import sstable.utils
@@ -207,6 +209,18 @@ parser = Lark(type_grammar, parser='lalr', transformer=TypeTransformer())
 # Testing with an example string
 sstable.utils.assert_equal(int_cell_value, parser.parse('org.apache.cassandra.db.marshal.Int32Type'))
 
+# Every cell of a table has one of the few type strings listed in the
+# serialization header, so we parse each of them only once and share the
+# resulting construct struct. Use parse_type.cache_info() to see hits/misses.
+TYPE_CACHE_SIZE = 1024
+
+@functools.lru_cache(maxsize=TYPE_CACHE_SIZE)
+def parse_type(type_name):
+    return parser.parse(type_name)
+
+sstable.utils.assert_equal(int_cell_value, parse_type('org.apache.cassandra.db.marshal.Int32Type'))
+assert parse_type('org.apache.cassandra.db.marshal.SetType(org.apache.cassandra.db.marshal.Int32Type)') is parse_type('org.apache.cassandra.db.marshal.SetType(org.apache.cassandra.db.marshal.Int32Type)')
+
 tests = [
     {
         "type": 'org.apache.cassandra.db.marshal.ListType(org.apache.cassandra.db.marshal.Int32Type)',
@@ -1,88 +1,110 @@
-import textwrap
 import construct
-import io
 import sstable.utils
 
+# Unsigned vint, as in https://github.com/apache/cassandra/blob/cassandra-3.0/src/java/org/apache/cassandra/utils/vint/VIntCoding.java
+#
+# The number of leading 1s in the first byte is the number of extra bytes that
+# follow it. The remaining bits of the first byte are the most significant
+# bits of the value, e.g.:
+#
+#     0xxxxxxx                            (7 bits)
+#     10xxxxxx xxxxxxxx                   (14 bits)
+#     110xxxxx xxxxxxxx xxxxxxxx          (21 bits)
+#     ...
+#     11111111 xxxxxxxx ... xxxxxxxx      (64 bits)
+
+# Number of extra bytes, indexed by the first byte:
+EXTRA_BYTES = [8 - (~first_byte & 0xff).bit_length() for first_byte in range(256)]
+# Value bits of the first byte, indexed by the number of extra bytes:
+FIRST_BYTE_MASK = [0xff >> extra_bytes for extra_bytes in range(9)]
+# Length prefix of the first byte, indexed by the number of extra bytes:
+FIRST_BYTE_PREFIX = [(0xff << (8 - extra_bytes)) & 0xff for extra_bytes in range(9)]
+# Number of extra bytes needed to encode a value, indexed by its bit_length():
+EXTRA_BYTES_FOR_BIT_LENGTH = [min(max(bit_length - 1, 0) // 7, 8) for bit_length in range(65)]
+
+sstable.utils.assert_equal(0, EXTRA_BYTES[0b01111111])
+sstable.utils.assert_equal(2, EXTRA_BYTES[0b11011111])
+sstable.utils.assert_equal(8, EXTRA_BYTES[0b11111111])
+sstable.utils.assert_equal(0b11000000, FIRST_BYTE_PREFIX[2])
+sstable.utils.assert_equal(1, EXTRA_BYTES_FOR_BIT_LENGTH[14])
+sstable.utils.assert_equal(2, EXTRA_BYTES_FOR_BIT_LENGTH[15])
+sstable.utils.assert_equal(8, EXTRA_BYTES_FOR_BIT_LENGTH[57])
+
+def decode(buf, offset=0):
+    r"""
+    Decodes a vint from buf (bytes, bytearray, memoryview, mmap) at offset.
+    Returns the value and the offset right after it.
+    """
+    first_byte = buf[offset]
+    extra_bytes = EXTRA_BYTES[first_byte]
+    if extra_bytes == 0:
+        return first_byte, offset + 1
+    end = offset + 1 + extra_bytes
+    if end > len(buf):
+        raise construct.StreamError(f"vint at offset {offset} needs {extra_bytes + 1} bytes, but only {len(buf) - offset} are left")
+    value = (first_byte & FIRST_BYTE_MASK[extra_bytes]) << (8 * extra_bytes)
+    return value | int.from_bytes(buf[offset+1:end], "big"), end
+
+def decode_many(buf, offset, n):
+    r"""
+    Decodes n consecutive vints from buf at offset. Returns the list of values
+    and the offset right after the last one.
+    """
+    values = []
+    append = values.append
+    length = len(buf)
+    for _ in range(n):
+        first_byte = buf[offset]
+        extra_bytes = EXTRA_BYTES[first_byte]
+        if extra_bytes == 0:
+            append(first_byte)
+            offset += 1
+            continue
+        end = offset + 1 + extra_bytes
+        if end > length:
+            raise construct.StreamError(f"vint at offset {offset} needs {extra_bytes + 1} bytes, but only {length - offset} are left")
+        append(((first_byte & FIRST_BYTE_MASK[extra_bytes]) << (8 * extra_bytes)) | int.from_bytes(buf[offset+1:end], "big"))
+        offset = end
+    return values, offset
+
+def encode(value):
+    if value < 0x80:
+        return bytes([value])
+    bit_length = value.bit_length()
+    if bit_length > 64:
+        raise ValueError(f"Only 8 byte integers are supported, {value} is {-(-bit_length // 8)} bytes")
+    extra_bytes = EXTRA_BYTES_FOR_BIT_LENGTH[bit_length]
+    if extra_bytes == 8:
+        # No separating 0 is needed
+        return b"\xff" + value.to_bytes(8, byteorder="big")
+    return ((FIRST_BYTE_PREFIX[extra_bytes] << (8 * extra_bytes)) | value).to_bytes(extra_bytes + 1, byteorder="big")
+
+sstable.utils.assert_equal((32773, 4), decode(bytes([0, 0b11000000, 0b10000000, 0b00000101]), 1))
+sstable.utils.assert_equal(([1, 128, 127], 4), decode_many(memoryview(bytes([1, 0b10000000, 0b10000000, 127])), 0, 3))
+sstable.utils.assert_equal(bytes([0b11000000, 0b10100000, 0b00000000]), encode(0b10100000_00000000))
+
 # TODO: Just found this https://sourcegraph.com/github.com/datastax/python-driver@7e0923a86e6b8d55f5a88698f4c1e6ded65a348b/-/blob/cassandra/marshal.py?L47-52
 def parse(stream):
     first_byte = stream.read(1)[0]
-    if not first_byte & 0b10000000:
+    extra_bytes = EXTRA_BYTES[first_byte]
+    if extra_bytes == 0:
         return first_byte
+    rest = stream.read(extra_bytes)
+    return ((first_byte & FIRST_BYTE_MASK[extra_bytes]) << (8 * len(rest))) | int.from_bytes(rest, "big")
 
-    # count the number of 1s in first_byte:
-    ones_count = 0
-    zeros_count = 0
-    zero_padding = 0
-    first_value_bits = []
-
-    for i in range(8):
-        index = 7 - i
-        masked_value = first_byte & (1<<index)
-        if masked_value > 0:
-            ones_count += 1
-        else:
-            break
-
-    for i in range(ones_count, 8):
-        index = 7 - i
-        masked_value = first_byte & (1<<index)
-        if masked_value == 0:
-            zeros_count += 1
-        else:
-            break
-
-    for i in range(ones_count+zeros_count, 8):
-        index = 7 - i
-        masked_value = first_byte & (1<<index)
-        if masked_value == 0:
-            first_value_bits.append(0)
-        else:
-            first_value_bits.append(1)
-
-    first_value_byte = [0] * (8-len(first_value_bits)) + first_value_bits
-    first_value_byte = int(''.join(map(str, first_value_byte)), 2)
-
-    byts = bytes([first_value_byte]) + stream.read(ones_count)
-    # print(ones_count, first_value_bits, first_value_byte, list(map(lambda b: bin(b), byts)))
-    return int.from_bytes(byts, 'big')
-
-# TODO: just found this: https://sourcegraph.com/github.com/datastax/python-driver@7e0923a86e6b8d55f5a88698f4c1e6ded65a348b/-/blob/cassandra/marshal.py?L59-74
 def build(value):
-    # values that are a single byte and don't start with a 1 don't need any
-    # encoding, and decoders also know that because it starts with a 0.
-    # value = value + 123
-    if value < 0b10000000:
-        return bytes([value])
+    return encode(value)
 
-    # get the number of bits needed to represent this value:
-    bit_length = value.bit_length()
-    byte_length = -(-bit_length // 8)
-    first_byte = (value >> (8*(byte_length-1))).to_bytes(1, byteorder="big")[0]
+# Signed vints are zigzag encoded first, so that small negative numbers are
+# small unsigned numbers too: 0, -1, 1, -2, 2, ... become 0, 1, 2, 3, 4, ...
+def zigzag_decode(value):
+    return (value >> 1) ^ -(value & 1)
 
-    if byte_length > 8:
-        raise f"Only 8 byte integers are supported, {value} is {byte_length} bytes"
+def zigzag_encode(value):
+    return (value << 1) ^ (value >> 63)
 
-    flag_bits = 0
-    for i in range(byte_length):
-        flag_bits |= 1<<(7-i)
-
-    if byte_length == 8:
-        # No separating 0 is needed
-        return bytes([flag_bits] + list(value.to_bytes(byte_length, byteorder="big")))
-
-    if flag_bits & first_byte == 0:
-        # flag_bits_mask and first_byte do not overlap, so we should merge flag_bits
-        # and first_byte, but we need to need to remove one of the 1s from
-        # flag_bits, because the number of bytes that follow the flag_bits is
-        # one less than the number of bytes needed to represent the number.
-        # Removing the right-most-1 is done with (byte&(byte-1)):
-        flag_bits = flag_bits & (flag_bits-1)
-        merged_first_byte = flag_bits | first_byte
-        return bytes([merged_first_byte] + list(value.to_bytes(byte_length, byteorder="big"))[1:])
-    else:
-        # flag_bits_mask and first_byte overlap, so we need to start the value bits
-        # from the next byte:
-        return bytes([flag_bits] + list(value.to_bytes(byte_length, byteorder="big")))
+sstable.utils.assert_equal([0, -1, 1, -2, 2], [zigzag_decode(value) for value in range(5)])
+sstable.utils.assert_equal([0, 1, 2, 3, 4], [zigzag_encode(value) for value in [0, -1, 1, -2, 2]])
 
 class VarInt(construct.Construct):
     def _parse(self, stream, context, path):
@@ -92,10 +114,20 @@ class VarInt(construct.Construct):
     def _build(self, obj, stream, context, path):
         # return same value (obj) or a modified value
         # that will replace the context dictionary entry
-        stream.write(build(obj))
+        stream.write(encode(obj))
         return obj
 
     # def _sizeof(self, context, path):
     #     # return computed size (when fixed size or depends on context)
     #     # or raise SizeofError (when variable size or unknown)
     #     print(f"_sizeof {context} {path}")
+
+class SignedVarInt(construct.Construct):
+    def _parse(self, stream, context, path):
+        return zigzag_decode(parse(stream))
+
+    def _build(self, obj, stream, context, path):
+        stream.write(encode(zigzag_encode(obj)))
+        return obj
+
+sstable.utils.assert_equal(-65536, SignedVarInt().parse(SignedVarInt().build(-65536)))
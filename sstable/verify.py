@@ -0,0 +1,189 @@
+import os
+import sys
+import zlib
+import array
+import argparse
+import concurrent.futures
+
+import construct
+
+import sstable.utils
+import sstable.sstable_reader
+import sstable.compressed_data
+
+# Checks Data.db against its checksums:
+#
+# - Digest.crc32 has the CRC32 of the whole Data.db file, in decimal.
+# - Uncompressed SSTables have CRC.db, with the CRC32 of every chunk of
+#   chunk_size bytes of Data.db.
+#   https://github.com/apache/cassandra/blob/cassandra-3.0/src/java/org/apache/cassandra/io/util/DataIntegrityMetadata.java
+# - Compressed SSTables have no CRC.db, instead every compressed chunk in
+#   Data.db is followed by the CRC32 of the chunk.
+#
+# Data.db is read in blocks of whole chunks, and the chunks of each block are
+# checked on a thread pool (zlib.crc32 releases the GIL) while the next
+# blocks are being read and added to the digest.
+
+DEFAULT_BLOCK_SIZE = 8 * 1024 * 1024
+
+crc_header = construct.Struct(
+    "chunk_size" / construct.Int32ub,
+)
+
+def read_crc(crc_stream):
+    r"""
+    Returns the chunk size and the array of the CRC32s of the chunks.
+    """
+    chunk_size = crc_header.parse_stream(crc_stream).chunk_size
+    crcs = array.array("I")
+    crcs.frombytes(crc_stream.read())
+    if sys.byteorder != "big":
+        crcs.byteswap()
+    return chunk_size, crcs
+
+def read_digest(digest_stream):
+    return int(digest_stream.read().strip())
+
+# Chunks are (index, offset, length, crc) with crc None when it follows the
+# chunk in Data.db.
+def uncompressed_chunks(chunk_size, crcs, data_size):
+    for index, crc in enumerate(crcs):
+        offset = index * chunk_size
+        yield index, offset, min(chunk_size, data_size - offset), crc
+
+def compressed_chunks(compression_info, data_size):
+    offsets = list(compression_info.chunk_offsets) + [data_size]
+    for index in range(compression_info.chunk_count):
+        # Without the CRC32 at the end
+        yield index, offsets[index], offsets[index + 1] - offsets[index] - 4, None
+
+def chunk_end(chunk):
+    _, offset, length, crc = chunk
+    return offset + length + (4 if crc is None else 0)
+
+def group_chunks(chunks, block_size):
+    r"""
+    Groups consecutive chunks into blocks of at least block_size bytes.
+    """
+    block = []
+    for chunk in chunks:
+        block.append(chunk)
+        if chunk_end(chunk) - block[0][1] >= block_size:
+            yield block
+            block = []
+    if block:
+        yield block
+
+def check_block(buf, block_start, chunks):
+    r"""
+    Returns the corrupt chunks of a block, as Containers.
+    """
+    corrupt = []
+    for index, offset, length, crc in chunks:
+        start = offset - block_start
+        if crc is None:
+            crc = int.from_bytes(buf[start+length:start+length+4], "big")
+        actual = zlib.crc32(buf[start:start+length])
+        if actual != crc or start + length > len(buf):
+            corrupt.append(construct.Container(index=index, offset=offset, length=length, expected=crc, actual=actual))
+    return corrupt
+
+sstable.utils.assert_equal([], check_block(b"abc", 2, [(0, 2, 3, zlib.crc32(b"abc"))]))
+sstable.utils.assert_equal([1], [c.index for c in check_block(b"abcd" + zlib.crc32(b"abcd").to_bytes(4, "big") + b"ab", 0, [(0, 0, 4, None), (1, 8, 2, 0)])])
+
+def verify_data(data_stream, chunks, expected_digest=None, threads=None, block_size=DEFAULT_BLOCK_SIZE):
+    r"""
+    Checks the chunks of Data.db and, with expected_digest, the CRC32 of the
+    whole file. Returns a Container with the corrupt chunks sorted by offset
+    and first_corrupt_offset (None when all chunks are fine).
+    """
+    corrupt = []
+    chunks_checked = 0
+    digest = 0
+    bytes_read = 0
+    threads = threads or os.cpu_count() or 1
+    with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
+        # Bounded, so that only a few blocks are in memory at once
+        max_pending = threads * 2
+        pending = []
+        for block_chunks in group_chunks(chunks, block_size):
+            block_start = block_chunks[0][1]
+            block_end = chunk_end(block_chunks[-1])
+            data_stream.seek(block_start)
+            buf = data_stream.read(block_end - block_start)
+            if block_start == bytes_read:
+                digest = zlib.crc32(buf, digest)
+                bytes_read += len(buf)
+            chunks_checked += len(block_chunks)
+            pending.append(executor.submit(check_block, buf, block_start, block_chunks))
+            if len(pending) >= max_pending:
+                corrupt += pending.pop(0).result()
+        for future in pending:
+            corrupt += future.result()
+
+    # Whatever is after the last chunk is part of the digest too
+    data_stream.seek(bytes_read)
+    while True:
+        buf = data_stream.read(block_size)
+        if not buf:
+            break
+        digest = zlib.crc32(buf, digest)
+
+    corrupt.sort(key=lambda chunk: chunk.offset)
+    return construct.Container(
+        chunks_checked=chunks_checked,
+        corrupt_chunks=corrupt,
+        first_corrupt_offset=corrupt[0].offset if corrupt else None,
+        digest=digest,
+        expected_digest=expected_digest,
+        digest_ok=expected_digest is None or digest == expected_digest,
+        ok=not corrupt and (expected_digest is None or digest == expected_digest),
+    )
+
+def verify(table_dir, generation=1, threads=None, block_size=DEFAULT_BLOCK_SIZE):
+    r"""
+    Verifies Data.db of one SSTable with CRC.db (or the checksums of the
+    compressed chunks) and Digest.crc32, whichever exist.
+    """
+    path = lambda component: sstable.sstable_reader.component_path(table_dir, generation, component)
+    data_path = path("Data")
+    data_size = os.path.getsize(data_path)
+
+    chunks = []
+    if os.path.exists(path("CompressionInfo")):
+        with open(path("CompressionInfo"), "rb") as f:
+            compression_info = sstable.compressed_data.compression_info_format.parse_stream(f)
+        chunks = compressed_chunks(compression_info, data_size)
+    elif os.path.exists(path("CRC")):
+        with open(path("CRC"), "rb") as f:
+            chunk_size, crcs = read_crc(f)
+        chunks = uncompressed_chunks(chunk_size, crcs, data_size)
+
+    expected_digest = None
+    digest_path = os.path.join(table_dir, f"me-{generation}-big-Digest.crc32")
+    if os.path.exists(digest_path):
+        with open(digest_path, "rb") as f:
+            expected_digest = read_digest(f)
+
+    with open(data_path, "rb") as f:
+        result = verify_data(f, chunks, expected_digest=expected_digest, threads=threads, block_size=block_size)
+    result.path = data_path
+    return result
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('dir', type=str)
+    parser.add_argument('--threads', type=int, default=None)
+    parser.add_argument('--block-size', type=int, default=DEFAULT_BLOCK_SIZE, help="bytes read at once, rounded up to whole chunks")
+    args = parser.parse_args()
+
+    all_ok = True
+    for generation in sstable.sstable_reader.list_generations(args.dir):
+        result = verify(args.dir, generation, threads=args.threads, block_size=args.block_size)
+        all_ok = all_ok and result.ok
+        print(f"{result.path}: {'OK' if result.ok else 'CORRUPT'}, {result.chunks_checked} chunks checked")
+        for chunk in result.corrupt_chunks:
+            print(f"  chunk {chunk.index} at offset {chunk.offset} ({chunk.length} bytes): crc {chunk.actual}, expected {chunk.expected}")
+        if not result.digest_ok:
+            print(f"  digest {result.digest}, expected {result.expected_digest}")
+    sys.exit(0 if all_ok else 1)
@@ -0,0 +1,76 @@
+import io
+import os
+import glob
+
+import pytest
+
+import sstable.columnar
+import sstable.row_decoder
+import sstable.sstable_data
+import sstable.sstable_statistics
+
+numpy = pytest.importorskip("numpy")
+
+def read_table(name):
+    table_dir = glob.glob(f"test_data/cassandra3_data_want/sina_test/{name}-*/")[0]
+    with open(os.path.join(table_dir, "me-1-big-Statistics.db"), "rb") as f:
+        statistics = sstable.sstable_statistics.statistics_format.parse(f.read())
+    with open(os.path.join(table_dir, "me-1-big-Data.db"), "rb") as f:
+        return statistics, f.read()
+
+def rows_of_batches(batches):
+    rows = []
+    for batch in batches:
+        keys = sstable.columnar.python_values(batch.partition_key)
+        clustering = [sstable.columnar.python_values(column) for column in batch.clustering]
+        columns = [sstable.columnar.python_values(column) for column in batch.columns.values()]
+        for i in range(batch.rows):
+            rows.append((keys[i], [values[i] for values in clustering], [values[i] for values in columns]))
+    return rows
+
+def rows_of_grammar(statistics, data, projection):
+    rows = []
+    for partition, unfiltered in sstable.sstable_data.iter_rows(statistics, io.BytesIO(data)):
+        clustering = [cell.key.cell_value for cell in unfiltered.row.clustering_block.clustering_cells] if unfiltered.row.clustering_block else []
+        cells = sstable.row_decoder.project_cells(unfiltered.row.row_body, projection)
+        values = [cell.cell.cell_value if cell is not None and not cell.cell_flags & sstable.sstable_data.CellFlag.HAS_EMPTY_VALUE else None for cell in cells]
+        rows.append((bytes(partition.partition_header.key), clustering, values))
+    return rows
+
+def test_iter_batches():
+    for name in ["has_all_types", "sina_table", "twenty_rows_composite_table", "undefined_values_table", "utf8_with_special_chars"]:
+        statistics, data = read_table(name)
+        projection = range(len(statistics.serialization_header.regular_columns))
+        want = rows_of_grammar(statistics, data, projection)
+        for batch_size in [1, 3, 1000]:
+            batches = list(sstable.columnar.iter_batches(statistics, io.BytesIO(data), batch_size=batch_size))
+            assert [min(batch_size, len(want) - i) for i in range(0, len(want), batch_size)] == [batch.rows for batch in batches]
+            assert want == rows_of_batches(batches), (name, batch_size)
+
+def test_column_types():
+    statistics, data = read_table("has_all_types")
+    batch, = sstable.columnar.iter_batches(statistics, io.BytesIO(data))
+    assert {
+        "bigintcol": numpy.int64,
+        "booleancol": numpy.bool_,
+        "doublecol": numpy.float64,
+        "floatcol": numpy.float32,
+        "intcol": numpy.int32,
+        "timestampcol": numpy.dtype("datetime64[ms]"),
+        "decimalcol": object,
+    } == {name: batch.columns[name].array.dtype for name in ["bigintcol", "booleancol", "doublecol", "floatcol", "intcol", "timestampcol", "decimalcol"]}
+    text = batch.columns.textcol
+    assert batch.rows + 1 == len(text.offsets)
+    assert len(text.data) == text.offsets[-1]
+    # Nulls are masked, and zero in the arrays
+    intcol = batch.columns.intcol
+    assert (intcol.array[intcol.mask] == 0).all()
+
+def test_columns():
+    statistics, data = read_table("sina_table")
+    names = [column.name for column in statistics.serialization_header.regular_columns]
+    columns = ["gender", "age"]
+    want = rows_of_grammar(statistics, data, [names.index(name) for name in columns])
+    batches = list(sstable.columnar.iter_batches(statistics, io.BytesIO(data), columns=columns))
+    assert columns == list(batches[0].columns.keys())
+    assert want == rows_of_batches(batches)
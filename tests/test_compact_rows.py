@@ -0,0 +1,50 @@
+import io
+import os
+import glob
+
+import sstable.mmap_reader
+import sstable.compact_rows
+import sstable.sstable_data
+import sstable.sstable_statistics
+
+def read_table(table_dir):
+    with open(os.path.join(table_dir, "me-1-big-Statistics.db"), "rb") as f:
+        statistics = sstable.sstable_statistics.statistics_format.parse(f.read())
+    with open(os.path.join(table_dir, "me-1-big-Data.db"), "rb") as f:
+        return statistics, f.read()
+
+def test_iter_partitions():
+    for table_dir in sorted(glob.glob("test_data/cassandra3_data_want/sina_test/*/")):
+        statistics, data = read_table(table_dir)
+        want = list(sstable.sstable_data.iter_partitions(statistics, io.BytesIO(data)))
+        got = list(sstable.compact_rows.iter_partitions(statistics, io.BytesIO(data)))
+        assert [sstable.compact_rows.from_partition(p) for p in want] == got, table_dir
+        assert len(list(sstable.sstable_data.rows_of(want))) == len(list(sstable.compact_rows.rows_of(got))), table_dir
+
+def test_rows():
+    table_dir = glob.glob("test_data/cassandra3_data_want/sina_test/twenty_rows_composite_table-*/")[0]
+    statistics, data = read_table(table_dir)
+    with open(os.path.join(table_dir, "me-1-big-Data.db"), "rb") as f:
+        # Keys and values are copied out of the memory map
+        partitions = list(sstable.compact_rows.iter_partitions(statistics, f))
+    containers = list(sstable.mmap_reader.iter_rows(statistics, io.BytesIO(data)))
+    rows = list(sstable.compact_rows.rows_of(partitions))
+    assert len(containers) == len(rows)
+    for (partition, unfiltered), (p, row) in zip(containers, rows):
+        assert bytes(partition.partition_header.key) == p.key
+        assert tuple(cell.key.cell_value for cell in unfiltered.row.clustering_block.clustering_cells) == row.clustering
+        assert [(cell.cell_flags, cell.cell.cell_value) for cell in unfiltered.row.row_body.cells] == [(cell.flags, cell.value) for cell in row.cells]
+        assert row.cells[0] == row.cell(0)
+        assert isinstance(p.key, bytes)
+
+def test_missing_columns():
+    for name in ["sina_table", "undefined_values_table"]:
+        statistics, data = read_table(glob.glob(f"test_data/cassandra3_data_want/sina_test/{name}-*/")[0])
+        columns_count = len(statistics.serialization_header.regular_columns)
+        for _, unfiltered in sstable.sstable_data.iter_rows(statistics, io.BytesIO(data)):
+            row = sstable.compact_rows.from_unfiltered(unfiltered)
+            present = unfiltered.row.row_body.missing_columns
+            if present is None:
+                present = range(columns_count)
+            for column_index in range(columns_count):
+                assert (row.cell(column_index) is None) == (column_index not in present)
@@ -0,0 +1,155 @@
+import os
+import glob
+import tempfile
+
+import pytest
+
+import construct
+
+import sstable.merge
+import sstable.compaction
+import sstable.sstable_data
+import sstable.sstable_reader
+import sstable.sstable_statistics
+
+from tests.test_query import make_table_dir
+from tests.test_merge import values_of, cell, row, partition
+
+def table_dir(name):
+    return glob.glob(f"test_data/cassandra3_data_want/sina_test/{name}-*/")[0]
+
+def read_values(directory):
+    merged_statistics, partitions = sstable.merge.read_table(directory)
+    return values_of(sstable.sstable_data.rows_of(partitions), len(merged_statistics.serialization_header.regular_columns))
+
+def test_compact_same_sstable():
+    for name in ["twenty_rows_table", "sina_table", "twenty_rows_composite_table"]:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            directory = make_table_dir(tmp_dir, [name, name])
+            stats = sstable.compaction.compact(directory, directory)
+            assert 3 == stats.generation
+            # The same bytes as the SSTable that was written twice
+            for component in ["Data", "Index"]:
+                with open(os.path.join(table_dir(name), f"me-1-big-{component}.db"), "rb") as f:
+                    want = f.read()
+                with open(os.path.join(directory, f"me-3-big-{component}.db"), "rb") as f:
+                    assert want == f.read(), (name, component)
+            assert 2 * stats.bytes_out == stats.bytes_in
+
+            reader = sstable.sstable_reader.SSTableReader(directory, 3)
+            key = next(sstable.merge.read_table(directory)[1]).partition_header.key
+            assert key == reader.lookup(key).partition_header.key
+
+def test_compact_generations():
+    directory = glob.glob("test_data/cassandra3_data_want/system_schema/columns-*/")[0]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        stats = sstable.compaction.compact(directory, tmp_dir)
+        assert (2, 1, 341) == (stats.sstables, stats.generation, stats.rows)
+        assert read_values(directory) == read_values(tmp_dir)
+
+def test_purge_partition():
+    # Timestamps in microseconds, gc_before in seconds
+    old_tombstone = partition(b"k", [
+        row("x", 0, [cell(None), cell("b")]),
+    ], marked_for_delete_at=10)
+    old_tombstone.partition_header.deletion_time.local_deletion_time = 100
+    merger = sstable.merge.Merger([construct.Container(serialization_header=construct.Container(
+        min_timestamp=(1000000 - sstable.sstable_statistics.TIMESTAMP_EPOCH) % (1 << 64),
+        clustering_key_types=[construct.Container(name="org.apache.cassandra.db.marshal.UTF8Type")],
+        regular_columns=[construct.Container(name=name, type=construct.Container(name="org.apache.cassandra.db.marshal.UTF8Type")) for name in ["a", "b"]],
+    ))])
+    merged = next(merger.merge([[old_tombstone]]))
+
+    def purge(gc_before, max_purgeable_timestamp):
+        stats = construct.Container(purged_tombstones=0)
+        purged = sstable.compaction.purge_partition(merged, gc_before, max_purgeable_timestamp, stats)
+        return purged.partition_header.deletion_time.marked_for_delete_at, [c is None for c in purged.unfiltereds[0].row.row_body.cells], stats.purged_tombstones
+
+    # Not yet gc_grace_seconds after the deletions
+    assert (10, [False, False], 0) == purge(1, 1 << 63)
+    assert (sstable.merge.LIVE, [True, False], 2) == purge(1000, 1 << 63)
+    # An SSTable that isn't compacted has data older than the cell tombstone
+    assert (sstable.merge.LIVE, [False, False], 1) == purge(1000, 1000000)
+
+def test_expired_sstable_shadowing_compacted_data():
+    # Generation 2 only has a tombstone, long past gc_grace_seconds, of a
+    # partition of generation 1. It is only fully expired if nothing older
+    # is compacted with it, or the partition would come back.
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        directory = make_table_dir(tmp_dir, ["twenty_rows_table"])
+        reader = sstable.sstable_reader.SSTableReader(directory, 1)
+        key = next(sstable.merge.read_table(directory)[1]).partition_header.key
+        marked_for_delete_at = reader.statistics.statistics_metadata.max_timestamp + 1
+
+        writer = sstable.compaction.SSTableWriter(directory, 2, reader.statistics.serialization_header)
+        tombstone = partition(key, [], marked_for_delete_at=marked_for_delete_at)
+        tombstone.partition_header.deletion_time.local_deletion_time = 1000
+        writer.write_partition(tombstone)
+        writer.close()
+        statistics = reader.statistics
+        statistics.statistics_metadata.min_timestamp = statistics.statistics_metadata.max_timestamp = marked_for_delete_at
+        statistics.statistics_metadata.min_local_deletion_time = statistics.statistics_metadata.max_local_deletion_time = 1000
+        with open(os.path.join(directory, "me-2-big-Statistics.db"), "wb") as f:
+            f.write(sstable.sstable_statistics.statistics_format.build(statistics))
+
+        output_dir = os.path.join(tmp_dir, "output")
+        stats = sstable.compaction.compact(directory, output_dir)
+        assert (0, 19) == (stats.fully_expired, stats.partitions)
+        assert key not in [p.partition_header.key for p in sstable.merge.read_table(output_dir)[1]]
+
+def test_fully_expired():
+    def statistics(min_timestamp, max_timestamp, max_local_deletion_time):
+        return construct.Container(statistics_metadata=construct.Container(min_timestamp=min_timestamp, max_timestamp=max_timestamp, max_local_deletion_time=max_local_deletion_time))
+    live = statistics(100, 300, sstable.compaction.NO_DELETION_TIME)
+    old_tombstones = statistics(50, 80, 1000)
+    new_tombstones = statistics(200, 250, 1000)
+    assert [1] == sstable.compaction.fully_expired([live, old_tombstones], 2000, 1 << 63)
+    assert [] == sstable.compaction.fully_expired([live, new_tombstones], 2000, 1 << 63)
+    assert [0] == sstable.compaction.fully_expired([new_tombstones], 2000, 1 << 63)
+    # Older data in an SSTable that isn't compacted
+    assert [] == sstable.compaction.fully_expired([new_tombstones], 2000, 150)
+
+def test_compact_unordered_clustering_type():
+    # Rows of the same partition in both generations, with uuid clustering
+    # values, which clustering_sort_key can't sort
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        header = sstable.sstable_reader.SSTableReader(table_dir("twenty_rows_composite_table"), 1).statistics.serialization_header
+        uuid_type = "org.apache.cassandra.db.marshal.UUIDType"
+        header.clustering_key_types = [construct.Container(name_length=len(uuid_type), name=uuid_type)]
+        for generation in [1, 2]:
+            writer = sstable.compaction.SSTableWriter(tmp_dir, generation, header)
+            writer.write_partition(partition(b"k", [row(bytes([generation]) * 16, 0, [construct.Container(cell_flags=sstable.sstable_data.CellFlag.USE_ROW_TIMESTAMP, cell=construct.Container(cell_value_len=1, cell_value=str(generation)))])]))
+            writer.close()
+        with pytest.raises(Exception, match="UUIDType"):
+            sstable.compaction.compact(tmp_dir, os.path.join(tmp_dir, "output"))
+        assert not os.path.exists(os.path.join(tmp_dir, "output"))
+        # One SSTable is already in order
+        stats = sstable.compaction.compact(tmp_dir, os.path.join(tmp_dir, "output"), generations=[2])
+        assert 1 == stats.rows
+
+def test_compact_complex_deletion():
+    # Generation 1 has rows of a list, with HAS_COMPLEX_DELETION. Generation 2
+    # deletes one of its partitions and writes a newer int column, so the
+    # merged row only has a simple cell.
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        directory = make_table_dir(tmp_dir, ["table_with_list"])
+        reader = sstable.sstable_reader.SSTableReader(directory, 1)
+        marked_for_delete_at = reader.statistics.statistics_metadata.max_timestamp + 1
+        header = construct.Container(reader.statistics.serialization_header)
+        int_type = "org.apache.cassandra.db.marshal.Int32Type"
+        header.regular_columns = [construct.Container(name_length=1, name="v", type=construct.Container(name_length=len(int_type), name=int_type))]
+
+        writer = sstable.compaction.SSTableWriter(directory, 2, header)
+        deleted = partition(b"\x00\x00\x00\x01", [row(None, marked_for_delete_at + 1 - sstable.sstable_statistics.min_timestamp(header), [cell(7)])], marked_for_delete_at=marked_for_delete_at)
+        deleted.unfiltereds[0].row.clustering_block = None
+        writer.write_partition(deleted)
+        writer.close()
+
+        output_dir = os.path.join(tmp_dir, "output")
+        stats = sstable.compaction.compact(directory, output_dir)
+        assert (2, 2) == (stats.partitions, stats.rows)
+        flags = {}
+        for p, unfiltered in sstable.sstable_data.rows_of(sstable.merge.read_table(output_dir)[1]):
+            cells = [c for c in unfiltered.row.row_body.cells if c is not None]
+            flags[bytes(p.partition_header.key)] = (unfiltered.row_flags & sstable.sstable_data.RowFlag.HAS_COMPLEX_DELETION, len(cells))
+        assert {b"\x00\x00\x00\x00": (sstable.sstable_data.RowFlag.HAS_COMPLEX_DELETION, 1), b"\x00\x00\x00\x01": (0, 1)} == flags
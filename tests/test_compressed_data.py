@@ -0,0 +1,99 @@
+import glob
+import os
+import zlib
+import shutil
+
+import sstable.sstable_data
+import sstable.sstable_reader
+import sstable.sstable_index
+import sstable.sstable_summary
+import sstable.sstable_statistics
+import sstable.compressed_data
+
+TABLE_DIR = glob.glob("test_data/cassandra3_data_want/sina_test/sina_table-*/")[0]
+COMPRESSED_TABLE_DIR = glob.glob("test_data/cassandra3_data_want/system_schema/views-*/")[0]
+
+def compress(data, chunk_length):
+    r"""
+    Data.db and CompressionInfo.db of data, compressed with DeflateCompressor.
+    """
+    compressed = b""
+    chunk_offsets = []
+    for start in range(0, len(data), chunk_length):
+        chunk = zlib.compress(data[start:start+chunk_length])
+        chunk_offsets.append(len(compressed))
+        compressed += chunk + zlib.crc32(chunk).to_bytes(4, "big")
+    compression_info = sstable.compressed_data.compression_info_format.build({
+        "compressor": "DeflateCompressor",
+        "options_count": 0,
+        "options": [],
+        "chunk_length": chunk_length,
+        "data_length": len(data),
+        "chunk_count": len(chunk_offsets),
+        "chunk_offsets": chunk_offsets,
+    })
+    return compressed, compression_info
+
+def test_lz4_block_decompress():
+    # 20 literals, then a 30 byte match repeating the last 2 bytes
+    block = bytes([0xf0 | 0xf, 20 - 15]) + bytes(range(20)) + bytes([2, 0, 30 - 4 - 15])
+    assert bytes(range(20)) + bytes([18, 19]) * 15 == sstable.compressed_data.lz4_block_decompress(block, 50)
+
+def test_read_lz4_data():
+    with sstable.compressed_data.open_data_file(os.path.join(COMPRESSED_TABLE_DIR, "me-1-big-Data.db")) as f:
+        assert isinstance(f, sstable.compressed_data.CompressedDataReader)
+        assert "LZ4Compressor" == f.compression_info.compressor
+        assert 49 == len(f.read())
+        with open(os.path.join(COMPRESSED_TABLE_DIR, "me-1-big-Statistics.db"), "rb") as statistics_file:
+            statistics_parsed = sstable.sstable_statistics.statistics_format.parse_stream(statistics_file)
+        f.seek(0)
+        assert [b"system_schema", b"system"] == [p.partition_header.key for p in sstable.sstable_data.iter_partitions(statistics_parsed, f)]
+
+def test_seek_and_read(tmp_path):
+    data = bytes(range(256)) * 10
+    compressed, compression_info = compress(data, 100)
+    (tmp_path / "me-1-big-Data.db").write_bytes(compressed)
+    (tmp_path / "me-1-big-CompressionInfo.db").write_bytes(compression_info)
+
+    with sstable.compressed_data.open_data_file(tmp_path / "me-1-big-Data.db", cache_size=250) as f:
+        f.seek(1050)
+        assert data[1050:1060] == f.read(10)
+        assert 1 == f.chunks_decompressed
+        assert data[1060:1320] == f.read(260)
+        assert 4 == f.chunks_decompressed
+        # At most 2 chunks fit in 250 bytes
+        assert [12, 13] == list(f.cache)
+        f.seek(-10, os.SEEK_END)
+        assert data[-10:] == f.read()
+        assert b"" == f.read(1)
+        f.seek(0)
+        assert data == f.read()
+
+def test_lookup_decompresses_one_chunk(tmp_path):
+    for file_name in os.listdir(TABLE_DIR):
+        shutil.copy(os.path.join(TABLE_DIR, file_name), tmp_path / file_name)
+    data = (tmp_path / "me-1-big-Data.db").read_bytes()
+    compressed, compression_info = compress(data, 64)
+    (tmp_path / "me-1-big-Data.db").write_bytes(compressed)
+    (tmp_path / "me-1-big-CompressionInfo.db").write_bytes(compression_info)
+
+    with open(os.path.join(TABLE_DIR, "me-1-big-Statistics.db"), "rb") as f:
+        statistics_parsed = sstable.sstable_statistics.statistics_format.parse_stream(f)
+    with open(os.path.join(TABLE_DIR, "me-1-big-Data.db"), "rb") as f:
+        want = list(sstable.sstable_data.iter_partitions(statistics_parsed, f))
+    with sstable.compressed_data.open_data_file(tmp_path / "me-1-big-Data.db") as f:
+        assert want == list(sstable.sstable_data.iter_partitions(statistics_parsed, f))
+
+    reader = sstable.sstable_reader.SSTableReader(tmp_path, 1)
+    for partition in want:
+        assert partition == reader.lookup(partition.partition_header.key)
+
+    # Only the chunks of the partition are decompressed
+    with open(tmp_path / "me-1-big-Index.db", "rb") as index_file:
+        index = sstable.sstable_index.read_index(statistics_parsed, index_file)
+        for partition in want:
+            with sstable.compressed_data.open_data_file(tmp_path / "me-1-big-Data.db") as f:
+                assert partition == sstable.sstable_summary.lookup(statistics_parsed, reader.summary, index_file, f, partition.partition_header.key)
+                first_chunk = index[partition.partition_header.key].position // 64
+                last_chunk = (f.tell() - 1) // 64
+                assert last_chunk - first_chunk + 1 == f.chunks_decompressed
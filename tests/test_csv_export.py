@@ -0,0 +1,101 @@
+import io
+import os
+import csv
+import glob
+import gzip
+import tempfile
+
+import pytest
+
+import sstable.dump
+import sstable.csv_export
+
+MARSHAL = sstable.csv_export.MARSHAL
+
+def test_partition_key_formatter():
+    assert "1" == sstable.csv_export.partition_key_formatter(MARSHAL + "Int32Type")(b"\x00\x00\x00\x01")
+    assert "A" == sstable.csv_export.partition_key_formatter(MARSHAL + "UTF8Type")(b"A")
+    assert "0102" == sstable.csv_export.partition_key_formatter(MARSHAL + "InetAddressType")(b"\x01\x02")
+    composite = sstable.csv_export.COMPOSITE_TYPE + MARSHAL + "UTF8Type," + MARSHAL + "Int32Type)"
+    assert "ks:7" == sstable.csv_export.partition_key_formatter(composite)(b"\x00\x02ks\x00\x00\x04\x00\x00\x00\x07\x00")
+
+def test_value_formatter():
+    assert "" == sstable.csv_export.value_formatter(MARSHAL + "Int32Type")(None)
+    assert "true" == sstable.csv_export.value_formatter(MARSHAL + "BooleanType")(True)
+    assert "-1" == sstable.csv_export.value_formatter(MARSHAL + "ByteType")(b"\xff")
+    assert "2012-05-14T12:53:20.000Z" == sstable.csv_export.value_formatter(MARSHAL + "TimestampType")(1337000000000)
+    assert "00000000-0000-0000-0000-000000000001" == sstable.csv_export.value_formatter(MARSHAL + "UUIDType")(b"\x00" * 15 + b"\x01")
+    assert "2.5" == sstable.csv_export.value_formatter(MARSHAL + "ReversedType(" + MARSHAL + "DoubleType)")(2.5)
+
+def typed_csv(table, engine):
+    table_dir = glob.glob(f"test_data/cassandra3_data_want/sina_test/{table}-*/")[0]
+    output = io.StringIO()
+    with open(os.path.join(table_dir, "me-1-big-Statistics.db"), "rb") as statistics_file, open(os.path.join(table_dir, "me-1-big-Data.db"), "rb") as data_file:
+        sstable.dump.dump(statistics_file, data_file, sstable.csv_export.TypedCsvWriter(output), engine=engine)
+    return output.getvalue()
+
+def test_typed_csv():
+    for engine in sstable.dump.ENGINES:
+        rows = list(csv.reader(io.StringIO(typed_csv("has_all_types", engine))))
+        assert "partition_key" == rows[0][0]
+        row = dict(zip(rows[0], rows[1]))
+        assert "1" == row["partition_key"]
+        assert "true" == row["booleancol"]
+        assert "127" == row["tinyintcol"]
+        assert "1950-01-01T00:00:00.000Z" == row["timestampcol"]
+        assert "ffffffff-ffff-ffff-ffff-ffffffffffff" == row["uuidcol"]
+        assert "ffffffffffffffffff" == row["blobcol"]
+
+def test_typed_csv_batches():
+    want = typed_csv("twenty_rows_table", "compiled")
+    batch_size = sstable.csv_export.TypedCsvWriter.BATCH_SIZE
+    try:
+        sstable.csv_export.TypedCsvWriter.BATCH_SIZE = 3
+        assert want == typed_csv("twenty_rows_table", "compiled")
+    finally:
+        sstable.csv_export.TypedCsvWriter.BATCH_SIZE = batch_size
+    assert 21 == len(want.splitlines())
+
+def test_export():
+    table_dir = glob.glob("test_data/cassandra3_data_want/sina_test/twenty_rows_table-*/")[0]
+    want = typed_csv("twenty_rows_table", "compiled")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "rows.csv.gz")
+        assert 20 == sstable.csv_export.export(table_dir, path)
+        with gzip.open(path, "rt", newline="") as f:
+            assert want == f.read()
+        path = os.path.join(tmp_dir, "rows.csv")
+        assert 20 == sstable.csv_export.export(table_dir, path)
+        with open(path, newline="") as f:
+            assert want == f.read()
+
+def test_background_gzip_writer():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "out.gz")
+        with sstable.csv_export.BackgroundGzipWriter(path, chunk_size=10, max_pending=2) as writer:
+            for i in range(1000):
+                writer.write(f"line {i}\n")
+        with gzip.open(path, "rt") as f:
+            assert "".join(f"line {i}\n" for i in range(1000)) == f.read()
+
+def test_background_gzip_writer_errors():
+    class FailingFile:
+        def write(self, data):
+            raise OSError("disk full")
+        def close(self):
+            pass
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "out.gz")
+        # The error of the compressor is raised by close
+        with pytest.raises(OSError):
+            with sstable.csv_export.BackgroundGzipWriter(path) as writer:
+                writer.file.close()
+                writer.file = FailingFile()
+                writer.write("a\n")
+        # and doesn't replace the error of the export
+        with pytest.raises(ValueError):
+            with sstable.csv_export.BackgroundGzipWriter(path) as writer:
+                writer.file.close()
+                writer.file = FailingFile()
+                writer.write("a\n")
+                raise ValueError()
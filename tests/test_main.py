@@ -1,6 +1,8 @@
 import io
+import glob
 import os
 import tempfile
+import contextlib
 
 import sstable.utils
 import sstable.sstable_data
@@ -49,3 +51,72 @@ def test_encode_and_decode():
     assert [b'\x00\x00\x00\x01', b'\x00\x00\x00\x02', b'\x00\x00\x00\x03'] == mock_writer.partition_key_value
     assert ['sina', 'soheil', 'sara'] == mock_writer.clustering_column_values
     assert ['hi my name is sina!', 'hi my name is soheil!', 'hi my name is sara!'] == mock_writer.regular_column_values
+
+def test_iter_partitions():
+    with open("test_data/me-1-big-Statistics.db", "rb") as f:
+        statistics_parsed = sstable.sstable_statistics.statistics_format.parse(f.read())
+    with open("test_data/me-1-big-Data.db", "rb") as f:
+        data_parsed = sstable.sstable_data.data_format.parse(f.read(), sstable_statistics=statistics_parsed)
+
+    with open("test_data/me-1-big-Data.db", "rb") as f:
+        partitions = sstable.sstable_data.iter_partitions(statistics_parsed, f)
+        first_partition = next(partitions)
+        # only the first partition has been read so far
+        assert f.tell() < os.path.getsize("test_data/me-1-big-Data.db")
+        assert data_parsed.partitions == [first_partition] + list(partitions)
+
+    with open("test_data/me-1-big-Data.db", "rb") as f:
+        rows = list(sstable.sstable_data.iter_rows(statistics_parsed, f))
+    assert [b'\x00\x00\x00\x01', b'\x00\x00\x00\x02', b'\x00\x00\x00\x03'] == [p.partition_header.key for p, u in rows]
+
+def test_dump_columns():
+    table_dir = glob.glob("test_data/cassandra3_data_want/sina_test/has_all_types-*/")[0]
+    mock_writers = {}
+    for engine in sstable.dump.ENGINES:
+        mock_writer = MockWriter()
+        with open(os.path.join(table_dir, "me-1-big-Statistics.db"), "rb") as statistics_file:
+            with open(os.path.join(table_dir, "me-1-big-Data.db"), "rb") as data_file:
+                sstable.dump.dump(statistics_file, data_file, mock_writer, engine=engine, columns=["textcol", "intcol"])
+        mock_writers[engine] = mock_writer
+        assert ["textcol", "intcol"] == mock_writer.regular_column_names
+    assert len({repr(vars(mock_writer)) for mock_writer in mock_writers.values()}) == 1
+
+def test_json_writer():
+    # The same lines as json.dumps of one dict per row
+    def dumps(partition_key_value, cells):
+        return sstable.dump.json.dumps({"partition_key_value": partition_key_value, "cells": [{"name": name, "value": value} for name, value in cells]}, cls=sstable.dump.CustomJSONEncoder)
+    rows = [
+        (b"\x00\x01", ["kéy"], ["text \"quoted\"\n", 1 << 70, 1.5, float("inf"), True, None, b"\xff\x00"]),
+        (memoryview(b"\x02"), ["k"], ["", -1, -0.0, float("nan"), False, "\U0001f600", memoryview(b"")]),
+    ]
+    names = ["a", "b\"", "c", "d", "e", "f", "g"]
+    output = io.StringIO()
+    writer = sstable.dump.JsonWriter(output)
+    writer.BATCH_SIZE = 1
+    writer.write_header(["clustering_column_1"], names)
+    for partition_key_value, clustering_column_values, regular_column_values in rows:
+        writer.write_row(partition_key_value, clustering_column_values, regular_column_values)
+    want = [dumps(bytes(key), list(zip(["clustering_column_1"] + names, clustering + regular))) for key, clustering, regular in rows]
+    assert want == output.getvalue().splitlines()
+
+def test_json_writer_batches():
+    # Errors printed while parsing come after the rows before them
+    table_dir = glob.glob("test_data/cassandra3_data_want/sina_test/twenty_rows_table-*/")[0]
+    with open(os.path.join(table_dir, "me-1-big-Statistics.db"), "rb") as f:
+        statistics_parsed = sstable.sstable_statistics.statistics_format.parse(f.read())
+    with open(os.path.join(table_dir, "me-1-big-Data.db"), "rb") as f:
+        data = f.read()
+    # Not utf-8 in the value of the 6th row
+    position = data.index(b"17", data.index(b"17") + 1)
+    data = data[:position] + b"\xff" + data[position+1:]
+    lines = {}
+    for batch_size in [1, 1000]:
+        output = io.StringIO()
+        writer = sstable.dump.JsonWriter(output)
+        writer.BATCH_SIZE = batch_size
+        with contextlib.redirect_stdout(output):
+            sstable.dump.dump(io.BytesIO(data), io.BytesIO(data), writer, parsed_statistics=statistics_parsed)
+        lines[batch_size] = output.getvalue().splitlines()
+    assert lines[1] == lines[1000]
+    errors = [i for i, line in enumerate(lines[1]) if line.startswith("Exception occurred")]
+    assert [5] == errors
@@ -0,0 +1,191 @@
+import io
+import glob
+import tempfile
+
+import pytest
+
+import construct
+
+import sstable.dump
+import sstable.merge
+import sstable.murmur3
+import sstable.row_decoder
+import sstable.sstable_data
+import sstable.sstable_reader
+import sstable.compressed_data
+import sstable.sstable_statistics
+
+from tests.test_query import make_table_dir
+
+UTF8 = "org.apache.cassandra.db.marshal.UTF8Type"
+RowFlag = sstable.sstable_data.RowFlag
+
+def dump(table_dir, generation=None):
+    output = io.StringIO()
+    writer = sstable.dump.JsonWriter(output)
+    if generation is None:
+        sstable.dump.dump_merged(table_dir, writer)
+    else:
+        reader = sstable.sstable_reader.SSTableReader(table_dir, generation)
+        with sstable.compressed_data.open_data_file(reader.path("Data")) as f:
+            sstable.dump.write_rows(reader.statistics, sstable.sstable_data.iter_rows(reader.statistics, f, row_body_decoder=reader.row_body_decoder), writer)
+    return output.getvalue().splitlines()
+
+def values_of(rows, columns_count):
+    # Rows with missing columns are dumped without them, and merged rows have
+    # None for them
+    values = []
+    for partition, unfiltered in rows:
+        cells = sstable.row_decoder.project_cells(unfiltered.row.row_body, range(columns_count))
+        values.append((bytes(partition.partition_header.key), sstable.merge.clustering_key(unfiltered), [cell and cell.cell for cell in cells]))
+    return values
+
+def test_merge_same_sstable():
+    for name in ["twenty_rows_table", "sina_table", "has_all_types"]:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            directory = make_table_dir(tmp_dir, [name, name])
+            reader = sstable.sstable_reader.SSTableReader(directory, 1)
+            columns_count = len(reader.statistics.serialization_header.regular_columns)
+            with sstable.compressed_data.open_data_file(reader.path("Data")) as f:
+                want = values_of(sstable.sstable_data.iter_rows(reader.statistics, f, row_body_decoder=reader.row_body_decoder), columns_count)
+            _, partitions = sstable.merge.read_table(directory)
+            assert want == values_of(sstable.sstable_data.rows_of(partitions), columns_count), name
+            if name != "sina_table": # has rows with missing columns
+                assert dump(directory, 1) == dump(directory), name
+
+def test_merge_columns():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # Different keys, and column b in one and c in the other
+        directory = make_table_dir(tmp_dir, ["twenty_rows_table", "undefined_values_table"])
+        merged_statistics, partitions = sstable.merge.read_table(directory)
+        assert ["b", "c"] == [column.name for column in merged_statistics.serialization_header.regular_columns]
+        keys = [bytes(partition.partition_header.key) for partition in partitions]
+        assert sorted(keys, key=sstable.murmur3.decorated_key) == keys
+        assert len(dump(directory, 1)) + len(dump(directory, 2)) == len(keys)
+        for line in dump(directory):
+            assert ('"name": "b", "value": null' in line) != ('"name": "c", "value": null' in line), line
+
+def test_merge_generations():
+    table_dir = glob.glob("test_data/cassandra3_data_want/system_schema/columns-*/")[0]
+    merged_statistics, partitions = sstable.merge.read_table(table_dir)
+    got = {}
+    for partition, unfiltered in sstable.sstable_data.rows_of(partitions):
+        key = (bytes(partition.partition_header.key), sstable.merge.clustering_key(unfiltered))
+        assert key not in got
+        got[key] = [cell.cell.cell_value for cell in unfiltered.row.row_body.cells]
+
+    want = {}
+    for generation in [21, 22]:
+        reader = sstable.sstable_reader.SSTableReader(table_dir, generation)
+        with sstable.compressed_data.open_data_file(reader.path("Data")) as f:
+            for partition, unfiltered in sstable.sstable_data.iter_rows(reader.statistics, f, row_body_decoder=reader.row_body_decoder):
+                # Same timestamp in both generations, the newer one wins
+                key = (bytes(partition.partition_header.key), sstable.merge.clustering_key(unfiltered))
+                want[key] = [cell.cell.cell_value for cell in unfiltered.row.row_body.cells]
+    assert want == got
+
+def cell(value, flags=sstable.sstable_data.CellFlag.USE_ROW_TIMESTAMP):
+    if value is None:
+        return construct.Container(cell_flags=flags | sstable.sstable_data.CellFlag.HAS_EMPTY_VALUE | sstable.sstable_data.CellFlag.IS_DELETED, cell=None)
+    return construct.Container(cell_flags=flags, cell=construct.Container(cell_value=value))
+
+def row(clustering, timestamp_diff, cells, missing_columns=None):
+    row_flags = RowFlag.HAS_TIMESTAMP | (RowFlag.HAS_ALL_COLUMNS if missing_columns is None else 0)
+    clustering_block = construct.Container(clustering_block_header=0, clustering_cells=[construct.Container(key=construct.Container(cell_value=clustering))])
+    row_body = construct.Container(timestamp_diff=timestamp_diff, missing_columns=missing_columns, cells=cells)
+    return construct.Container(row_flags=row_flags, row=construct.Container(clustering_block=clustering_block, row_body=row_body))
+
+def partition(key, rows, marked_for_delete_at=sstable.merge.LIVE):
+    end = construct.Container(row_flags=RowFlag.END_OF_PARTITION, row=None)
+    deletion_time = construct.Container(local_deletion_time=0x7fffffff, marked_for_delete_at=marked_for_delete_at)
+    return construct.Container(partition_header=construct.Container(key_len=len(key), key=key, deletion_time=deletion_time), unfiltereds=rows + [end])
+
+def statistics(min_timestamp, column_names):
+    columns = [construct.Container(name=name, type=construct.Container(name=UTF8)) for name in column_names]
+    return construct.Container(serialization_header=construct.Container(
+        min_timestamp=min_timestamp,
+        clustering_key_types=[construct.Container(name=UTF8)],
+        regular_columns=columns,
+    ))
+
+def merged_rows(merger, partitions):
+    # Without the columns the rows don't have
+    return [
+        (sstable.merge.clustering_key(unfiltered), {
+            name: cell.cell.cell_value if cell.cell is not None else None
+            for name, cell in zip(merger.names, unfiltered.row.row_body.cells) if cell is not None
+        })
+        for _, unfiltered in sstable.sstable_data.rows_of(partitions)
+    ]
+
+def test_reconcile():
+    # The second generation has an older min_timestamp, so its rows can be
+    # older than the ones of the first
+    merger = sstable.merge.Merger([statistics(100, ["a", "b"]), statistics(50, ["b", "c"])])
+    assert 50 == merger.statistics.serialization_header.min_timestamp
+    old = [partition(b"k", [
+        row("x", 10, [cell("a110"), cell("b110")]),
+        row("z", 0, [cell("a100"), cell("b100")]),
+    ])]
+    new = [partition(b"k", [
+        row("x", 0, [cell("b50"), cell("c50")]),
+        row("y", 100, [cell(None)], missing_columns=[1]),
+        row("z", 50, [cell(None), cell("c100")]),
+    ])]
+    got = merged_rows(merger, merger.merge([old, new]))
+    assert [
+        (("x",), {"a": "a110", "b": "b110", "c": "c50"}),
+        (("y",), {"c": None}),
+        # Same timestamp, the tombstone wins
+        (("z",), {"a": "a100", "b": None, "c": "c100"}),
+    ] == got
+
+    # A partition deletion at 100 shadows everything written at or before it
+    merger = sstable.merge.Merger([statistics(100, ["a", "b"]), statistics(50, ["b", "c"]), statistics(0, [])])
+    deleted = [partition(b"k", [], marked_for_delete_at=sstable.sstable_statistics.TIMESTAMP_EPOCH + 100)]
+    got = merged_rows(merger, merger.merge([old, new, deleted]))
+    assert [
+        (("x",), {"a": "a110", "b": "b110"}),
+        (("y",), {"c": None}),
+    ] == got
+
+    # Same timestamp and both live, the greater value wins whichever the
+    # generation, "ab" < "b" as bytes
+    def text(value):
+        return construct.Container(cell(value), cell=construct.Container(cell_value_len=len(value), cell_value=value))
+    merger = sstable.merge.Merger([statistics(0, ["a"]), statistics(0, ["a"])])
+    older = [partition(b"k", [row("x", 0, [text("b")]), row("y", 0, [text("ab")])])]
+    newer = [partition(b"k", [row("x", 0, [text("ab")]), row("y", 0, [text("b")])])]
+    assert [(("x",), {"a": "b"}), (("y",), {"a": "b"})] == merged_rows(merger, merger.merge([older, newer]))
+
+def collection(value):
+    item = construct.Container(cell_flags=sstable.sstable_data.CellFlag.USE_ROW_TIMESTAMP, cell=construct.Container(cell_value=value))
+    deletion_time = construct.Container(delta_mark_for_delete_at=0, delta_local_deletion_time=0)
+    return construct.Container(complex_deletion_time=deletion_time, items_count=1, items=[item])
+
+def test_merge_complex_deletion():
+    LIST = "org.apache.cassandra.db.marshal.ListType(org.apache.cassandra.db.marshal.Int32Type)"
+    lists = statistics(0, ["l"])
+    lists.serialization_header.regular_columns[0].type.name = LIST
+    merger = sstable.merge.Merger([lists, statistics(0, ["a"]), statistics(0, [])])
+    assert ["a", "l"] == merger.names
+    complex_row = row("x", 10, [collection(1)])
+    complex_row.row_flags |= RowFlag.HAS_COMPLEX_DELETION
+    marker = row("x", 20, [], missing_columns=[])
+    marker.row_flags |= RowFlag.IS_MARKER
+    old = [partition(b"k", [complex_row])]
+
+    # The collection wins, the merged row has its flag, and not IS_MARKER
+    [got] = sstable.sstable_data.rows_of(merger.merge([old, [], [partition(b"k", [marker])]]))
+    assert RowFlag.HAS_ALL_COLUMNS | RowFlag.HAS_TIMESTAMP | RowFlag.HAS_COMPLEX_DELETION == got[1].row_flags
+
+    # The collection is shadowed by the partition deletion, only a simple
+    # cell is left
+    deleted = [partition(b"k", [row("x", 20, [cell("a20")])], marked_for_delete_at=sstable.sstable_statistics.TIMESTAMP_EPOCH + 10)]
+    [got] = sstable.sstable_data.rows_of(merger.merge([old, deleted, []]))
+    assert RowFlag.HAS_ALL_COLUMNS | RowFlag.HAS_TIMESTAMP == got[1].row_flags
+    assert [("x",), {"a": "a20"}] == list(merged_rows(merger, merger.merge([old, deleted, []]))[0])
+
+    # The grammar can't write a row with both
+    with pytest.raises(Exception, match="collection cells and other cells"):
+        list(sstable.sstable_data.rows_of(merger.merge([old, [partition(b"k", [row("x", 20, [cell("a20")])])], []])))
@@ -0,0 +1,64 @@
+import os
+import glob
+import shutil
+import tempfile
+
+import sstable.sstable_reader
+import sstable.metadata_cache
+
+def copy_table(name, tmp_dir):
+    table_dir = os.path.join(tmp_dir, name)
+    shutil.copytree(glob.glob(f"test_data/cassandra3_data_want/sina_test/{name}-*/")[0], table_dir)
+    return table_dir
+
+def assert_same(want, got):
+    assert want.statistics == got.statistics
+    assert list(want.summary.tokens) == list(got.summary.tokens)
+    assert want.bloom_filter.words == got.bloom_filter.words
+    key = b"\x00\x00\x00\x01"
+    assert want.might_contain(key) == got.might_contain(key)
+
+def test_metadata_cache():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        table_dir = copy_table("has_all_types", tmp_dir)
+        cache = sstable.metadata_cache.MetadataCache(os.path.join(tmp_dir, "cache"))
+        want = sstable.sstable_reader.SSTableReader(table_dir, 1)
+        assert_same(want, sstable.sstable_reader.SSTableReader(table_dir, 1, metadata_cache=cache))
+        assert (0, 1) == (cache.stats.hits, cache.stats.misses)
+        for _ in range(2):
+            assert_same(want, sstable.sstable_reader.SSTableReader(table_dir, 1, metadata_cache=cache))
+        assert (2, 1) == (cache.stats.hits, cache.stats.misses)
+        # A new cache reads the same directory
+        cache = sstable.metadata_cache.MetadataCache(os.path.join(tmp_dir, "cache"))
+        assert_same(want, sstable.sstable_reader.SSTableReader(table_dir, 1, metadata_cache=cache))
+        assert (1, 0) == (cache.stats.hits, cache.stats.misses)
+
+def test_invalidation():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        table_dir = copy_table("twenty_rows_table", tmp_dir)
+        cache = sstable.metadata_cache.MetadataCache(os.path.join(tmp_dir, "cache"))
+        sstable.sstable_reader.SSTableReader(table_dir, 1, metadata_cache=cache)
+
+        # Replaced by another SSTable with the same generation
+        for path in glob.glob(os.path.join(table_dir, "me-1-big-*")):
+            os.remove(path)
+        other_dir = copy_table("has_all_types", tmp_dir)
+        for path in glob.glob(os.path.join(other_dir, "me-1-big-*")):
+            shutil.copy(path, table_dir)
+        reader = sstable.sstable_reader.SSTableReader(table_dir, 1, metadata_cache=cache)
+        assert (0, 2) == (cache.stats.hits, cache.stats.misses)
+        assert_same(sstable.sstable_reader.SSTableReader(other_dir, 1), reader)
+
+        # Only the mtime changed
+        path = sstable.sstable_reader.component_path(table_dir, 1, "Filter")
+        st = os.stat(path)
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1))
+        sstable.sstable_reader.SSTableReader(table_dir, 1, metadata_cache=cache)
+        assert (0, 3) == (cache.stats.hits, cache.stats.misses)
+
+        # A broken entry is parsed again
+        with open(cache.entry_path(table_dir, 1), "wb") as f:
+            f.write(b"not a pickle")
+        assert_same(sstable.sstable_reader.SSTableReader(other_dir, 1), sstable.sstable_reader.SSTableReader(table_dir, 1, metadata_cache=cache))
+        sstable.sstable_reader.SSTableReader(table_dir, 1, metadata_cache=cache)
+        assert (1, 4) == (cache.stats.hits, cache.stats.misses)
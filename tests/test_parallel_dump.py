@@ -0,0 +1,65 @@
+import io
+import os
+import glob
+import tempfile
+import contextlib
+
+import sstable.dump
+import sstable.parallel_dump
+import sstable.compressed_data
+import sstable.sstable_reader
+import sstable.sstable_statistics
+
+TABLE_DIRS = [
+    glob.glob("test_data/cassandra3_data_want/sina_test/twenty_rows_table-*/")[0],
+    glob.glob("test_data/cassandra3_data_want/sina_test/has_all_types-*/")[0],
+    # The grammar fails on some of its rows
+    glob.glob("test_data/cassandra3_data_want/sina_test/users-*/")[0],
+    # Compressed
+    glob.glob("test_data/cassandra3_data_want/system_schema/keyspaces-*/")[0],
+]
+
+def dump_sequential(table_dir, output_format, generation=1):
+    output = io.StringIO()
+    writer = sstable.dump.WRITERS[output_format](output)
+    with open(os.path.join(table_dir, f"me-{generation}-big-Statistics.db"), "rb") as statistics_file:
+        with sstable.compressed_data.open_data_file(os.path.join(table_dir, f"me-{generation}-big-Data.db")) as data_file:
+            with contextlib.redirect_stdout(output):
+                sstable.dump.dump(statistics_file, data_file, writer)
+    return output.getvalue()
+
+def dump_parallel(table_dir, output_format, generation=1, range_size=sstable.parallel_dump.RANGE_SIZE):
+    output = io.StringIO()
+    sstable.parallel_dump.dump_parallel(table_dir, output, output_format=output_format, workers=2, generation=generation, range_size=range_size)
+    return output.getvalue()
+
+def generation_of(table_dir):
+    return sstable.sstable_reader.list_generations(table_dir)[0]
+
+def test_dump_parallel():
+    for table_dir in TABLE_DIRS:
+        for output_format in ["json", "csv"]:
+            generation = generation_of(table_dir)
+            assert dump_sequential(table_dir, output_format, generation) == dump_parallel(table_dir, output_format, generation), (table_dir, output_format)
+
+def test_dump_parallel_small_ranges():
+    # More ranges than workers * 4, one partition or so each
+    table_dir = TABLE_DIRS[0]
+    assert dump_sequential(table_dir, "json") == dump_parallel(table_dir, "json", range_size=16)
+
+def test_dump_parallel_without_index():
+    table_dir = TABLE_DIRS[0]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for path in glob.glob(os.path.join(table_dir, "me-1-big-*")):
+            if not path.endswith("Index.db"):
+                os.symlink(os.path.abspath(path), os.path.join(tmp_dir, os.path.basename(path)))
+        assert dump_sequential(table_dir, "json") == dump_parallel(tmp_dir, "json")
+
+def test_scan_positions():
+    for table_dir in TABLE_DIRS[:2]:
+        with open(os.path.join(table_dir, "me-1-big-Statistics.db"), "rb") as f:
+            statistics_parsed = sstable.sstable_statistics.statistics_format.parse_stream(f)
+        with open(os.path.join(table_dir, "me-1-big-Index.db"), "rb") as f:
+            want = sstable.parallel_dump.index_positions(f)
+        with open(os.path.join(table_dir, "me-1-big-Data.db"), "rb") as f:
+            assert want == sstable.parallel_dump.scan_positions(statistics_parsed, f), table_dir
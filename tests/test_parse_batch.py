@@ -0,0 +1,49 @@
+import io
+import os
+import sys
+import glob
+import shutil
+import tempfile
+import subprocess
+
+import parse_batch
+
+TABLES = ["sina_table", "twenty_rows_composite_table"]
+
+def make_data_dir(tmp_dir):
+    data_dir = os.path.join(tmp_dir, "data")
+    for name in TABLES:
+        table_dir = glob.glob(f"test_data/cassandra3_data_want/sina_test/{name}-*/")[0]
+        shutil.copytree(table_dir, os.path.join(data_dir, "sina_test", os.path.basename(os.path.dirname(table_dir))))
+    return data_dir
+
+def parse_all(data_dir, output_dir):
+    return parse_batch.parse_all(data_dir, output_dir, jobs=2, log=io.StringIO())
+
+def test_parse_all():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        data_dir = make_data_dir(tmp_dir)
+        output_dir = os.path.join(tmp_dir, "parsed")
+
+        assert {"parsed": 2, "skipped": 0, "removed": 0, "failed": 0} == parse_all(data_dir, output_dir)
+        for name in TABLES:
+            with open(os.path.join(output_dir, "sina_test", name, "me-1-big-Data.db.hex")) as f:
+                got = f.read()
+            table_dir = glob.glob(f"test_data/cassandra3_data_want/sina_test/{name}-*/")[0]
+            want = subprocess.run([sys.executable, "-m", "parse_with_construct", table_dir], capture_output=True, text=True).stdout
+            assert want == got, name
+
+        assert {"parsed": 0, "skipped": 2, "removed": 0, "failed": 0} == parse_all(data_dir, output_dir)
+
+        # Same content, newer mtime
+        data_path = glob.glob(os.path.join(data_dir, "sina_test", "sina_table-*", "me-1-big-Data.db"))[0]
+        os.utime(data_path, ns=(0, 0))
+        assert {"parsed": 0, "skipped": 2, "removed": 0, "failed": 0} == parse_all(data_dir, output_dir)
+
+        with open(data_path, "ab") as f:
+            f.write(b"\x00")
+        assert {"parsed": 1, "skipped": 1, "removed": 0, "failed": 0} == parse_all(data_dir, output_dir)
+
+        shutil.rmtree(os.path.dirname(data_path))
+        assert {"parsed": 0, "skipped": 1, "removed": 1, "failed": 0} == parse_all(data_dir, output_dir)
+        assert not os.path.exists(os.path.join(output_dir, "sina_test", "sina_table", "me-1-big-Data.db.hex"))
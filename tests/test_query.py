@@ -0,0 +1,80 @@
+import glob
+import os
+import sys
+import tempfile
+import subprocess
+
+import sstable.query
+import sstable.sstable_statistics
+
+def table_dir(name):
+    return glob.glob(f"test_data/cassandra3_data_want/sina_test/{name}-*/")[0]
+
+def make_table_dir(tmp_dir, tables):
+    # Generation i+1 is a copy of the SSTable of tables[i]
+    for generation, name in enumerate(tables, 1):
+        for path in glob.glob(os.path.join(table_dir(name), "me-1-big-*")):
+            component = os.path.basename(path)[len("me-1-big-"):]
+            os.symlink(os.path.abspath(path), os.path.join(tmp_dir, f"me-{generation}-big-{component}"))
+    return tmp_dir
+
+def run(directory, query_slice):
+    sstables = sstable.query.scan(directory, query_slice)
+    clustering_values = []
+    while True:
+        try:
+            _, rows = next(sstables)
+        except StopIteration as stop:
+            return clustering_values, stop.value
+        for _, unfiltered in rows:
+            clustering_values.append(unfiltered.row.clustering_block.clustering_cells[0].key.cell_value)
+
+def test_skip_by_clustering_range():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # Clustering values "1" to "9", and "baba" to "soheil"
+        directory = make_table_dir(tmp_dir, ["twenty_rows_composite_table", "sina_table"])
+
+        got, stats = run(directory, sstable.query.Slice(start=["a"], end=["c"]))
+        assert ["baba", "boo"] == sorted(got)
+        assert (2, 1, 1) == (stats.sstables, stats.skipped_by_clustering, stats.scanned)
+
+        got, stats = run(directory, sstable.query.Slice(start=["2"], end=["3"]))
+        assert ["2", "20", "3"] == got
+        assert (1, 1) == (stats.skipped_by_clustering, stats.scanned)
+
+        got, stats = run(directory, sstable.query.Slice())
+        assert 20 + 7 == len(got)
+        assert (0, 2) == (stats.skipped_by_clustering, stats.scanned)
+
+def test_skip_by_timestamp():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        directory = make_table_dir(tmp_dir, ["sina_table", "twenty_rows_composite_table"])
+
+        # sina_table was written before twenty_rows_composite_table
+        got, stats = run(directory, sstable.query.Slice(until=1703358899000000))
+        assert 7 == len(got)
+        assert (1, 1) == (stats.skipped_by_timestamp, stats.scanned)
+
+        got, stats = run(directory, sstable.query.Slice(since=1703358899000000))
+        assert 20 == len(got)
+        assert (1, 1) == (stats.skipped_by_timestamp, stats.scanned)
+
+        # Rows are filtered by their own timestamps too
+        got, stats = run(directory, sstable.query.Slice(since=1703358898860000, until=1703358899000000))
+        assert 0 < len(got) < 7
+        assert 1 == stats.scanned
+
+def test_parse_clustering_prefix():
+    with open(os.path.join(table_dir("sina_table"), "me-1-big-Statistics.db"), "rb") as f:
+        statistics_parsed = sstable.sstable_statistics.statistics_format.parse_stream(f)
+    assert ["a"] == sstable.query.parse_clustering_prefix(statistics_parsed, "a")
+    assert [] == sstable.query.parse_clustering_prefix(statistics_parsed, "")
+    assert [("baba", "soheil")] == sstable.query.clustering_ranges(statistics_parsed)
+
+def test_main_writes_one_header():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        directory = make_table_dir(tmp_dir, ["twenty_rows_table", "twenty_rows_table"])
+        for output_format, header in [("csv", "partition_key_type,b"), ("typed-csv", "partition_key,b")]:
+            lines = subprocess.run([sys.executable, "-m", "sstable.query", directory, "--format", output_format], capture_output=True, text=True).stdout.splitlines()
+            assert [header] == [line for line in lines if "partition_key" in line], output_format
+            assert 41 == len(lines)
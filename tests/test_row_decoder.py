@@ -0,0 +1,91 @@
+import glob
+import os
+
+import sstable.sstable_data
+import sstable.sstable_statistics
+import sstable.row_decoder
+import sstable.mmap_reader
+
+import tests.test_sstable
+
+def test_compiled_row_body_decoder_matches_grammar():
+    for table_dir in sorted(glob.glob("test_data/cassandra3_data_want/sina_test/*/")):
+        with open(os.path.join(table_dir, "me-1-big-Statistics.db"), "rb") as f:
+            statistics_parsed = sstable.sstable_statistics.statistics_format.parse(f.read())
+        with open(os.path.join(table_dir, "me-1-big-Data.db"), "rb") as f:
+            data_bytes = f.read()
+
+        want = sstable.sstable_data.data_format.parse(data_bytes, sstable_statistics=statistics_parsed)
+        decoder = sstable.row_decoder.compile_row_body_decoder(statistics_parsed.serialization_header)
+        got = sstable.sstable_data.data_format.parse(data_bytes, sstable_statistics=statistics_parsed, row_body_decoder=decoder)
+        assert want == got, table_dir
+
+def test_mmap_reader_matches_grammar():
+    for table_dir in sorted(glob.glob("test_data/cassandra3_data_want/sina_test/*/")):
+        with open(os.path.join(table_dir, "me-1-big-Statistics.db"), "rb") as f:
+            statistics_parsed = sstable.sstable_statistics.statistics_format.parse(f.read())
+        with open(os.path.join(table_dir, "me-1-big-Data.db"), "rb") as f:
+            want = list(sstable.sstable_data.iter_partitions(statistics_parsed, f))
+        with open(os.path.join(table_dir, "me-1-big-Data.db"), "rb") as f:
+            got = list(sstable.mmap_reader.iter_partitions(statistics_parsed, f))
+        assert want == got, table_dir
+        if "has_all_types" in table_dir:
+            assert all(isinstance(p.partition_header.key, memoryview) for p in got)
+
+def test_projection_matches_grammar():
+    for table_dir in sorted(glob.glob("test_data/cassandra3_data_want/sina_test/*/")):
+        with open(os.path.join(table_dir, "me-1-big-Statistics.db"), "rb") as f:
+            statistics_parsed = sstable.sstable_statistics.statistics_format.parse(f.read())
+        with open(os.path.join(table_dir, "me-1-big-Data.db"), "rb") as f:
+            data_bytes = f.read()
+        names = [column.name for column in statistics_parsed.serialization_header.regular_columns]
+        want = sstable.sstable_data.data_format.parse(data_bytes, sstable_statistics=statistics_parsed)
+
+        for columns in [[name] for name in names] + [list(reversed(names)), names[::2]]:
+            projection = sstable.row_decoder.column_indexes(statistics_parsed.serialization_header, columns)
+            decoder = sstable.row_decoder.compile_row_body_decoder(statistics_parsed.serialization_header, columns=columns)
+            got = sstable.sstable_data.data_format.parse(data_bytes, sstable_statistics=statistics_parsed, row_body_decoder=decoder)
+            want_cells = [sstable.row_decoder.project_cells(u.row.row_body, projection) for p in want.partitions for u in p.unfiltereds if u.row]
+            got_cells = [sstable.row_decoder.project_cells(u.row.row_body, projection) for p in got.partitions for u in p.unfiltereds if u.row]
+            if len(got_cells) > len(want_cells):
+                # The grammar fails on some rows of this table, e.g. songs,
+                # which the projection doesn't need to decode
+                continue
+            assert want_cells == got_cells, (table_dir, columns)
+
+def test_lazy_row_body_decoder_matches_grammar():
+    for table_dir in sorted(glob.glob("test_data/cassandra3_data_want/sina_test/*/")):
+        with open(os.path.join(table_dir, "me-1-big-Statistics.db"), "rb") as f:
+            statistics_parsed = sstable.sstable_statistics.statistics_format.parse(f.read())
+        with open(os.path.join(table_dir, "me-1-big-Data.db"), "rb") as f:
+            data_bytes = f.read()
+
+        want = sstable.sstable_data.data_format.parse(data_bytes, sstable_statistics=statistics_parsed)
+        decoder = sstable.row_decoder.compile_row_body_decoder(statistics_parsed.serialization_header, lazy=True)
+        got = sstable.sstable_data.data_format.parse(data_bytes, sstable_statistics=statistics_parsed, row_body_decoder=decoder)
+        cells = [cell for p in got.partitions for u in p.unfiltereds if u.row for cell in u.row.row_body.cells]
+        lazy_cells = [cell for cell in cells if isinstance(cell, sstable.row_decoder.LazyCell)]
+        if "twenty_rows_table" in table_dir:
+            assert 20 == len(lazy_cells)
+        # Nothing is decoded until it is read
+        assert all(dict.__contains__(cell, "_lazy") for cell in lazy_cells), table_dir
+        assert want == got, table_dir
+        assert not any(dict.__contains__(cell, "_lazy") for cell in lazy_cells), table_dir
+
+def test_lazy_cell():
+    example = tests.test_sstable.simple_row_body_example
+    statistics = example["parsing_kwargs"]["sstable_statistics"]
+    decoder = sstable.row_decoder.compile_row_body_decoder(statistics.serialization_header, lazy=True)
+    row_body, size = decoder.decode(example["bytes"], example["parsing_kwargs"]["overridden_row_flags"])
+    assert len(example["bytes"]) == size
+    cell = row_body.cells[0]
+    assert 0x08 == cell.cell_flags
+    assert dict.__contains__(cell, "_lazy")
+    assert "cell" in cell
+    assert 1 == cell.cell.cell_value
+    assert not dict.__contains__(cell, "_lazy")
+    assert example["obj"] == row_body
+
+    # Builds like the parsed Container
+    row_body, _ = decoder.decode(example["bytes"], example["parsing_kwargs"]["overridden_row_flags"])
+    assert example["bytes"] == example["construct_struct"].build(row_body, **example["parsing_kwargs"])
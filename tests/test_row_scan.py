@@ -0,0 +1,52 @@
+import glob
+import os
+
+import sstable.row_scan
+import sstable.sstable_data
+import sstable.sstable_statistics
+
+def table_dir(name):
+    return glob.glob(f"test_data/cassandra3_data_want/sina_test/{name}-*/")[0]
+
+def read_statistics(table_dir):
+    with open(os.path.join(table_dir, "me-1-big-Statistics.db"), "rb") as f:
+        return sstable.sstable_statistics.statistics_format.parse(f.read())
+
+def comparable(rows):
+    return [(bytes(partition.partition_header.key), unfiltered) for partition, unfiltered in rows]
+
+def test_iter_rows():
+    for name in ["has_all_types", "sina_table", "twenty_rows_composite_table", "table_with_map", "utf8_with_special_chars"]:
+        statistics_parsed = read_statistics(table_dir(name))
+        with open(os.path.join(table_dir(name), "me-1-big-Data.db"), "rb") as f:
+            want = list(sstable.sstable_data.iter_rows(statistics_parsed, f))
+        with open(os.path.join(table_dir(name), "me-1-big-Data.db"), "rb") as f:
+            assert comparable(want) == comparable(sstable.row_scan.iter_rows(statistics_parsed, f)), name
+        with open(os.path.join(table_dir(name), "me-1-big-Data.db"), "rb") as f:
+            assert len(want) == sstable.row_scan.count_rows(statistics_parsed, f), name
+
+def test_predicates():
+    statistics_parsed = read_statistics(table_dir("twenty_rows_composite_table"))
+    with open(os.path.join(table_dir("twenty_rows_composite_table"), "me-1-big-Data.db"), "rb") as f:
+        want = list(sstable.sstable_data.iter_rows(statistics_parsed, f))
+
+    clustering_predicate = lambda values: values[0] in ["3", "14"]
+    with open(os.path.join(table_dir("twenty_rows_composite_table"), "me-1-big-Data.db"), "rb") as f:
+        got = list(sstable.row_scan.iter_rows(statistics_parsed, f, clustering_predicate=clustering_predicate))
+    assert comparable(row for row in want if row[1].row.clustering_block.clustering_cells[0].key.cell_value in ["3", "14"]) == comparable(got)
+    with open(os.path.join(table_dir("twenty_rows_composite_table"), "me-1-big-Data.db"), "rb") as f:
+        assert 2 == sstable.row_scan.count_rows(statistics_parsed, f, clustering_predicate=clustering_predicate)
+
+    with open(os.path.join(table_dir("twenty_rows_composite_table"), "me-1-big-Data.db"), "rb") as f:
+        assert 0 == sstable.row_scan.count_rows(statistics_parsed, f, partition_predicate=lambda key: key == b"B")
+    with open(os.path.join(table_dir("twenty_rows_composite_table"), "me-1-big-Data.db"), "rb") as f:
+        assert 20 == sstable.row_scan.count_rows(statistics_parsed, f, partition_predicate=lambda key: key == b"A")
+
+def test_count_rows_skips_cells():
+    # The grammar cannot decode the cells of this table, but the rows can
+    # still be counted and filtered by their clustering key.
+    statistics_parsed = read_statistics(table_dir("dynamic_columns"))
+    with open(os.path.join(table_dir("dynamic_columns"), "me-1-big-Data.db"), "rb") as f:
+        assert 5 == sstable.row_scan.count_rows(statistics_parsed, f)
+    with open(os.path.join(table_dir("dynamic_columns"), "me-1-big-Data.db"), "rb") as f:
+        assert 1 == sstable.row_scan.count_rows(statistics_parsed, f, partition_predicate=lambda key: key == b"\x00\x00\x00\x02")
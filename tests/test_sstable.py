@@ -2,6 +2,7 @@ import box
 import construct
 import sstable.utils
 import sstable.sstable_data
+import sstable.type_parser
 
 simple_cell_example = {
         "construct_struct": sstable.sstable_data.simple_cell,
@@ -344,3 +345,12 @@ def test_cells():
             ),
         )
 
+
+def test_parse_type_is_cached():
+    list_type = "org.apache.cassandra.db.marshal.ListType(org.apache.cassandra.db.marshal.Int32Type)"
+    sstable.type_parser.parse_type.cache_clear()
+    for _ in range(3):
+        sstable.type_parser.parse_type(list_type)
+    cache_info = sstable.type_parser.parse_type.cache_info()
+    assert 1 == cache_info.misses
+    assert 2 == cache_info.hits
@@ -0,0 +1,66 @@
+import io
+import json
+import glob
+import os
+import shutil
+
+import sstable.dump
+import sstable.sstable_filter
+import sstable.sstable_index
+import sstable.sstable_reader
+import sstable.sstable_statistics
+
+TABLE_DIR = glob.glob("test_data/cassandra3_data_want/sina_test/sina_table-*/")[0]
+
+def read_filter(table_dir, generation=1):
+    with open(sstable.sstable_reader.component_path(table_dir, generation, "Filter"), "rb") as f:
+        return sstable.sstable_filter.read_filter(f)
+
+def test_might_contain():
+    for table_dir in glob.glob("test_data/cassandra3_data_want/sina_test/*/"):
+        with open(os.path.join(table_dir, "me-1-big-Statistics.db"), "rb") as f:
+            statistics_parsed = sstable.sstable_statistics.statistics_format.parse(f.read())
+        with open(os.path.join(table_dir, "me-1-big-Index.db"), "rb") as f:
+            index = sstable.sstable_index.read_index(statistics_parsed, f)
+        bloom_filter = read_filter(table_dir)
+        assert all(bloom_filter.might_contain(key) for key in index), table_dir
+
+def test_might_contain_rejects_missing_keys():
+    bloom_filter = read_filter(TABLE_DIR)
+    assert 5 == bloom_filter.hash_count
+    assert 128 == bloom_filter.size
+    rejected = sum(not bloom_filter.might_contain(key.to_bytes(4, "big")) for key in range(8, 1000))
+    assert rejected > 900
+
+def test_lookup_skips_generations(tmp_path):
+    for file_name in os.listdir(TABLE_DIR):
+        shutil.copy(os.path.join(TABLE_DIR, file_name), tmp_path / file_name)
+        shutil.copy(os.path.join(TABLE_DIR, file_name), tmp_path / file_name.replace("me-1-", "me-2-"))
+        shutil.copy(os.path.join(TABLE_DIR, file_name), tmp_path / file_name.replace("me-1-", "me-10-"))
+    # A filter without any bits set rules out every key
+    with open(tmp_path / "me-2-big-Filter.db", "r+b") as f:
+        f.seek(8)
+        f.write(bytes(16))
+
+    sstables = sstable.sstable_reader.open_sstables(tmp_path)
+    assert [1, 2, 10] == [reader.generation for reader in sstables]
+
+    found, stats = sstable.sstable_reader.lookup(sstables, b"\x00\x00\x00\x04")
+    assert [1, 10] == [reader.generation for reader, _ in found]
+    assert all(b"\x00\x00\x00\x04" == partition.partition_header.key for _, partition in found)
+    assert (3, 1, 0, 2) == (stats.sstables, stats.skipped_by_filter, stats.false_positives, stats.found)
+
+    found, stats = sstable.sstable_reader.lookup(sstables, b"\x00\x00\x00\x09")
+    assert [] == found
+    assert (3, 3, 0, 0) == (stats.sstables, stats.skipped_by_filter, stats.false_positives, stats.found)
+
+def test_dump_partition_from_sstables_columns(tmp_path):
+    # Generations with different columns: b in 1, c in 2
+    for generation, name in [(1, "twenty_rows_table"), (2, "undefined_values_table")]:
+        table_dir = glob.glob(f"test_data/cassandra3_data_want/sina_test/{name}-*/")[0]
+        for file_name in os.listdir(table_dir):
+            shutil.copy(os.path.join(table_dir, file_name), tmp_path / file_name.replace("me-1-", f"me-{generation}-"))
+    sstables = sstable.sstable_reader.open_sstables(tmp_path)
+    output = io.StringIO()
+    sstable.dump.dump_partition_from_sstables(sstables, sstable.dump.JsonWriter(output), b"k1")
+    assert [{"name": "c", "value": "c1"}] == json.loads(output.getvalue())["cells"]
@@ -0,0 +1,32 @@
+import glob
+import os
+
+import sstable.sstable_data
+import sstable.sstable_index
+import sstable.sstable_statistics
+
+TABLE_DIR = glob.glob("test_data/cassandra3_data_want/sina_test/sina_table-*/")[0]
+
+def read_statistics(table_dir):
+    with open(os.path.join(table_dir, "me-1-big-Statistics.db"), "rb") as f:
+        return sstable.sstable_statistics.statistics_format.parse(f.read())
+
+def test_read_index():
+    statistics_parsed = read_statistics(TABLE_DIR)
+    with open(os.path.join(TABLE_DIR, "me-1-big-Index.db"), "rb") as f:
+        index = sstable.sstable_index.read_index(statistics_parsed, f)
+    assert [5, 1, 2, 4, 7, 6, 3] == [int.from_bytes(key, "big") for key in index]
+    assert [0, 32, 75, 115, 169, 206, 245] == [entry.position for entry in index.values()]
+    assert all(entry.promoted_index is None for entry in index.values())
+
+def test_lookup():
+    statistics_parsed = read_statistics(TABLE_DIR)
+    with open(os.path.join(TABLE_DIR, "me-1-big-Index.db"), "rb") as f:
+        index = sstable.sstable_index.read_index(statistics_parsed, f)
+    with open(os.path.join(TABLE_DIR, "me-1-big-Data.db"), "rb") as f:
+        partitions = list(sstable.sstable_data.iter_partitions(statistics_parsed, f))
+
+    with open(os.path.join(TABLE_DIR, "me-1-big-Data.db"), "rb") as f:
+        for partition in reversed(partitions):
+            assert partition == sstable.sstable_index.lookup(statistics_parsed, index, f, partition.partition_header.key)
+        assert None == sstable.sstable_index.lookup(statistics_parsed, index, f, b"\x00\x00\x00\x09")
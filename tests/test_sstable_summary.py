@@ -0,0 +1,84 @@
+import io
+import glob
+import os
+
+import sstable.murmur3
+import sstable.sstable_data
+import sstable.sstable_index
+import sstable.sstable_summary
+import sstable.sstable_statistics
+
+TABLE_DIR = glob.glob("test_data/cassandra3_data_want/sina_test/sina_table-*/")[0]
+
+def read_statistics(table_dir):
+    with open(os.path.join(table_dir, "me-1-big-Statistics.db"), "rb") as f:
+        return sstable.sstable_statistics.statistics_format.parse(f.read())
+
+def read_index(statistics_parsed, table_dir):
+    with open(os.path.join(table_dir, "me-1-big-Index.db"), "rb") as f:
+        return sstable.sstable_index.read_index(statistics_parsed, f)
+
+def test_read_summary():
+    with open(os.path.join(TABLE_DIR, "me-1-big-Summary.db"), "rb") as f:
+        summary = sstable.sstable_summary.read_summary(f)
+    assert 128 == summary.min_index_interval
+    assert 1 == len(summary)
+    assert b"\x00\x00\x00\x05" == summary.key(0)
+    assert 0 == summary.positions[0]
+    assert b"\x00\x00\x00\x05" == summary.first_key
+    assert b"\x00\x00\x00\x03" == summary.last_key
+
+def test_index_is_sorted_by_token():
+    for table_dir in glob.glob("test_data/cassandra3_data_want/sina_test/*/"):
+        index = read_index(read_statistics(table_dir), table_dir)
+        keys = [sstable.murmur3.decorated_key(key) for key in index]
+        assert sorted(keys) == keys, table_dir
+
+def make_summary(index_bytes, every):
+    r"""
+    A Summary.db sampling every `every` entries of Index.db, to get more than
+    one interval out of the small test tables.
+    """
+    keys = []
+    index_positions = []
+    pos = 0
+    while pos < len(index_bytes):
+        keys.append(index_bytes[pos+2:pos+2+int.from_bytes(index_bytes[pos:pos+2], "big")])
+        index_positions.append(pos)
+        _, _, pos = sstable.sstable_index.read_entry(index_bytes, pos)
+
+    sampled = list(zip(keys, index_positions))[::every]
+    offsets = b""
+    entries = b""
+    for key, index_position in sampled:
+        offsets += (4 * len(sampled) + len(entries)).to_bytes(4, "little")
+        entries += key + index_position.to_bytes(8, "little")
+    return sstable.sstable_summary.Summary(sstable.sstable_summary.summary_format.parse(sstable.sstable_summary.summary_format.build({
+        "min_index_interval": every,
+        "offset_count": len(sampled),
+        "summary_entries_size": len(offsets) + len(entries),
+        "sampling_level": 128,
+        "size_at_full_sampling": len(sampled),
+        "offsets": offsets,
+        "entries": entries,
+        "first_key": keys[0],
+        "last_key": keys[-1],
+    })))
+
+def test_lookup():
+    statistics_parsed = read_statistics(TABLE_DIR)
+    with open(os.path.join(TABLE_DIR, "me-1-big-Index.db"), "rb") as f:
+        index_stream = io.BytesIO(f.read())
+    with open(os.path.join(TABLE_DIR, "me-1-big-Data.db"), "rb") as f:
+        partitions = list(sstable.sstable_data.iter_partitions(statistics_parsed, f))
+
+    with open(os.path.join(TABLE_DIR, "me-1-big-Summary.db"), "rb") as f:
+        summaries = [sstable.sstable_summary.read_summary(f)]
+    summaries += [make_summary(index_stream.getvalue(), every) for every in [1, 2, 3]]
+
+    with open(os.path.join(TABLE_DIR, "me-1-big-Data.db"), "rb") as f:
+        for summary in summaries:
+            for partition in reversed(partitions):
+                assert partition == sstable.sstable_summary.lookup(statistics_parsed, summary, index_stream, f, partition.partition_header.key)
+            for missing_key in range(8, 100):
+                assert None == sstable.sstable_summary.lookup(statistics_parsed, summary, index_stream, f, missing_key.to_bytes(4, "big"))
@@ -0,0 +1,47 @@
+import io
+import os
+import tempfile
+
+import sstable.row_decoder
+import sstable.sstable_data
+import sstable.compact_rows
+import sstable.sstable_reader
+import benchmarks.synthetic
+import benchmarks.end_to_end
+
+def test_generate():
+    for types in benchmarks.synthetic.TYPE_MIXES:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            stats = benchmarks.synthetic.generate(tmp_dir, partitions=20, rows=3, columns=5, types=types, missing=0.3)
+            assert (20, 60) == (stats.partitions, stats.rows)
+            statistics = benchmarks.end_to_end.parse_statistics(tmp_dir)
+            data = benchmarks.end_to_end.read_component(tmp_dir, "Data")
+            assert stats.data_size == len(data)
+
+            partitions = list(sstable.sstable_data.iter_partitions(statistics, io.BytesIO(data)))
+            row_body_decoder = sstable.row_decoder.compile_row_body_decoder(statistics.serialization_header)
+            compiled = list(sstable.sstable_data.iter_partitions(statistics, io.BytesIO(data), row_body_decoder=row_body_decoder))
+            assert [sstable.compact_rows.from_partition(p) for p in partitions] == [sstable.compact_rows.from_partition(p) for p in compiled], types
+            assert any(unfiltered.row.row_body.missing_columns is not None for p in partitions for unfiltered in p.unfiltereds[:-1])
+            assert data == b"".join(sstable.sstable_data.partition.build(p, sstable_statistics=statistics) for p in partitions), types
+
+            # In token order, so that partitions can be looked up
+            reader = sstable.sstable_reader.SSTableReader(tmp_dir, 1)
+            key = partitions[7].partition_header.key
+            assert key == reader.lookup(key).partition_header.key
+
+def test_generate_is_reproducible():
+    data = []
+    for _ in range(2):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            benchmarks.synthetic.generate(tmp_dir, partitions=10, rows=2, columns=4, types="Int32Type,UTF8Type", missing=0.5, seed=3)
+            data.append(benchmarks.end_to_end.read_component(tmp_dir, "Data"))
+    assert data[0] == data[1]
+
+def test_stages():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        benchmarks.synthetic.generate(tmp_dir, partitions=10, rows=2, columns=4, types="fixed")
+        for name, stage, args in benchmarks.end_to_end.STAGES:
+            if stage is not benchmarks.end_to_end.stage_statistics:
+                _, size, rows = stage(tmp_dir, *args)
+                assert (os.path.getsize(os.path.join(tmp_dir, "me-1-big-Data.db")), 20) == (size, rows), name
@@ -0,0 +1,66 @@
+import io
+import glob
+
+import sstable.murmur3
+import sstable.token_range
+import sstable.sstable_data
+import sstable.sstable_reader
+
+from tests.test_sstable_summary import make_summary
+
+TABLE_DIRS = [
+    glob.glob("test_data/cassandra3_data_want/sina_test/sina_table-*/")[0],
+    glob.glob("test_data/cassandra3_data_want/sina_test/twenty_rows_table-*/")[0],
+    # Compressed
+    glob.glob("test_data/cassandra3_data_want/system_schema/columns-*/")[0],
+]
+
+def keys_of(partitions):
+    return [bytes(p.partition_header.key) for p in partitions]
+
+def test_tokens():
+    for table_dir in TABLE_DIRS:
+        reader = sstable.sstable_reader.SSTableReader(table_dir, sstable.sstable_reader.list_generations(table_dir)[0])
+        with open(reader.path("Index"), "rb") as f:
+            keys = list(sstable.sstable_index.read_index(reader.statistics, f))
+        assert [sstable.murmur3.token(key) for key in keys] == list(sstable.murmur3.tokens(keys)), table_dir
+
+def test_scan_token_range():
+    for table_dir in TABLE_DIRS:
+        reader = sstable.sstable_reader.SSTableReader(table_dir, sstable.sstable_reader.list_generations(table_dir)[0])
+        with sstable.compressed_data.open_data_file(reader.path("Data")) as f:
+            partitions = list(sstable.sstable_data.iter_partitions(reader.statistics, f, row_body_decoder=reader.row_body_decoder))
+        with open(reader.path("Index"), "rb") as f:
+            index_bytes = f.read()
+        tokens = [sstable.murmur3.token(key) for key in keys_of(partitions)]
+        summaries = [reader.summary] + [make_summary(index_bytes, every) for every in [1, 2, 3]]
+
+        bounds = [None, tokens[0], tokens[len(tokens) // 2], tokens[-1]]
+        for start in bounds:
+            for end in bounds:
+                want = [key for key, token in zip(keys_of(partitions), tokens) if sstable.token_range.in_range(token, start, end)]
+                with sstable.compressed_data.open_data_file(reader.path("Data")) as f:
+                    got = keys_of(sstable.token_range.scan_token_range(reader.statistics, f, start, end, row_body_decoder=reader.row_body_decoder))
+                assert want == got, (table_dir, start, end)
+
+                for summary in summaries:
+                    position = sstable.token_range.data_position(io.BytesIO(index_bytes), start, summary=summary)
+                    if position is None:
+                        assert [] == want
+                        continue
+                    with sstable.compressed_data.open_data_file(reader.path("Data")) as f:
+                        got = keys_of(sstable.token_range.scan_token_range(reader.statistics, f, start, end, position=position, row_body_decoder=reader.row_body_decoder))
+                    assert want == got, (table_dir, start, end)
+
+                assert want == keys_of(reader.scan_token_range(start, end)), (table_dir, start, end)
+
+def test_scan_token_range_stops_after_end():
+    table_dir = TABLE_DIRS[2]
+    reader = sstable.sstable_reader.SSTableReader(table_dir, 21)
+    with sstable.compressed_data.open_data_file(reader.path("Data")) as f:
+        first = next(sstable.sstable_data.iter_partitions(reader.statistics, f))
+    with sstable.compressed_data.open_data_file(reader.path("Data")) as f:
+        got = keys_of(sstable.token_range.scan_token_range(reader.statistics, f, None, sstable.murmur3.token(first.partition_header.key)))
+        # Only the chunks of the first partition and the next one were read
+        assert f.chunks_decompressed < f.compression_info.chunk_count
+    assert [bytes(first.partition_header.key)] == got
@@ -1,6 +1,8 @@
 import sstable.varint
 import io
 
+import construct
+
 import sstable.utils
 import sstable.sstable_data
 
@@ -30,3 +32,21 @@ def test_varint():
 
     assert bytes([0b10100000, 0b00000000]) == sstable.varint.VarInt().build(1<<13)
     assert bytes([0b11111101, 0b00000000, 0b00000000, 0b00000000, 0b00000000, 0b00000000, 0x00000000]) == sstable.varint.VarInt().build(1<<48)
+
+def test_decode():
+    buf = memoryview(bytes([0b01111111, 0b10000000, 0b10000001, 0b11000000, 0b10000000, 0b00000101]))
+    assert (127, 1) == sstable.varint.decode(buf, 0)
+    assert (129, 3) == sstable.varint.decode(buf, 1)
+    assert (32773, 6) == sstable.varint.decode(buf, 3)
+    assert ([127, 129, 32773], 6) == sstable.varint.decode_many(buf, 0, 3)
+
+    for value in [0, 127, 128, 1<<13, 1<<48, 1<<55, 1<<63, (1<<64) - 1]:
+        encoded = sstable.varint.encode(value)
+        assert (value, len(encoded)) == sstable.varint.decode(encoded, 0)
+        assert value == sstable.varint.parse(io.BytesIO(encoded))
+
+    try:
+        sstable.varint.decode(bytes([0b11000000, 0b10000000]), 0)
+        assert False, "expected a StreamError"
+    except construct.StreamError:
+        pass
@@ -0,0 +1,63 @@
+import glob
+import os
+import zlib
+import shutil
+
+import sstable.verify
+
+TABLE_DIR = glob.glob("test_data/cassandra3_data_want/sina_test/sina_table-*/")[0]
+COMPRESSED_TABLE_DIR = glob.glob("test_data/cassandra3_data_want/system_schema/columns-*/")[0]
+
+def test_verify():
+    for table_dir in glob.glob("test_data/cassandra3_data_want/sina_test/*/"):
+        result = sstable.verify.verify(table_dir)
+        assert result.ok, table_dir
+        assert 1 == result.chunks_checked
+    for generation in [21, 22]:
+        assert sstable.verify.verify(COMPRESSED_TABLE_DIR, generation).ok
+
+def copy_table(table_dir, tmp_path):
+    for file_name in os.listdir(table_dir):
+        shutil.copy(os.path.join(table_dir, file_name), tmp_path / file_name)
+
+def corrupt(path, offset):
+    with open(path, "r+b") as f:
+        f.seek(offset)
+        byte = f.read(1)
+        f.seek(offset)
+        f.write(bytes([byte[0] ^ 0xff]))
+
+def test_first_corrupt_chunk(tmp_path):
+    copy_table(TABLE_DIR, tmp_path)
+    data = (tmp_path / "me-1-big-Data.db").read_bytes()
+    # Smaller chunks than Cassandra would write, to have a few of them
+    chunk_size = 32
+    crc = chunk_size.to_bytes(4, "big")
+    for offset in range(0, len(data), chunk_size):
+        crc += zlib.crc32(data[offset:offset+chunk_size]).to_bytes(4, "big")
+    (tmp_path / "me-1-big-CRC.db").write_bytes(crc)
+    (tmp_path / "me-1-big-Digest.crc32").write_text(str(zlib.crc32(data)))
+
+    for block_size in [1, 100, 1 << 20]:
+        result = sstable.verify.verify(tmp_path, block_size=block_size, threads=3)
+        assert result.ok
+        assert (len(data) + chunk_size - 1) // chunk_size == result.chunks_checked
+
+    corrupt(tmp_path / "me-1-big-Data.db", 300)
+    corrupt(tmp_path / "me-1-big-Data.db", 100)
+    for block_size in [1, 100, 1 << 20]:
+        result = sstable.verify.verify(tmp_path, block_size=block_size, threads=3)
+        assert not result.ok
+        assert not result.digest_ok
+        assert 96 == result.first_corrupt_offset
+        assert [(3, 96, 32), (9, 288, 32)] == [(chunk.index, chunk.offset, chunk.length) for chunk in result.corrupt_chunks]
+
+def test_corrupt_compressed_chunk(tmp_path):
+    copy_table(COMPRESSED_TABLE_DIR, tmp_path)
+    # The second chunk starts at 7479, followed by its CRC32
+    corrupt(tmp_path / "me-21-big-Data.db", 7480)
+    result = sstable.verify.verify(tmp_path, 21)
+    assert not result.ok
+    assert [1] == [chunk.index for chunk in result.corrupt_chunks]
+    assert 7479 == result.first_corrupt_offset
+    assert sstable.verify.verify(tmp_path, 22).ok